@@ -4,6 +4,7 @@ import argparse
 # import sys
 import textwrap
 import sys
+import shlex
 import re
 import yaml
 import enum
@@ -14,6 +15,18 @@ from pathlib import Path
 import shutil
 # import pykwalify.core
 import logging
+import subprocess
+import threading
+import contextlib
+import concurrent.futures
+import atexit
+import hashlib
+import socket
+import platform
+import asyncio
+import json
+import time
+import csv
 from typing import NoReturn
 from version import __version__
 
@@ -24,6 +37,7 @@ from west.manifest import ManifestDataType
 from west.manifest import ImportFlag
 from west.manifest import manifest_path
 from west.configuration import update_config
+from west.configuration import Configuration
 from west import util
 from west.util import PathType
 from west.app.main import WestArgumentParser
@@ -31,13 +45,14 @@ from west.app.main import WestApp
 
 # from west.app.project import ForAll, Update
 from west.app.project import Update
-from west.app.project import _rev_type as rev_type
 
 # from west.app.main import WestArgumentParser
 
 class mpv_log:
     def __init__(self):
         self._logger = logging.getLogger('mpv')
+        # Per thread buffer of output, see buffered()
+        self._local = threading.local()
 
         start = Path.cwd()
         fall_back = True        
@@ -75,28 +90,76 @@ class mpv_log:
     def log(self) -> logging.Logger:
         return self._logger
 
+    @contextlib.contextmanager
+    def buffered(self):
+        '''
+        Collect the output of the current thread in a buffer instead of printing it.
+        The buffer is printed later with flush(), e.g. by the worker pool,
+        in order to keep the output of each project together.
+        '''
+        self._local.buffer = []
+        try:
+            yield self._local.buffer
+        finally:
+            self._local.buffer = None
+
+    def is_buffered(self) -> bool:
+        return getattr(self._local, 'buffer', None) is not None
+
+    def _buffer_add(self, method, message, **kwargs) -> bool:
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            return False
+        buffer.append((method, message, kwargs))
+        return True
+
+    def flush(self, buffer: list):
+        for method, message, kwargs in buffer:
+            method(message, **kwargs)
+
+    def out(self, text: str):
+        '''
+        Print raw output of git command
+        '''
+        if self._buffer_add(self.out, text):
+            return
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
     def dbg(self, message : str):
+        if self._buffer_add(self.dbg, message):
+            return
         log.dbg(message)
         self.log.debug(message)
 
     def inf(self, message : str):
+        if self._buffer_add(self.inf, message):
+            return
         log.inf(message)
         self.log.info(message)
     
     def banner(self, message : str):
+        if self._buffer_add(self.banner, message):
+            return
         log.banner(message)
         self.inf('===' + message)
         
 
     def small_banner(self, message : str):
+        if self._buffer_add(self.small_banner, message):
+            return
         log.small_banner(message)
         self.inf('---' + message)
 
     def wrn(self, message : str):
+        if self._buffer_add(self.wrn, message):
+            return
         log.wrn(message)
         self.log.warning(message)
     
     def err(self, message : str, fatal=False):
+        if self._buffer_add(self.err, message, fatal=fatal):
+            return
         log.err(message, fatal=fatal)
         if fatal == False:
             self.log.error(message)
@@ -104,6 +167,11 @@ class mpv_log:
             self.log.fatal(message)
 
     def die(self, message : str) -> NoReturn:
+        # In worker thread - don't exit the process,
+        # only stop the work on the current project
+        if self.is_buffered():
+            self.err("die: " + message, fatal=True)
+            sys.exit(1)
         self.log.fatal("die: " + message)
         log.die(message)
 
@@ -144,18 +212,770 @@ class ContentType(enum.Enum):
     ALL_PROJECTS = enum.auto()
 
 
+##########################################
+# Trace of git commands (Chrome trace-event format)
+
+# Environment variable with file to write the trace to, same as --trace
+TRACE_ENV = 'MPV_TRACE'
+
+
+class GitTrace:
+    '''
+    Timeline of the git commands and the phases of mpv command,
+    written as Chrome trace-event JSON (open in chrome://tracing or ui.perfetto.dev).
+    Each project has its own lane of git commands, and each thread has lane of phases.
+    '''
+    def __init__(self, trace_file: PathType, name: str):
+        self.trace_file = Path(trace_file)
+        self.name = name
+        self.start = time.time()
+        self._pid = os.getpid()
+        self._events: List[Dict] = []
+        self._lanes: Dict[str, int] = {}
+        self._phases: Dict[int, List] = {}
+        self._lock = threading.Lock()
+
+    def _tid(self, lane: str) -> int:
+        # Call with self._lock locked
+        if lane not in self._lanes:
+            self._lanes[lane] = len(self._lanes) + 1
+            self._events.append({'name': 'thread_name', 'ph': 'M', 'pid': self._pid,
+                                 'tid': self._lanes[lane], 'args': {'name': lane}})
+        return self._lanes[lane]
+
+    def add(self, name: str, cat: str, start: float, end: float, lane: str, args: Optional[Dict] = None):
+        with self._lock:
+            self._events.append({'name': name, 'cat': cat, 'ph': 'X', 'pid': self._pid,
+                                 'tid': self._tid(lane),
+                                 'ts': round((start - self.start) * 1e6),
+                                 'dur': round((end - start) * 1e6),
+                                 'args': args or {}})
+
+    def add_git(self, result: 'GitResult', cwd: PathType):
+        self.add(f"git {result.args[0] if result.args else ''}", 'git', result.start, result.end,
+                 f"git {result.project}",
+                 {'project': result.project, 'cwd': os.fspath(cwd), 'argv': ['git'] + result.args,
+                  'exit_code': result.returncode, 'timed_out': result.timed_out,
+                  'stdout_bytes': len(result.stdout) if result.stdout else 0})
+
+    def phase(self, name: Optional[str]):
+        '''
+        End the current phase of the thread, and start a new one (if name is not None)
+        '''
+        thread = threading.current_thread()
+        now = time.time()
+        current = self._phases.pop(thread.ident, None)
+        if current is not None:
+            self.add(current[0], 'phase', current[1], now, thread.name)
+        if name is not None:
+            self._phases[thread.ident] = [name, now]
+
+    def write(self):
+        for ident in list(self._phases):
+            name, start = self._phases.pop(ident)
+            self.add(name, 'phase', start, time.time(), 'MainThread')
+        self.add(self.name, 'command', self.start, time.time(), 'MainThread')
+        self.trace_file.parent.mkdir(parents=True, exist_ok=True)
+        self.trace_file.write_text(json.dumps({'traceEvents': self._events,
+                                               'displayTimeUnit': 'ms'}))
+        i_logger.inf(f"Trace of git commands written to: {self.trace_file}")
+
+
+_trace: Optional[GitTrace] = None
+
+
+def start_trace(trace_file: Optional[PathType], name: str):
+    '''
+    Start trace of the command to trace_file (or to the file in MPV_TRACE).
+    The trace is written when the command exits.
+    '''
+    global _trace
+    trace_file = trace_file or os.environ.get(TRACE_ENV)
+    if not trace_file or _trace is not None:
+        return
+    _trace = GitTrace(trace_file, name)
+    atexit.register(_trace.write)
+
+
+def add_trace_argument(parser):
+    parser.add_argument('--trace', dest='trace', metavar='FILE',
+                        help=f'''Write timeline of all git commands and phases of the command
+                                 to FILE, in Chrome trace-event format.
+                                 Can also set with environment variable {TRACE_ENV}.''')
+
+
+@contextlib.contextmanager
+def trace_span(name: str, cat: str = 'phase'):
+    '''
+    Record the code inside the with statement as span in the trace
+    '''
+    if _trace is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        _trace.add(name, cat, start, time.time(), threading.current_thread().name)
+
+
+def trace_phase(name: Optional[str]):
+    '''
+    End the current phase of the trace, and start new one (None - only end)
+    '''
+    if _trace is not None:
+        _trace.phase(name)
+
+##########################################
+
+
+##########################################
+# Asynchronous git engine
+
+# Default number of git processes that run at the same time.
+# Can be changed with: west config mpv.git-jobs <number>
+GIT_JOBS = 16
+# Default timeout (in seconds) of one git command, 0 - no timeout.
+# Can be changed with: west config mpv.git-timeout <seconds>
+GIT_TIMEOUT = 0
+
+
+class GitResult:
+    '''
+    The result of one git command, that run by the git engine
+    '''
+    def __init__(self, project: str, args: List[str], returncode: int,
+                 stdout: Optional[bytes], stderr: Optional[bytes],
+                 start: float, end: float, timed_out: bool = False):
+        self.project = project
+        self.args = args
+        '''the git arguments, without 'git' '''
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.start = start
+        self.end = end
+        self.timed_out = timed_out
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def check(self) -> 'GitResult':
+        '''
+        Raise exception if the git command failed, like subprocess.run(check=True)
+        '''
+        if self.timed_out:
+            raise subprocess.TimeoutExpired(['git'] + self.args, self.duration,
+                                            output=self.stdout, stderr=self.stderr)
+        if self.returncode:
+            raise subprocess.CalledProcessError(self.returncode, self.args,
+                                                output=self.stdout, stderr=self.stderr)
+        return self
+
+    def completed_process(self) -> subprocess.CompletedProcess:
+        return subprocess.CompletedProcess(['git'] + self.args, self.returncode,
+                                           self.stdout, self.stderr)
+
+
+class GitEngine:
+    '''
+    Run git commands as asyncio subprocesses, in event loop of background thread.
+    The commands of one project are serialized, so two commands never race
+    on the same .git, and the number of all git processes is limited by semaphore.
+    '''
+    def __init__(self, jobs: int = GIT_JOBS, timeout: Optional[float] = None):
+        self.jobs = jobs
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name='mpv-git-engine', daemon=True)
+        self._thread.start()
+        # Created in the loop, see _init_loop()
+        self._semaphore = None
+        self._project_locks: Dict[str, asyncio.Lock] = {}
+        asyncio.run_coroutine_threadsafe(self._init_loop(), self._loop).result()
+
+    async def _init_loop(self):
+        self._semaphore = asyncio.Semaphore(self.jobs)
+
+    def in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def project_lock(self, cwd: PathType) -> asyncio.Lock:
+        '''
+        Return the lock of the repository in cwd - only in the loop of the engine
+        '''
+        return self._project_locks.setdefault(os.fspath(cwd), asyncio.Lock())
+
+    # The log lines are written by git() and git_sync() and not by _run(),
+    # so they go to the buffer of the calling thread (see mpv_log.buffered())
+    @staticmethod
+    def _log_start(project: manifest.Project, args: List[str]):
+        i_logger.dbg(f"git() - project: {project.name}, running: git {shlex.join(args)}")
+
+    @staticmethod
+    def _log_end(result: GitResult):
+        i_logger.dbg(f"git() - project: {result.project}, exit code: {result.returncode}, "
+                     f"time: {result.duration:.2f}, timed out: {result.timed_out}")
+
+    async def _run(self, project: manifest.Project, args: List[str],
+                   capture_stdout: bool, capture_stderr: bool,
+                   cwd: Optional[PathType], timeout: Optional[float]) -> GitResult:
+        if cwd is None:
+            cwd = project.abspath
+        async with self.project_lock(cwd), self._semaphore:
+            start = time.time()
+            proc = await asyncio.create_subprocess_exec(
+                'git', *args, cwd=cwd,
+                stdout=asyncio.subprocess.PIPE if capture_stdout else None,
+                stderr=asyncio.subprocess.PIPE if capture_stderr else None)
+            timed_out = False
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                proc.kill()
+                stdout, stderr = await proc.communicate()
+            except asyncio.CancelledError:
+                proc.kill()
+                await proc.wait()
+                raise
+            end = time.time()
+
+        if git_changes_refs(args):
+            refs_changed(project)
+        if git_command_name(args) == 'push':
+            invalidate_remote_refs(project)
+        result = GitResult(project.name, args, proc.returncode, stdout, stderr, start, end, timed_out)
+        if _trace is not None:
+            _trace.add_git(result, cwd)
+        return result
+
+    async def git(self, project: manifest.Project, args: List[str],
+                  capture_stdout: bool, capture_stderr: bool,
+                  cwd: Optional[PathType], timeout: Optional[float]) -> GitResult:
+        self._log_start(project, args)
+        coro = self._run(project, args, capture_stdout, capture_stderr, cwd, timeout)
+        if self.in_loop():
+            result = await coro
+        else:
+            # Called from another event loop - run in the loop of the engine
+            result = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+        self._log_end(result)
+        return result
+
+    def git_sync(self, project: manifest.Project, args: List[str],
+                 capture_stdout: bool, capture_stderr: bool,
+                 cwd: Optional[PathType], timeout: Optional[float]) -> GitResult:
+        if self.in_loop():
+            raise RuntimeError("git_sync() can't be called from the loop of the git engine, use git()")
+        self._log_start(project, args)
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(project, args, capture_stdout, capture_stderr, cwd, timeout), self._loop)
+        try:
+            result = future.result()
+        except KeyboardInterrupt:
+            # Kill the git process, and let the caller handle Ctrl-C
+            future.cancel()
+            raise
+        self._log_end(result)
+        return result
+
+    def run(self, coro):
+        '''
+        Run coroutine (e.g. asyncio.gather() of several git() calls) in the loop
+        of the engine, and wait for its result
+        '''
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+_git_engine: Optional[GitEngine] = None
+_git_engine_lock = threading.Lock()
+
+
+def git_engine() -> GitEngine:
+    global _git_engine
+    with _git_engine_lock:
+        if _git_engine is None:
+            topdir = util.west_topdir(start=Path.cwd(), fall_back=True)
+            config = Configuration(topdir)
+            try:
+                jobs = config.getint('mpv.git-jobs', default=GIT_JOBS)
+                timeout = config.getint('mpv.git-timeout', default=GIT_TIMEOUT)
+            except ValueError:
+                i_logger.wrn(f"mpv.git-jobs and mpv.git-timeout should be numbers, use defaults")
+                jobs, timeout = GIT_JOBS, GIT_TIMEOUT
+            _git_engine = GitEngine(max(jobs, 1), timeout if timeout > 0 else None)
+        return _git_engine
+
+
+def _git_args(cmd) -> List[str]:
+    return shlex.split(cmd) if isinstance(cmd, str) else [os.fspath(arg) for arg in cmd]
+
+
+async def git(project: manifest.Project, args, *, capture: bool = True,
+              check: bool = False, cwd: Optional[PathType] = None,
+              timeout: Optional[float] = None) -> GitResult:
+    '''
+    Run git command (string or list, without 'git') in the project.
+    Commands of the same project run one after the other, commands of different
+    projects run in parallel (up to mpv.git-jobs).
+    capture - capture stdout and stderr, otherwise they go to the terminal.
+    timeout - in seconds, default mpv.git-timeout.
+    '''
+    engine = git_engine()
+    result = await engine.git(project, _git_args(args), capture, capture, cwd,
+                              timeout if timeout is not None else engine.timeout)
+    return result.check() if check else result
+
+
+def mpv_git(project: manifest.Project, cmd, check: bool = True,
+            capture_stdout: bool = False, capture_stderr: bool = False,
+            cwd: Optional[PathType] = None) -> subprocess.CompletedProcess:
+    '''
+    Run git command in the project, same as Project.git(), by the git engine.
+    If the output of the current thread is buffered (in worker pool),
+    the output of git is captured and added to the buffer.
+    '''
+    buffered = i_logger.is_buffered()
+    engine = git_engine()
+    result = engine.git_sync(project, _git_args(cmd),
+                             capture_stdout or buffered, capture_stderr or buffered,
+                             cwd, engine.timeout)
+    cp = result.completed_process()
+    if buffered:
+        if not capture_stdout and cp.stdout:
+            i_logger.out(cp.stdout.decode('utf-8', errors='replace'))
+        if not capture_stderr and cp.stderr:
+            i_logger.out(cp.stderr.decode('utf-8', errors='replace'))
+
+    if check:
+        result.check()
+    return cp
+
+
+class ProjectResult:
+    '''
+    The result of running a function on one project in the worker pool
+    '''
+    def __init__(self, name: str, ok: bool = True, value: Any = None, error: Optional[str] = None):
+        self.name = name
+        self.ok = ok
+        self.value = value
+        self.error = error
+
+
+def run_projects(projects: list, func: Callable[[manifest.Project], Any], jobs: int = 1) -> List[ProjectResult]:
+    '''
+    Run func(project) for all projects, with up to jobs workers in parallel.
+    The output of each project is buffered, and printed in the order of the projects.
+    Failure of one project doesn't stop the others; the caller should check the results.
+    Ctrl-C cancels the projects that didn't start, and wait for the running ones.
+    '''
+    i_logger.dbg(f"run_projects() - {len(projects)} projects, jobs: {jobs}")
+    cancel = threading.Event()
+
+    def run_one(project) -> ProjectResult:
+        if cancel.is_set():
+            return ProjectResult(project.name, ok=False, error="cancelled")
+        try:
+            with trace_span(project.name, 'project'):
+                return ProjectResult(project.name, value=func(project))
+        except SystemExit:
+            return ProjectResult(project.name, ok=False, error="stopped by error (see log above)")
+        except subprocess.CalledProcessError as e:
+            return ProjectResult(project.name, ok=False,
+                                 error=f"git command failed ({e.returncode}): {e.cmd}")
+        except Exception as e:
+            return ProjectResult(project.name, ok=False, error=f"{type(e).__name__}: {e}")
+
+    # Serial run - print the output immediately
+    if jobs <= 1:
+        return [run_one(project) for project in projects]
+
+    def run_buffered(project):
+        with i_logger.buffered() as buffer:
+            result = run_one(project)
+        return result, buffer
+
+    results = []
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    futures = [executor.submit(run_buffered, project) for project in projects]
+    try:
+        for future in futures:
+            result, buffer = future.result()
+            i_logger.flush(buffer)
+            results.append(result)
+    except KeyboardInterrupt:
+        cancel.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        i_logger.die(f"Interrupted by user - {len(results)} of {len(projects)} projects finished, the rest were cancelled")
+    executor.shutdown(wait=True)
+    return results
+
+
+def report_failures(results: List[ProjectResult], action: str):
+    '''
+    Print the projects that failed, and exit with error if there are such
+    '''
+    failures = [result for result in results if not result.ok]
+    if len(failures) == 0:
+        return
+    i_logger.err(f"{action} failed in {len(failures)} of {len(results)} projects:")
+    for result in failures:
+        i_logger.err(f"  {result.name}: {result.error}")
+    i_logger.die(f"{action} failed in projects: {', '.join(result.name for result in failures)}")
+
+
+##########################################
+# Snapshot of the refs of repository
+
+class RepoRefIndex:
+    '''
+    Snapshot of all refs of one repository, read with one call to git for-each-ref:
+    local branches, remote branches, tags (with the peeled sha of annotated tags),
+    the upstream of local branches and HEAD.
+
+    Use ref_index() to get the index of a project.
+    The index is invalidated by mpv_git() when mpv runs git command that might change refs.
+    '''
+    FORMAT = '%(refname)%00%(objectname)%00%(*objectname)%00%(upstream)%00%(upstream:track)%00%(HEAD)'
+
+    def __init__(self, project: manifest.Project):
+        self.heads: Dict[str, str] = {}
+        '''local branch name -> sha'''
+        self.remotes: Dict[str, str] = {}
+        '''remote branch name (e.g. origin/main) -> sha'''
+        self.tags: Dict[str, str] = {}
+        '''tag name -> sha of the commit (peeled for annotated tags)'''
+        self.tag_objects: Dict[str, str] = {}
+        '''tag name -> sha of the tag object itself'''
+        self.upstreams: Dict[str, tuple] = {}
+        '''local branch name -> (upstream refname, upstream track), e.g. ("refs/remotes/origin/main", "[ahead 1]")'''
+        self.head_branch: Optional[str] = None
+        self.head_sha: Optional[str] = None
+
+        cp = mpv_git(project, ['for-each-ref', f'--format={self.FORMAT}'],
+                     capture_stdout=True, capture_stderr=True, check=False)
+        for line in cp.stdout.decode('utf-8', errors='ignore').splitlines():
+            fields = line.split('\0')
+            if len(fields) != 6:
+                continue
+            refname, sha, peeled, upstream, track, head = fields
+            if refname.startswith('refs/heads/'):
+                name = refname[len('refs/heads/'):]
+                self.heads[name] = sha
+                if upstream:
+                    self.upstreams[name] = (upstream, track)
+                if head == '*':
+                    self.head_branch = name
+                    self.head_sha = sha
+            elif refname.startswith('refs/remotes/'):
+                name = refname[len('refs/remotes/'):]
+                if not name.endswith('/HEAD'):
+                    self.remotes[name] = sha
+            elif refname.startswith('refs/tags/'):
+                name = refname[len('refs/tags/'):]
+                self.tag_objects[name] = sha
+                self.tags[name] = peeled or sha
+
+        if self.head_branch is None:
+            self.head_sha = self._read_detached_head(project)
+
+        self.tags_by_sha: Dict[str, List[str]] = {}
+        for name, sha in self.tags.items():
+            self.tags_by_sha.setdefault(sha, []).append(name)
+
+        i_logger.dbg(f"RepoRefIndex() - project: {project.name}, heads: {len(self.heads)}, remotes: {len(self.remotes)}, "
+                     f"tags: {len(self.tags)}, head_branch: {self.head_branch}, head_sha: {self.head_sha}")
+
+    @staticmethod
+    def _read_detached_head(project: manifest.Project) -> Optional[str]:
+        head_file = Path(project.abspath).joinpath('.git', 'HEAD')
+        if head_file.is_file():
+            head = head_file.read_text().strip()
+            # HEAD in unborn branch
+            if head.startswith('ref:'):
+                return None
+            return head
+
+        cp = mpv_git(project, ['rev-parse', '--verify', '-q', 'HEAD'],
+                     capture_stdout=True, capture_stderr=True, check=False)
+        head = cp.stdout.decode('ascii', errors='ignore').strip()
+        return head or None
+
+    def has_branch(self, branch: str, is_remote: bool) -> bool:
+        if is_remote:
+            return f"origin/{branch}" in self.remotes
+        return branch in self.heads
+
+    def is_tag(self, rev: str) -> bool:
+        return rev in self.tags
+
+    def rev_type(self, rev: str) -> Optional[str]:
+        '''
+        Return 'tag' or 'branch' if rev is tag or local branch (as west _rev_type()).
+        Return None if the type can't be known from the refs (e.g. sha).
+        '''
+        # The order is the same as git uses to resolve names: tag before branch
+        if rev in self.tags:
+            return 'tag'
+        if rev in self.heads:
+            return 'branch'
+        return None
+
+    def head_tag(self) -> Optional[str]:
+        '''
+        Return the tag that points to HEAD, if there is exactly one
+        '''
+        tags = self.tags_by_sha.get(self.head_sha, [])
+        return tags[0] if len(tags) == 1 else None
+
+    def ahead_remote(self, branch: str) -> Optional[int]:
+        '''
+        Return how much commits the local branch is ahead of origin/branch,
+        or None if it can't be known from the refs.
+        '''
+        if branch not in self.heads or f"origin/{branch}" not in self.remotes:
+            return None
+        if self.heads[branch] == self.remotes[f"origin/{branch}"]:
+            return 0
+        upstream, track = self.upstreams.get(branch, (None, None))
+        if upstream != f"refs/remotes/origin/{branch}":
+            return None
+        m = re.search(r"ahead (\d+)", track)
+        return int(m.group(1)) if m is not None else 0
+
+    def gone_branches(self) -> List[str]:
+        '''
+        Return the local branches that their upstream was gone
+        '''
+        return [branch for branch, (upstream, track) in self.upstreams.items() if track == '[gone]']
+
+
+_ref_indexes: Dict[str, RepoRefIndex] = {}
+_ref_indexes_lock = threading.Lock()
+
+# git commands that don't change refs of the repository
+_GIT_READ_ONLY_COMMANDS = {'rev-parse', 'show', 'cat-file', 'for-each-ref', 'ls-remote', 'rev-list',
+                           'describe', 'merge-base', 'status', 'log', 'diff', 'show-ref', 'ls-files',
+                           'ls-tree', 'merge-tree', 'commit-tree', 'add'}
+# Options of git branch that only list branches
+_GIT_BRANCH_LIST_OPTIONS = {'--show-current', '-l', '--list', '-r', '--remotes', '-a', '--all',
+                            '--format', '--contains', '--merged', '--no-merged', '-v', '-vv'}
+
+
+def _git_command_split(cmd) -> list:
+    cmd_list = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+    # Skip global options, e.g. "-c key=value"
+    while len(cmd_list) > 0 and cmd_list[0].startswith('-'):
+        cmd_list = cmd_list[2:] if cmd_list[0] in ('-c', '-C') else cmd_list[1:]
+    return cmd_list
+
+
+def git_command_name(cmd) -> Optional[str]:
+    '''
+    Return the name of the git command (e.g. 'fetch'), from string or list of arguments
+    '''
+    cmd_list = _git_command_split(cmd)
+    return cmd_list[0] if len(cmd_list) > 0 else None
+
+
+def git_changes_refs(cmd) -> bool:
+    '''
+    Return True if the git command (string or list, without 'git') might change refs
+    '''
+    cmd_list = _git_command_split(cmd)
+    if len(cmd_list) == 0:
+        return False
+
+    command, args = cmd_list[0], cmd_list[1:]
+    if command in _GIT_READ_ONLY_COMMANDS:
+        return False
+    if command == 'branch':
+        options = set(arg.split('=')[0] for arg in args if arg.startswith('-'))
+        return len(options & _GIT_BRANCH_LIST_OPTIONS) == 0
+    if command == 'tag':
+        return not (len(args) == 0 or '-l' in args or '--list' in args)
+    return True
+
+
+def ref_index(project: manifest.Project) -> RepoRefIndex:
+    '''
+    Return the ref index of the project - create it if not exist
+    '''
+    key = os.fspath(project.abspath)
+    with _ref_indexes_lock:
+        index = _ref_indexes.get(key)
+    if index is None:
+        index = RepoRefIndex(project)
+        with _ref_indexes_lock:
+            _ref_indexes[key] = index
+    return index
+
+
+def invalidate_ref_index(project: Optional[manifest.Project] = None):
+    '''
+    Invalidate the ref index of the project, or of all projects if project is None
+    (e.g. after west update that run git commands by itself)
+    '''
+    with _ref_indexes_lock:
+        if project is None:
+            _ref_indexes.clear()
+        elif project.abspath is not None:
+            _ref_indexes.pop(os.fspath(project.abspath), None)
+
+##########################################
+
+
+##########################################
+# Persistent reader of git objects
+
+class CatFileBatch:
+    '''
+    Long-lived "git cat-file --batch" process of one repository.
+    All the blob and commit lookups of the repository (read_at() and project_sha())
+    are sent to the same process, one line per object, instead of new git process for each one.
+
+    Use cat_file() to get the reader of a project.
+
+    The process runs in the loop of the git engine, and each lookup holds the lock of the
+    repository in the engine, so lookups never run while other git command of mpv changes it.
+    '''
+    def __init__(self, project: manifest.Project):
+        self.name = project.name
+        self._cwd = os.fspath(project.abspath)
+        self._engine = git_engine()
+        self._process = self._engine.run(asyncio.create_subprocess_exec(
+            'git', 'cat-file', '--batch', cwd=self._cwd,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE))
+        i_logger.dbg(f"CatFileBatch() - start cat-file process for project: {self.name}, pid: {self._process.pid}")
+
+    async def _get(self, name: str):
+        async with self._engine.project_lock(self._cwd):
+            self._process.stdin.write(name.encode('utf-8') + b'\n')
+            await self._process.stdin.drain()
+            header = (await self._process.stdout.readline()).decode('utf-8', errors='ignore').split()
+            # "<name> missing" or "<name> ambiguous"
+            if len(header) != 3:
+                return header
+            sha, obj_type, size = header
+            # Each content end with new line
+            content = await self._process.stdout.readexactly(int(size) + 1)
+        return sha, obj_type, content[:-1]
+
+    def get(self, name: str):
+        '''
+        Return tuple of (sha, type, content) of the object,
+        or None if the object doesn't exist.
+        name is any git object name, e.g. "origin/main^{commit}" or "HEAD:west.yml"
+        '''
+        obj = self._engine.run(self._get(name))
+        if len(obj) != 3:
+            i_logger.dbg(f"CatFileBatch.get() - project: {self.name}, object: {name} - {' '.join(obj)}")
+            return None
+        return obj
+
+    async def _close(self):
+        if self._process.returncode is None:
+            self._process.stdin.close()
+            await self._process.wait()
+
+    def close(self):
+        if self._engine.in_loop():
+            # Called by a git command of the engine that changed refs - the process
+            # exit when its input is closed, no need to wait for it
+            self._process.stdin.close()
+            return
+        self._engine.run(self._close())
+
+
+_cat_files: Dict[str, CatFileBatch] = {}
+_cat_files_lock = threading.Lock()
+
+
+def cat_file(project: manifest.Project) -> CatFileBatch:
+    '''
+    Return the cat-file reader of the project - start it if not exist.
+    The reader is kept until the refs of the project changed, or until mpv exit.
+    '''
+    key = os.fspath(project.abspath)
+    with _cat_files_lock:
+        reader = _cat_files.get(key)
+        if reader is None:
+            reader = CatFileBatch(project)
+            _cat_files[key] = reader
+    return reader
+
+
+def close_cat_file(project: Optional[manifest.Project] = None):
+    '''
+    Stop the cat-file reader of the project, or of all projects if project is None
+    '''
+    with _cat_files_lock:
+        if project is None:
+            readers = list(_cat_files.values())
+            _cat_files.clear()
+        elif project.abspath is not None:
+            reader = _cat_files.pop(os.fspath(project.abspath), None)
+            readers = [reader] if reader is not None else []
+        else:
+            readers = []
+    for reader in readers:
+        reader.close()
+
+
+atexit.register(close_cat_file)
+
+
+def read_at(project: manifest.Project, path: str, rev: str) -> bytes:
+    '''
+    Read file contents in the project at a specific revision, as Project.read_at()
+    '''
+    obj = cat_file(project).get(f"{rev}:{path}")
+    if obj is None:
+        raise subprocess.CalledProcessError(128, ['show', f"{rev}:{path}"])
+    return obj[2]
+
+
+def project_sha(project: manifest.Project, rev: str) -> str:
+    '''
+    Get the SHA of commit for a project revision, as Project.sha()
+    '''
+    obj = cat_file(project).get(f"{rev}^{{commit}}")
+    if obj is None:
+        raise subprocess.CalledProcessError(128, ['rev-parse', f"{rev}^{{commit}}"])
+    return obj[0]
+
+
+def refs_changed(project: Optional[manifest.Project] = None):
+    '''
+    Drop the cached information of the refs of the project (or of all projects, if project is None)
+    '''
+    invalidate_ref_index(project)
+    close_cat_file(project)
+
+##########################################
+
+
 def get_current_bts(project: manifest.Project):
     '''
     Return the current branch or tag or sha of the git repo
     '''
     i_logger.dbg(f"get_current_bts() - project: {project}")
     bts = ""
+    index = ref_index(project)
     
     # 1. Check if repo is checkout to branch
-    cp = project.git(f"branch --show-current",
-                 capture_stdout=True, capture_stderr=True,
-                 check=False)
-    branch =  cp.stdout.decode('ascii').strip()
+    branch = index.head_branch
     i_logger.dbg(f"get_current_bts() - current branch is: {branch}")
 
     # The branch is NULL - or empty, it might be that we should checkout tag
@@ -167,10 +987,13 @@ def get_current_bts(project: manifest.Project):
 
     # 2. Check if repo is checkout to tag
     i_logger.dbg(f"get_current_bts() - not in branch, try to find tag")
-    cp = project.git(f"describe --tags HEAD",
-                 capture_stdout=True, capture_stderr=True,
-                 check=False)
-    tag =  cp.stdout.decode('ascii').strip()
+    tag = index.head_tag()
+    if tag is None:
+        # No single tag on HEAD - find the nearest tag
+        cp = mpv_git(project, f"describe --tags HEAD",
+                     capture_stdout=True, capture_stderr=True,
+                     check=False)
+        tag =  cp.stdout.decode('ascii').strip()
     i_logger.dbg(f"get_current_bts() - current tag is: {tag}")
     if len(tag) > 0 and "fatal" not in tag:
         ret = tag
@@ -181,7 +1004,7 @@ def get_current_bts(project: manifest.Project):
     
     # 3. Check if repo is checkout to tag
     i_logger.dbg(f"get_current_bts() - not in tag, try to find sha")
-    ret = str(project.sha("HEAD"))[0:6]
+    ret = str(index.head_sha)[0:6]
     bts = "sh"
     i_logger.dbg(f"get_current_bts() - current sha is: {ret}, bts: {bts}")
     return ret, bts
@@ -195,78 +1018,217 @@ def is_tag_branch_commit(project: manifest.Project, rev: str) -> str:
     """
 
     i_logger.dbg(f"is_tag_branch_commit() - project name: {project.name}, rev: {rev}")
+    index = ref_index(project)
 
     # check if this is remote branch
-    cp = project.git(f"show-ref --verify refs/remotes/origin/{rev}", 
-                     check=False, capture_stdout=True, capture_stderr=True)
-    cp_lines = cp.stdout.decode('ascii', errors='ignore').strip(' "\n\r').splitlines()
-    if (len(cp_lines)):
+    if index.has_branch(rev, True):
         return "br_r"
 
     # first check for local branch
-    cp = project.git(f"show-ref --verify refs/heads/{rev}", 
-                     check=False, capture_stdout=True, capture_stderr=True)
-    cp_lines = cp.stdout.decode('ascii', errors='ignore').strip(' "\n\r').splitlines()
-    if (len(cp_lines)):
+    if index.has_branch(rev, False):
         return "br"
 
     # check if tag
-    cp = project.git(f"show-ref --verify refs/tags/{rev}", 
-                     check=False, capture_stdout=True, capture_stderr=True)
-    cp_lines = cp.stdout.decode('ascii', errors='ignore').strip(' "\n\r').splitlines()
-    if (len(cp_lines)):
+    if index.is_tag(rev):
         return "tg"
 
     # check if commit
-    cp = project.git(f"cat-file -t {rev}", 
-                     check=False, capture_stdout=True, capture_stderr=True)
-    cp_lines = cp.stdout.decode('ascii', errors='ignore').strip(' "\n\r').splitlines()
-    if (len(cp_lines)):
+    if cat_file(project).get(rev) is not None:
         return "cm"
 
 
     return None
 
 
-def get_remote_branch_tag(project: manifest.Project):
+##########################################
+# Cache of remote refs (ls-remote)
+
+# Default time (in seconds) to use the remote refs from cache.
+# Can be changed with: west config mpv.remote-refs-ttl <seconds> (0 to disable the cache)
+REMOTE_REFS_TTL = 120
+
+
+class RemoteRefs:
+    '''
+    The branches, tags and default branch (HEAD) of remote repository,
+    as returned by one ls-remote.
+    '''
+    def __init__(self, heads: Dict[str, str], tags: Dict[str, str],
+                 head: Optional[str], time_read: float, from_cache: bool = False):
+        self.heads = heads
+        '''branch name -> sha'''
+        self.tags = tags
+        '''tag name -> sha of the commit (peeled for annotated tags)'''
+        self.head = head
+        '''default branch of the remote, or None'''
+        self.time_read = time_read
+        self.from_cache = from_cache
+
+    def as_dict(self) -> Dict:
+        return {'heads': self.heads, 'tags': self.tags, 'head': self.head, 'time': self.time_read}
+
+    @staticmethod
+    def from_dict(data: Dict) -> 'RemoteRefs':
+        return RemoteRefs(data['heads'], data['tags'], data['head'], data['time'], from_cache=True)
+
+    @staticmethod
+    def from_ls_remote(output: str) -> 'RemoteRefs':
+        # The output of git ls-remote --symref is:
+        # ref: refs/heads/main	HEAD
+        # d377143716e7fda2400302c301ea84955789ba03	HEAD
+        # d377143716e7fda2400302c301ea84955789ba03	refs/heads/main
+        # 5f1e0b7ac2e4bb13c51dd3d9d3b8a2f9f4fd2a1c	refs/tags/tag_1
+        # d377143716e7fda2400302c301ea84955789ba03	refs/tags/tag_1^{}
+        heads = {}
+        tags = {}
+        head = None
+        for line in output.splitlines():
+            words = line.split()
+            if len(words) == 3 and words[0] == 'ref:' and words[2] == 'HEAD':
+                head = words[1][len('refs/heads/'):]
+            elif len(words) == 2 and words[1].startswith('refs/heads/'):
+                heads[words[1][len('refs/heads/'):]] = words[0]
+            elif len(words) == 2 and words[1].startswith('refs/tags/'):
+                tag = words[1][len('refs/tags/'):]
+                if tag.endswith('^{}'):
+                    tags[tag[:-3]] = words[0]
+                else:
+                    tags.setdefault(tag, words[0])
+        return RemoteRefs(heads, tags, head, time.time())
+
+
+_remote_refs: Dict[str, RemoteRefs] = {}
+_remote_refs_lock = threading.Lock()
+
+
+def _remote_refs_file() -> Path:
+    topdir = Path(util.west_topdir(start=Path.cwd(), fall_back=True)).resolve()
+    return topdir.joinpath('log-mpv', 'remote-refs.json')
+
+
+def _remote_refs_ttl() -> int:
+    topdir = util.west_topdir(start=Path.cwd(), fall_back=True)
+    try:
+        return Configuration(topdir).getint('mpv.remote-refs-ttl', default=REMOTE_REFS_TTL)
+    except ValueError:
+        i_logger.wrn(f"mpv.remote-refs-ttl should be number of seconds, use default: {REMOTE_REFS_TTL}")
+        return REMOTE_REFS_TTL
+
+
+def _remote_key(project: manifest.Project) -> str:
+    # The manifest project has no url in west.yml - use its origin
+    return project.url if project.url else f"{project.abspath}#origin"
+
+
+def _load_remote_refs_file() -> Dict:
+    try:
+        return json.loads(_remote_refs_file().read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_remote_refs(key: str, refs: Optional[RemoteRefs]):
     '''
-    return string with all remote branches and tags
+    Update (or remove if refs is None) one remote in the cache file.
+    Call with _remote_refs_lock locked.
+    '''
+    cache_file = _remote_refs_file()
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    data = _load_remote_refs_file()
+    if refs is None:
+        data.pop(key, None)
+    else:
+        data[key] = refs.as_dict()
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    tmp_file.write_text(json.dumps(data))
+    os.replace(tmp_file, cache_file)
+
+
+def remote_refs(project: manifest.Project, refresh: bool = False) -> RemoteRefs:
+    '''
+    Return the refs of the remote of the project.
+    The refs are taken from the cache (log-mpv/remote-refs.json) if they are younger than
+    mpv.remote-refs-ttl seconds, otherwise read with one ls-remote
+    that is limited to the default branch, the branches and the tags.
+    '''
+    key = _remote_key(project)
+    ttl = _remote_refs_ttl()
+    if not refresh and ttl > 0:
+        with _remote_refs_lock:
+            refs = _remote_refs.get(key)
+            if refs is None:
+                data = _load_remote_refs_file()
+                if key in data:
+                    refs = RemoteRefs.from_dict(data[key])
+        if refs is not None and time.time() - refs.time_read < ttl:
+            i_logger.dbg(f"remote_refs() - project: {project.name}, use cache from {time.time() - refs.time_read:.0f} seconds ago")
+            return refs
+
+    remote = project.url if project.url else 'origin'
+    cp = mpv_git(project, ['ls-remote', '--symref', remote, 'HEAD', 'refs/heads/*', 'refs/tags/*'],
+                 check=False, capture_stdout=True, capture_stderr=True)
+    refs = RemoteRefs.from_ls_remote(cp.stdout.decode('utf-8', errors='ignore'))
+    i_logger.dbg(f"remote_refs() - project: {project.name}, branches: {len(refs.heads)}, tags: {len(refs.tags)}, head: {refs.head}")
+    if cp.returncode:
+        i_logger.wrn(f"ls-remote failed in project {project.name}: {cp.stderr.decode('utf-8', errors='ignore').strip()}")
+        return refs
+
+    with _remote_refs_lock:
+        _remote_refs[key] = refs
+        if ttl > 0:
+            _save_remote_refs(key, refs)
+    return refs
+
+
+def invalidate_remote_refs(project: manifest.Project):
+    '''
+    Remove the remote of the project from the cache (e.g. after push)
+    '''
+    key = _remote_key(project)
+    with _remote_refs_lock:
+        _remote_refs.pop(key, None)
+        if key in _load_remote_refs_file():
+            _save_remote_refs(key, None)
+
+
+def get_remote_branch_tag(project: manifest.Project, revision: Optional[str] = None):
+    '''
+    return sets of all remote branches and tags.
+    If revision is given and it is not in the cached refs, read the refs again from remote.
     '''
     i_logger.dbg(f"get_remote_branch_tag() - project name: {project.name}")
-    args = ["heads", "tags"]
-    res_dic = {}
-    # TODO: add 2 results, update code in clone depth and new project
-    for arg in args:
-        cp = project.git(f'ls-remote --{arg} -q', check=False, capture_stdout=True)
-        cp_lines = cp.stdout.decode('ascii', errors='ignore').strip(' "\n\r').splitlines()
-        cp__list = [line.split()[1] for line in cp_lines]
-        res = ', '.join(cp__list)
-        res_dic[arg] = res
+    refs = remote_refs(project)
+    if (revision is not None and refs.from_cache and
+            revision not in refs.heads and revision not in refs.tags):
+        i_logger.dbg(f"get_remote_branch_tag() - {revision} is not in cache, read again from remote")
+        refs = remote_refs(project, refresh=True)
 
-    i_logger.dbg(f'get_remote_branch_tag() - the branches of {project.name} are: {res_dic["heads"]}')
-    i_logger.dbg(f'get_remote_branch_tag() - the tags of {project.name} are: {res_dic["tags"]}')
-    return res_dic["heads"], res_dic["tags"]
+    i_logger.dbg(f'get_remote_branch_tag() - the branches of {project.name} are: {set(refs.heads)}')
+    i_logger.dbg(f'get_remote_branch_tag() - the tags of {project.name} are: {set(refs.tags)}')
+    return set(refs.heads), set(refs.tags)
+
+##########################################
 
 
 
 # TODO: check with tag and branch
 def check_branch_ahead_remote(project: manifest.Project, branch: Optional[str] = None) -> int:
     i_logger.dbg(f"check_branch_ahead_remote() - project: {project.name}, branch: {branch}")
+    index = ref_index(project)
     if branch == None:
-        cp = project.git(f"branch --show-current",
-                     capture_stdout=True, capture_stderr=True,
-                     check=False)
-        branch =  cp.stdout.decode('ascii').strip()
+        branch = index.head_branch
         i_logger.dbg(f"check_branch_ahead_remote() - current branch is: {branch}")
 
     # The branch is NULL - or empty, it might be that we should checkout tag
     if branch == None or len(branch) == 0:
         return 0;
     
-    cp = project.git(f"rev-list --count origin/{branch}..{branch}",
-                     capture_stdout=True, capture_stderr=True,
-                     check=False)
-    ahead = int(cp.stdout.decode('ascii').strip())
+    ahead = index.ahead_remote(branch)
+    if ahead is None:
+        cp = mpv_git(project, f"rev-list --count origin/{branch}..{branch}",
+                         capture_stdout=True, capture_stderr=True,
+                         check=False)
+        ahead = int(cp.stdout.decode('ascii').strip())
     i_logger.dbg(f"check_branch_ahead_remote() - in repo: {project.name}, the branch local branch: {branch} is ahead of remote branch: {ahead}")
     
     return ahead
@@ -331,12 +1293,9 @@ def mpv_branches(project: manifest.Project) -> list:
         2. proj__ver_integ
         3. proj__ver_main
     '''
-    cp = project.git(['branch', '-r'],
-                     capture_stdout=True, capture_stderr=True,
-                     check=False)
-    branchs = cp.stdout.decode('ascii').strip()
+    branchs = ref_index(project).remotes.keys()
     i_logger.dbg(f"branchs: {branchs}")
-    branches = re.findall(r"(\S*__.*_(?:dev|integ|main))$", branchs, re.M)
+    branches = [branch for branch in branchs if re.fullmatch(r"\S*__.*_(?:dev|integ|main)", branch)]
     i_logger.dbg(f"mpv_branches: The list of branches:\n{branches}")
     
     return branches
@@ -365,32 +1324,24 @@ def branches_str(project: str, version: str):  # -> list[str, str, str]:
 
 def check_branch_exist(project: manifest.Project, branch_name: str, is_remote: bool) -> bool:
     # i_logger.dbg(f"check_branch_exist(): arguments: {locals()}")
+    index = ref_index(project)
 
     # check if it tag:
-    rtype = rev_type(project, branch_name)
-    if rtype == "tag":
+    if index.is_tag(branch_name):
         return True
     
-    remote_str = "origin/" if is_remote else ""
-    cp = None
-    if is_remote:
-        cp = project.git(['branch', '-r', '-l', f"origin/{branch_name}"],
-                         capture_stdout=True, capture_stderr=True,
-                         check=False)
-    else:
-        cp = project.git(['branch', '-l', f"{branch_name}"],
-                         capture_stdout=True, capture_stderr=True,
-                         check=False)
-
-    # i_logger.dbg(f"cp.stdout: {cp.stdout}")
-    branch_exist = True if cp.stdout else False
+    branch_exist = index.has_branch(branch_name, is_remote)
     # i_logger.dbg(f"check_branch_exist() - {branch_name} exist: {branch_exist}, is remote: {is_remote}")
     return branch_exist
 
 
 def get_remote_default_branch(project: manifest.Project) -> str:
-    ret = None
-    cp = project.git('remote show origin',
+    ret = remote_refs(project).head
+    if ret is not None:
+        i_logger.dbg(f"default_branch (from remote HEAD): {ret}")
+        return ret
+
+    cp = mpv_git(project, 'remote show origin',
                      capture_stdout=True, capture_stderr=True,
                      check=False)
     default_branch = cp.stdout.decode('ascii').strip()
@@ -408,55 +1359,313 @@ def get_remote_default_branch(project: manifest.Project) -> str:
     return ret
 
 
-def fetch_proj_depth(project: manifest.Project, fetch_depth: str):
+def fetch_proj_depth(project: manifest.Project, fetch_depth: Optional[int]) -> str:
+    '''
+    fetch the revision of the project with specific depth (None - all history of the revision),
+    point manifest-rev to it, and return the sha of the revision
+    '''
+    i_logger.dbg(f"fetch_proj_depth() - project: {project.name} fetch_depth: {fetch_depth}")
+    depth = f'--depth {fetch_depth} ' if fetch_depth else ''
+
+    # Find branches and tags of remote (one ls-remote, or from cache)
+    branches, tags = get_remote_branch_tag(project, project.revision)
+
+    if project.revision in branches:
+        i_logger.dbg(f"fetch remote branch {project.revision} with depth {fetch_depth}")
+        mpv_git(project, f'fetch -f {depth}-- {project.url} +refs/heads/{project.revision}:refs/remotes/origin/{project.revision}', check=True)
+        sha = project_sha(project, f'refs/remotes/origin/{project.revision}^{{commit}}')
+    elif project.revision in tags:
+        i_logger.dbg(f"fetch remote tag {project.revision} with depth {fetch_depth}")
+        mpv_git(project, f'fetch -f {depth}--no-tags -- {project.url} +refs/tags/{project.revision}:refs/tags/{project.revision}', check=True)
+        sha = project_sha(project, f'refs/tags/{project.revision}^{{commit}}')
+    elif has_commit(project, project.revision):
+        i_logger.inf(f"depth: {fetch_depth}, the revision is sha: {project.revision} - already fetched")
+        sha = project_sha(project, f'{project.revision}^{{commit}}')
+    else:
+        i_logger.dbg(f"The revision {project.revision} might be sha - fetch it with depth {fetch_depth}")
+        mpv_git(project, f'fetch -f {depth}-- {project.url} {project.revision}', check=True)
+        sha = project_sha(project, 'FETCH_HEAD^{commit}')
+
+    set_manifest_rev(project, sha)
+    return sha
+
+
+def is_shallow_repo(project: manifest.Project) -> bool:
+    '''
+    Check if the current repository is shallow (with clone depth)
+    or is a regular repo.
+    '''
+    cp = mpv_git(project, ['rev-parse', '--is-shallow-repository'], capture_stdout=True, capture_stderr=True, check=False)
+    is_shallow_repo = cp.stdout.decode('ascii', errors='ignore').strip()
+    i_logger.dbg(f"is_shallow_repo() - repo {project.name}, is_shallow_repo: {is_shallow_repo}")
+    if is_shallow_repo == "true":
+        i_logger.dbg(f"is_shallow_repo() - repo {project.name}, return true")
+        return True
+    
+    i_logger.dbg(f"is_shallow_repo() - repo {project.name}, return false")
+    return False
+
+
+##########################################
+# commit-msg hook of mpv
+
+# Hooks that the shared hooks directory forwards to the hooks of the repository
+GIT_HOOKS = ['applypatch-msg', 'pre-applypatch', 'post-applypatch', 'pre-commit',
+             'pre-merge-commit', 'prepare-commit-msg', 'post-commit', 'pre-rebase',
+             'post-checkout', 'post-merge', 'pre-push', 'post-rewrite', 'push-to-checkout']
+
+# Hook that forwards to the hook with the same name in the repository
+REPO_HOOK_FORWARD = '''#!/usr/bin/bash
+# Generated by mpv-update: run the hook of the repository (core.hooksPath hides it)
+repo_hook="${GIT_DIR:-.git}/hooks/$(basename "$0")"
+if [ -x "$repo_hook" ]; then
+    exec "$repo_hook" "$@"
+fi
+'''
+
+
+def render_commit_msg_hook() -> bytes:
+    '''
+    Return the content of git-hook/commit-msg with the version of mpv
+    '''
+    mod_path = Path(__file__).parent.parent
+    hook_file = mod_path.joinpath("git-hook/commit-msg")
+    i_logger.dbg(f"render_commit_msg_hook() - hook_file: {hook_file}")
+    with open(hook_file, 'r') as file:
+        lines = file.readlines()
+
+    new_line_content = f"mpv_version={__version__}"
+    # Insert the new line after the specified line
+    lines.insert(6, new_line_content + '\n')
+    return ''.join(lines).encode('utf-8')
+
+
+def render_hook_env() -> bytes:
+    '''
+    Return the values that the shared commit-msg hook reads (mpv-hook.env)
+    '''
+    values = {'mpv_version': __version__,
+              'hostname': socket.gethostname(),
+              'unamestr': platform.system(),
+              'in_docker': 'true' if os.path.isfile('/.dockerenv') else 'false'}
+    lines = [f"{name}={shlex.quote(value)}\n" for name, value in values.items()]
+    return ''.join(lines).encode('utf-8')
+
+
+def install_hook_file(hook_file: Path, content: bytes, digest: Optional[str] = None) -> bool:
+    '''
+    Write executable hook file, if its content changed.
+    Return True if the file was written.
+    '''
+    if digest is None:
+        digest = hashlib.sha256(content).hexdigest()
+    try:
+        if hashlib.sha256(hook_file.read_bytes()).hexdigest() == digest:
+            return False
+    except OSError:
+        pass
+
+    hook_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = hook_file.with_suffix(f".{os.getpid()}.tmp")
+    tmp_file.write_bytes(content)
+    st = os.stat(tmp_file)
+    os.chmod(tmp_file, st.st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.replace(tmp_file, hook_file)
+    return True
+
+
+def install_commit_msg_hook(project: manifest.Project, content: bytes, digest: str,
+                            shared_dir: Optional[Path] = None) -> bool:
+    '''
+    Install the commit-msg hook in the project, if its content changed.
+    If shared_dir is given, remove it from core.hooksPath of the project.
+    Return True if the hook was installed.
+    '''
+    if shared_dir is not None and project_hooks_path(project) == os.fspath(shared_dir):
+        i_logger.dbg(f"install_commit_msg_hook() - {project.name}: unset core.hooksPath")
+        mpv_git(project, ['config', '--unset', 'core.hooksPath'], check=False)
+
+    commit_msg_file = Path(project.abspath).joinpath(".git/hooks/commit-msg")
+    installed = install_hook_file(commit_msg_file, content, digest)
+    i_logger.dbg(f"install_commit_msg_hook() - {project.name}: installed: {installed}")
+    return installed
+
+
+def install_commit_msg_hooks(projects: list, shared_dir: Optional[Path] = None) -> List[ProjectResult]:
+    '''
+    Install the commit-msg hook in all projects, in parallel.
+    The hook is rendered once, and written only to projects that their hook is different.
+    '''
+    content = render_commit_msg_hook()
+    digest = hashlib.sha256(content).hexdigest()
+    results = run_projects(projects,
+                           lambda project: install_commit_msg_hook(project, content, digest, shared_dir),
+                           git_engine().jobs)
+    installed = [result.name for result in results if result.ok and result.value]
+    i_logger.inf(f"commit-msg hook installed in {len(installed)} of {len(projects)} projects")
+    return results
+
+
+def shared_hooks_dir(topdir: PathType) -> Path:
+    return Path(topdir).resolve().joinpath('.west', 'mpv-hooks')
+
+
+def project_hooks_path(project: manifest.Project) -> str:
+    cp = mpv_git(project, ['config', '--get', 'core.hooksPath'],
+                 capture_stdout=True, check=False)
+    return cp.stdout.decode('utf-8').strip()
+
+
+def use_shared_hooks(project: manifest.Project, shared_dir: Path) -> List[str]:
+    '''
+    Point core.hooksPath of the project to the shared hooks directory.
+    Return the names of the hooks of the repository, that the shared directory should chain.
+    '''
+    if project_hooks_path(project) != os.fspath(shared_dir):
+        i_logger.dbg(f"use_shared_hooks() - {project.name}: set core.hooksPath to {shared_dir}")
+        mpv_git(project, ['config', 'core.hooksPath', os.fspath(shared_dir)])
+
+    repo_hooks_dir = Path(project.abspath).joinpath(".git/hooks")
+    # The commit-msg that mpv copied to the repository is replaced by the shared one
+    commit_msg_file = repo_hooks_dir.joinpath("commit-msg")
+    if commit_msg_file.is_file() and b"Information added by mpv" in commit_msg_file.read_bytes():
+        i_logger.dbg(f"use_shared_hooks() - {project.name}: remove commit-msg of mpv from repository")
+        commit_msg_file.unlink()
+
+    return [hook for hook in GIT_HOOKS if os.access(repo_hooks_dir.joinpath(hook), os.X_OK)]
+
+
+def install_shared_hooks(projects: list, topdir: PathType) -> List[ProjectResult]:
+    '''
+    Install the hooks of mpv once in workspace-level directory (.west/mpv-hooks),
+    and point core.hooksPath of all projects to it.
+    The hooks of the repositories are chained by the hooks in the shared directory.
+    '''
+    shared_dir = shared_hooks_dir(topdir)
+    mod_path = Path(__file__).parent.parent
+    hook_file = mod_path.joinpath("git-hook/commit-msg-shared")
+    written = [install_hook_file(shared_dir.joinpath("mpv-hook.env"), render_hook_env()),
+               install_hook_file(shared_dir.joinpath("commit-msg"), hook_file.read_bytes())]
+
+    results = run_projects(projects, lambda project: use_shared_hooks(project, shared_dir),
+                           git_engine().jobs)
+    repo_hooks = {hook for result in results if result.ok for hook in result.value}
+    for hook in sorted(repo_hooks):
+        written.append(install_hook_file(shared_dir.joinpath(hook), REPO_HOOK_FORWARD.encode('utf-8')))
+    i_logger.inf(f"shared hooks in {shared_dir}: {written.count(True)} files updated, "
+                 f"hooks of repositories that chained: {sorted(repo_hooks)}")
+    return results
+
+##########################################
+
+
+##########################################
+# Update of one project (mpv-update)
+
+MANIFEST_REV = 'refs/heads/manifest-rev'
+
+
+def init_project(project: manifest.Project):
+    '''
+    Initialize repository of project that is not cloned yet, with the remote origin.
+    Nothing is fetched - the fetch is done once, by the update of the project.
+    '''
+    i_logger.small_banner(f"{project.name}: initializing")
+    Path(project.abspath).mkdir(parents=True, exist_ok=True)
+    mpv_git(project, ['init', '--initial-branch=init_placeholder'])
+    mpv_git(project, ['remote', 'add', '--', project.remote_name, project.url])
+
+
+def has_commit(project: manifest.Project, rev: str) -> bool:
+    return cat_file(project).get(f'{rev}^{{commit}}') is not None
+
+
+def set_manifest_rev(project: manifest.Project, sha: str):
+    '''
+    Point manifest-rev to the sha of the revision in west.yml, as west update does
+    '''
+    mpv_git(project, ['update-ref', '-m', f'mpv-update: moving to {project.revision}',
+                      MANIFEST_REV, sha])
+
+
+def checkout_detach(project: manifest.Project, sha: str):
+    try:
+        head = project_sha(project, 'HEAD')
+    except subprocess.CalledProcessError:
+        # New repository - HEAD is not born yet
+        head = None
+    if head != sha:
+        mpv_git(project, ['checkout', '--detach', sha])
+
+
+def update_submodules(project: manifest.Project):
+    if not project.submodules:
+        return
+    if project.submodules is True:
+        mpv_git(project, ['submodule', 'update', '--init', '--checkout', '--recursive'])
+        return
+    for submodule in project.submodules:
+        mpv_git(project, ['submodule', 'update', '--init', '--checkout', '--recursive',
+                          '--', submodule.path])
+
+
+def fetch_full(project: manifest.Project, prune_all: bool) -> str:
     '''
-    fetch repo with specific depth
+    fetch all branches and tags of the project (unshallow if needed),
+    point manifest-rev to the revision and return its sha
     '''
-    i_logger.dbg(f"fetch_proj_depth() - project: {project.name} fetch_depth: {fetch_depth}")
+    unshallow = []
+    if is_shallow_repo(project):
+        i_logger.dbg(f"repo {project.name} is shallow repo, use --unshallow")
+        unshallow = ['--unshallow']
+
+    mpv_git(project, ['fetch', '--prune', '-t', '-f', '--all'] + unshallow, check=False)
+    if prune_all == True:
+        i_logger.dbg(f"prune_all==True, remove local branch with gone upstream")
+        branch2del = ref_index(project).gone_branches()
+        i_logger.inf(f"list of branch to delete: \n{branch2del}")
+        if len(branch2del) > 0:
+            branch2del = ' '.join(branch2del)
+            i_logger.inf(f"delete the local branch without upstream: \n{branch2del}")
+            mpv_git(project, f"branch -D {branch2del}",
+                    check=False)
 
-    # The output of git ls-remote is two columns: sha, ref
-    # e.g.:
-    # d377143716e7fda2400302c301ea84955789ba03	refs/heads/main
-    # We need to take only the second word of each line
-    
-    # Find branches
-    branches, tags = get_remote_branch_tag(project)
-    i_logger.dbg(f"the branches are: {branches}")
-    i_logger.dbg(f"the branches are: {tags}")
-
-    cp = project.git(f'ls-remote --tags -q', check=False, capture_stdout=True)
-    tags_lines = cp.stdout.decode('ascii', errors='ignore').strip(' "\n\r').splitlines()
-    tags_list = [line.split()[1] for line in tags_lines]
-    tags = ', '.join(tags_list)
-    i_logger.dbg(f"the tags are: {tags}")
-    
-    if f"{project.revision}" in branches:
-        i_logger.dbg(f"fetch remote branch {project.revision} with depth {fetch_depth}")
-        project.git(f'fetch -f --depth {fetch_depth} -- {project.url} +refs/heads/{project.revision}:refs/remotes/origin/{project.revision}', check=True)
-    elif f"{project.revision}" in tags:
-        i_logger.dbg(f"fetch remote tag {project.revision} with depth {fetch_depth}")
-        project.git(f'fetch -f --depth {fetch_depth} --no-tags -- {project.url} +refs/tags/{project.revision}:refs/tags/{project.revision}', check=True)
+    index = ref_index(project)
+    if index.has_branch(project.revision, True):
+        rev = f'refs/remotes/origin/{project.revision}'
+    elif index.is_tag(project.revision):
+        rev = f'refs/tags/{project.revision}'
     else:
-        i_logger.inf(f"depth: {fetch_depth}, the revision is sha: {project.revision} - already fetch by west update")
-        i_logger.dbg(f"The revision {project.revision} might be sha - do no fetch, because west update did it")
+        rev = project.revision
+        if not has_commit(project, rev):
+            i_logger.dbg(f"The revision {rev} is not in branch or tag - fetch it")
+            mpv_git(project, ['fetch', '-f', '--', project.url, rev])
+            rev = 'FETCH_HEAD'
+    sha = project_sha(project, f'{rev}^{{commit}}')
+    set_manifest_rev(project, sha)
+    return sha
 
 
-def is_shallow_repo(project: manifest.Project) -> bool:
+def checkout_revision(project: manifest.Project):
     '''
-    Check if the current repository is shallow (with clone depth)
-    or is a regular repo.
+    Checkout the revision of the project, and fast-forward the branch
+    to the fetched remote branch - without going to the remote again
     '''
-    cp = project.git(['rev-parse', '--is-shallow-repository'], capture_stdout=True, capture_stderr=True, check=False)
-    is_shallow_repo = cp.stdout.decode('ascii', errors='ignore').strip()
-    i_logger.dbg(f"is_shallow_repo() - repo {project.name}, is_shallow_repo: {is_shallow_repo}")
-    if is_shallow_repo == "true":
-        i_logger.dbg(f"is_shallow_repo() - repo {project.name}, return true")
-        return True
-    
-    i_logger.dbg(f"is_shallow_repo() - repo {project.name}, return false")
-    return False
+    i_logger.inf(f"git checkout to {project.revision}")
+    mpv_git(project, ['checkout', project.revision, "--"])
+    current_branch = ref_index(project).head_branch or ""
+    if len(current_branch) == 0:
+        i_logger.dbg(f"Not in branch: result of 'git branch --show-current' is: {current_branch}")
+        return
 
+    i_logger.dbg(f"In branch (fast-forward to origin/{current_branch}): {current_branch}")
+    if ref_index(project).has_branch(current_branch, True):
+        cp = mpv_git(project, ['merge', '--ff-only', f'refs/remotes/origin/{current_branch}'],
+                     check=False)
+        if cp.returncode:
+            i_logger.wrn(f"The branch {current_branch} of {project.name} can't be fast-forward to origin/{current_branch}")
 
+##########################################
 
 
 def dont_use_zephyr():
@@ -529,7 +1738,10 @@ def buildin_update_command(topdir, manifest, projects_str: list = []):
 
     i_logger.dbg(f"buildin_update_command() - command_list: {command_list}")
     i_logger.inf(f"buildin_update_command() - Call west update command for projects: {projects_str} - ")
-    app.run(command_list)
+    with trace_span("west update"):
+        app.run(command_list)
+    # west update changed the refs of the projects by itself
+    refs_changed()
 
     # update_cmnd = Update()
     # parser = WestArgumentParser(
@@ -543,6 +1755,128 @@ def buildin_update_command(topdir, manifest, projects_str: list = []):
     # update_cmnd.run(update_args, unknown, topdir, manifest)
 
 
+##########################################
+# State of the last mpv-update
+
+class UpdateState:
+    '''
+    State of the workspace after successful mpv-update (log-mpv/update-state.json):
+    the SHA of manifest file, the arguments of the update, and for each project -
+    the revision and clone depth in manifest, its HEAD and the remote tip of the revision.
+    '''
+    def __init__(self, manifest_sha: Optional[str] = None, options: Optional[Dict] = None,
+                 projects: Optional[Dict[str, Dict]] = None):
+        self.manifest_sha = manifest_sha
+        self.options = options or {}
+        self.projects = projects or {}
+
+    @staticmethod
+    def state_file() -> Path:
+        topdir = Path(util.west_topdir(start=Path.cwd(), fall_back=True)).resolve()
+        return topdir.joinpath('log-mpv', 'update-state.json')
+
+    @staticmethod
+    def load() -> 'UpdateState':
+        try:
+            data = json.loads(UpdateState.state_file().read_text())
+            return UpdateState(data['manifest'], data['options'], data['projects'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return UpdateState()
+
+    def save(self):
+        state_file = self.state_file()
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = state_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps({'manifest': self.manifest_sha,
+                                        'options': self.options,
+                                        'projects': self.projects}, indent=2))
+        os.replace(tmp_file, state_file)
+
+    @staticmethod
+    def project_entry(project: manifest.Project) -> Dict:
+        return {'revision': project.revision, 'clone_depth': project.clone_depth}
+
+
+def manifest_file_sha(man: manifest.Manifest) -> str:
+    '''
+    Return the SHA of the blob of the manifest file (west.yml) in the working tree
+    '''
+    manifest_proj = man.get_projects(['manifest'])[0]
+    cp = mpv_git(manifest_proj, ['hash-object', '--', man.path], capture_stdout=True)
+    return cp.stdout.decode('ascii').strip()
+
+
+def remote_tip(project: manifest.Project, refresh: bool = False) -> Optional[str]:
+    '''
+    Return the SHA that the revision of the project points to in the remote
+    (from remote refs cache, or from the remote if refresh). For SHA revision - the revision itself.
+    '''
+    refs = remote_refs(project, refresh=refresh)
+    if project.revision in refs.heads:
+        return refs.heads[project.revision]
+    if project.revision in refs.tags:
+        return refs.tags[project.revision]
+    if re.fullmatch(r"[0-9a-f]{40}", project.revision):
+        return project.revision
+    return None
+
+
+def remote_tips(projects: list, refresh: bool = False) -> Dict[str, Optional[str]]:
+    '''
+    Return the remote tips of the projects; the remotes are read in parallel
+    '''
+    with concurrent.futures.ThreadPoolExecutor(max_workers=git_engine().jobs) as executor:
+        tips = executor.map(lambda project: remote_tip(project, refresh), projects)
+        return {project.name: tip for project, tip in zip(projects, tips)}
+
+
+def fetch_is_fresh(project: manifest.Project) -> bool:
+    '''
+    Return True if the project was fetched in the last mpv.remote-refs-ttl seconds
+    (by the time of FETCH_HEAD), so its remote branches can be used instead of ls-remote
+    '''
+    fetch_head = Path(project.abspath).joinpath('.git', 'FETCH_HEAD')
+    try:
+        age = time.time() - fetch_head.stat().st_mtime
+    except OSError:
+        return False
+    return age < _remote_refs_ttl()
+
+
+def resolve_remote_rev(project: manifest.Project, rev: str) -> Optional[str]:
+    '''
+    Return the SHA of the commit that rev (branch, tag or commit) points to in the remote,
+    without fetch: from the ref index if the project was fetched lately,
+    otherwise with ls-remote that is limited to rev
+    '''
+    if fetch_is_fresh(project):
+        index = ref_index(project)
+        sha = index.remotes.get(f"origin/{rev}") or index.tags.get(rev)
+        if sha is not None:
+            i_logger.dbg(f"resolve_remote_rev() - project: {project.name}, {rev} is {sha} (from ref index)")
+            return sha
+
+    cp = mpv_git(project, ['ls-remote', 'origin', f"refs/heads/{rev}", f"refs/tags/{rev}", f"refs/tags/{rev}^{{}}"],
+                 check=False, capture_stdout=True, capture_stderr=True)
+    refs = RemoteRefs.from_ls_remote(cp.stdout.decode('utf-8', errors='ignore'))
+    sha = refs.heads.get(rev) or refs.tags.get(rev)
+    if sha is None and has_commit(project, rev):
+        sha = project_sha(project, f"{rev}^{{commit}}")
+    i_logger.dbg(f"resolve_remote_rev() - project: {project.name}, {rev} is {sha}")
+    return sha
+
+
+def resolve_remote_revs(projects: list, rev: str) -> Dict[str, Optional[str]]:
+    '''
+    Return the SHAs that rev points to in the remotes of the projects; the remotes are read in parallel
+    '''
+    with concurrent.futures.ThreadPoolExecutor(max_workers=git_engine().jobs) as executor:
+        shas = executor.map(lambda project: resolve_remote_rev(project, rev), projects)
+        return {project.name: sha for project, sha in zip(projects, shas)}
+
+##########################################
+
+
 class _SelfMpv:
     def __init__(self, merge_method: Optional[MergeType] = None):
         self.merge_method = merge_method or MergeType.SOURCE_DATA
@@ -785,7 +2119,7 @@ def mpv_from_yml(man: manifest.Manifest, branch: str) -> ManifestMpv:
     Read mpv.yml from branch, and return ManifestMpv 
     '''
     manifest_proj = man.get_projects(['manifest'])[0]
-    mpv_str = manifest_proj.read_at("mpv.yml", branch).decode('utf-8')
+    mpv_str = read_at(manifest_proj, "mpv.yml", branch).decode('utf-8')
     mpv_manifest = ManifestMpv.from_data(mpv_str, topdir=man.topdir)
     return mpv_manifest
  
@@ -824,20 +2158,90 @@ def mpv_set_4_compare(mpv_manifest: ManifestMpv):
     return project_set
 
 
+################################################
+# Variants of west.yml that differ only in revisions of projects
+
+class ManifestVariant:
+    '''
+    west.yml that is parsed and validated once, and variants of it that
+    differ only in the revisions of projects (copy on write):
+    each variant keeps only the revisions that were changed in it.
+    The projects are looked up by name.
+    '''
+    def __init__(self, base: manifest.Manifest, base_dict: Optional[Dict] = None,
+                 projects: Optional[Dict[str, manifest.Project]] = None):
+        self.base = base
+        self._base_dict = base_dict if base_dict is not None else base.as_dict()
+        self._projects = projects if projects is not None else {
+            project.name: project for project in base.projects[manifest.MANIFEST_PROJECT_INDEX + 1:]}
+        self._revisions: Dict[str, str] = {}
+
+    @staticmethod
+    def from_data(west_str: str) -> 'ManifestVariant':
+        return ManifestVariant(manifest.Manifest.from_data(west_str))
+
+    def variant(self) -> 'ManifestVariant':
+        '''
+        Return new variant with the revisions of the base manifest
+        '''
+        return ManifestVariant(self.base, self._base_dict, self._projects)
+
+    def project(self, name: str) -> Optional[manifest.Project]:
+        return self._projects.get(name)
+
+    def revision(self, name: str) -> Optional[str]:
+        if name in self._revisions:
+            return self._revisions[name]
+        project = self.project(name)
+        return project.revision if project is not None else None
+
+    def set_revision(self, name: str, revision: str):
+        if name not in self._projects:
+            raise KeyError(f"project {name} is not in the manifest")
+        self._revisions[name] = revision
+
+    def as_dict(self) -> Dict:
+        '''
+        Return the dict of the manifest with the revisions of the variant.
+        Only the dicts of the changed projects are copied.
+        '''
+        manifest_dict = dict(self._base_dict['manifest'])
+        manifest_dict['projects'] = [
+            dict(project_dict, revision=self._revisions[project_dict['name']])
+            if project_dict['name'] in self._revisions else project_dict
+            for project_dict in manifest_dict['projects']]
+        return {'manifest': manifest_dict}
+
+    def as_yaml(self, **kwargs) -> str:
+        # Dump as west does, to keep multi-line strings (e.g. userdata) the same
+        return self.base._dump_yaml(self.as_dict(), **kwargs)
+
+    def __repr__(self):
+        return f"ManifestVariant(revisions={self._revisions})"
+
+
 ################################################
 # Update manifest with new west.yml for all branches of project
 def update_manifest_new_branches(manifest_proj: manifest.Project,
-                                 dev_manifest: manifest.Manifest,
-                                 integ_manifest: manifest.Manifest,
-                                 main_manifest: manifest.Manifest,
+                                 dev_manifest: ManifestVariant,
+                                 integ_manifest: ManifestVariant,
+                                 main_manifest: ManifestVariant,
                                  mpv_manifest: ManifestMpv,
                                  projname: str,
                                  ver: str,
                                  manifest_path: str,
-                                 mpv_command_name: str):
+                                 mpv_command_name: str,
+                                 push: bool = True,
+                                 journal: Optional['NewProjJournal'] = None):
+    '''
+    Create the 3 branches of the project in manifest repository, with the new west.yml and mpv.yml.
+    If push is False, the branches are only committed (the caller push them).
+    The pushed branches are recorded in the journal, and branches that are in the journal are skipped.
+    '''
     i_logger.dbg(f"update_manifest_new_branches(): arguments: {locals()}")
 
-    manifest_proj.git(['fetch', '-p'])
+    if push:
+        mpv_git(manifest_proj, ['fetch', '-p'])
     branches_names = branches_str(projname, ver)
     manifests_list = [(branches_names[BranchType.DEVELOP.value], dev_manifest)
         , (branches_names[BranchType.INTEGRATION.value], integ_manifest)
@@ -850,11 +2254,14 @@ def update_manifest_new_branches(manifest_proj: manifest.Project,
     i_logger.dbg(f"default_branch: {default_branch}")
     for manifest_pair in manifests_list:
         branch_name, manifest_obj = manifest_pair
+        if journal and branch_name in journal.created(manifest_proj.name):
+            i_logger.inf(f"update_manifest_new_branches(): Branch {branch_name} was already created - skipped")
+            continue
         i_logger.inf(f"update_manifest_new_branches(): Update manifest for branch: {branch_name}")
         i_logger.inf(f"update_manifest_new_branches(): Create new branch in manifest repo: {branch_name}")
-        manifest_proj.git(['branch', f"{branch_name}", f"origin/{default_branch}"],
+        mpv_git(manifest_proj, ['branch', f"{branch_name}", f"origin/{default_branch}"],
                           check=False)
-        manifest_proj.git(['checkout', f"{branch_name}", '--'],
+        mpv_git(manifest_proj, ['checkout', f"{branch_name}", '--'],
                           check=False)
         manifest_fd = open(manifest_path, "w")
         i_logger.dbg(f"----------------------------------------")
@@ -870,19 +2277,107 @@ def update_manifest_new_branches(manifest_proj: manifest.Project,
         manifest_mpv_fd.write(mpv_manifest.as_yaml())
         manifest_mpv_fd.close()
 
-        manifest_proj.git(['add', 'mpv.yml', 'west.yml'],
+        mpv_git(manifest_proj, ['add', 'mpv.yml', 'west.yml'],
                           check=False)
-        manifest_proj.git(['commit', '-m',
+        mpv_git(manifest_proj, ['commit', '-m',
                            f'Automatic commit by running the command "{mpv_command_name}" \nSet west.yml to use {branch_name} branches'],
                           check=False)
-        manifest_proj.git(['push', '-u', 'origin', f"{branch_name}"],
-                          check=False)
+        if push:
+            push_upstream(manifest_proj, [branch_name])
+            if journal:
+                journal.add(manifest_proj.name, [branch_name])
 
 
 #############################################
 
+class NewProjJournal:
+    '''
+    Progress of mpv-new-proj (log-mpv/new-proj-journal.json), to resume or rollback it:
+    the arguments of the command, and for each repository - the branches that were created in its remote.
+    '''
+    def __init__(self, options: Dict, repos: Optional[Dict[str, List[str]]] = None):
+        self.options = options
+        self.repos = repos or {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def journal_file() -> Path:
+        topdir = Path(util.west_topdir(start=Path.cwd(), fall_back=True)).resolve()
+        return topdir.joinpath('log-mpv', 'new-proj-journal.json')
+
+    @staticmethod
+    def load() -> Optional['NewProjJournal']:
+        try:
+            data = json.loads(NewProjJournal.journal_file().read_text())
+            return NewProjJournal(data['options'], data['repos'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self):
+        journal_file = self.journal_file()
+        journal_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = journal_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps({'options': self.options, 'repos': self.repos}, indent=2))
+        os.replace(tmp_file, journal_file)
+
+    def remove(self):
+        self.journal_file().unlink(missing_ok=True)
+
+    def created(self, name: str) -> List[str]:
+        return self.repos.get(name, [])
+
+    def add(self, name: str, branches: List[str]):
+        '''
+        Record branches that were created in the remote of repository, and save the journal.
+        May be called from worker threads.
+        '''
+        with self.lock:
+            created = self.repos.setdefault(name, [])
+            created.extend(branch for branch in branches if branch not in created)
+            self.save()
+
+    def discard(self, name: str):
+        with self.lock:
+            self.repos.pop(name, None)
+            self.save()
+
+
+def push_new_branches(project: manifest.Project, source: str, dest_branches: List[str]) -> str:
+    '''
+    Create the branches of new project in the remote of the project, without local branches:
+    resolve source (branch, tag or commit) with one ls-remote,
+    and push the sha to all branches in one atomic push.
+    '''
+    refs = remote_refs(project, refresh=True)
+    if dest_branches[BranchType.DEVELOP.value] in refs.heads:
+        i_logger.die(
+            f"The destination branch {dest_branches[BranchType.DEVELOP.value]} already exist in project {project.name} - exit")
+
+    if source in refs.heads:
+        sha, fetch_ref = refs.heads[source], f"refs/heads/{source}"
+    elif source in refs.tags:
+        sha, fetch_ref = refs.tags[source], f"refs/tags/{source}"
+    elif has_commit(project, source):
+        sha, fetch_ref = project_sha(project, f"{source}^{{commit}}"), None
+    else:
+        i_logger.die(f"The origin branch {source} doesn't exist in project {project.name} - exit")
+    i_logger.dbg(f"push_new_branches() - project: {project.name}, {source} is {sha}")
+
+    # The pushed commit must exist locally - fetch only the source ref if it is missing
+    if fetch_ref is not None and not has_commit(project, sha):
+        mpv_git(project, ['fetch', 'origin', fetch_ref])
+
+    return push_refs(project, [f"{sha}:refs/heads/{branch}" for branch in dest_branches])
+
+
 def new_proj(source_branch: str, dest_proj: str, dest_ver: str, proj_type: str,
-             self_manifest: manifest.Manifest, mpv_command_name: str):
+             self_manifest: manifest.Manifest, mpv_command_name: str,
+             push_only: bool = False, journal: Optional[NewProjJournal] = None):
+    '''
+    Create new project (or version) dest_proj:dest_ver from source_branch.
+    The branches that are created in the remotes are recorded in the journal (if given),
+    and repositories that are already in the journal are skipped (resume).
+    '''
     origin_branch = source_branch
     dest_branches = branches_str(dest_proj, dest_ver)
     i_logger.dbg(f'origin_branch: {origin_branch}')
@@ -894,9 +2389,9 @@ def new_proj(source_branch: str, dest_proj: str, dest_ver: str, proj_type: str,
     # if (org_proj == dest_proj):
     # i_logger.die(f"The name of the origin project and the name of the new project are the same - exit")
 
-    self_manifest.projects[0].git(['fetch', '-p'])
+    mpv_git(self_manifest.projects[0], ['fetch', '-p'])
     i_logger.dbg(f'Delete local branch - if exist')
-    self_manifest.projects[0].git(
+    mpv_git(self_manifest.projects[0],
         ['branch', '-D', dest_branches[BranchType.DEVELOP.value],
          dest_branches[BranchType.INTEGRATION.value], dest_branches[BranchType.MAIN.value]],
         check=False)
@@ -910,24 +2405,31 @@ def new_proj(source_branch: str, dest_proj: str, dest_ver: str, proj_type: str,
 
     i_logger.dbg(f"remote_origin_branch_full: {remote_org_branch_full}")
 
-    west_str = self_manifest.projects[0].read_at("west.yml", remote_org_branch_full).decode('utf-8')
+    west_str = read_at(self_manifest.projects[0], "west.yml", remote_org_branch_full).decode('utf-8')
     i_logger.dbg(f'west_str from branch {remote_org_branch_full}:\n{west_str}')
 
-    origin_manifest = manifest.Manifest.from_data(west_str)
-    dev_manifest = manifest.Manifest.from_data(west_str)
-    integ_manifest = manifest.Manifest.from_data(west_str)
-    main_manifest = manifest.Manifest.from_data(west_str)
+    # Parse west.yml once, the manifests of the new branches differ only in revisions
+    origin_manifest = ManifestVariant.from_data(west_str)
+    dev_manifest = origin_manifest.variant()
+    integ_manifest = origin_manifest.variant()
+    main_manifest = origin_manifest.variant()
+
+    def set_revisions(name: str, dev: str, integ: str, main: str):
+        dev_manifest.set_revision(name, dev)
+        integ_manifest.set_revision(name, integ)
+        main_manifest.set_revision(name, main)
 
     # Create new branches in all relevant repositories.
-    i = 0
-    manifest_len = len(self_manifest.projects)
 
     # List with all projects that should have branches even for data project
     mpv_manifest = ManifestMpv.from_file()
 
-    while i < manifest_len:
-        # for project in self_manifest.projects:
-        project = self_manifest.projects[i]
+    # Projects that their branches are created only in the remote (push_only)
+    push_only_projects = []
+    # Projects that get the SHA of the origin branch (source repositories of data project)
+    pin_projects = []
+
+    for project in self_manifest.projects:
         i_logger.inf(f"")
         i_logger.small_banner(f"project: {project.name}")
         i_logger.dbg(
@@ -940,7 +2442,10 @@ def new_proj(source_branch: str, dest_proj: str, dest_ver: str, proj_type: str,
             project_mpv = mpv_manifest.get_projects([project.name])[0]
             if project_mpv == None:
                 i_logger.wrn(f'project_mpv for project {project.name} is None - continue')
-                i = i + 1
+                continue
+
+            if origin_manifest.project(project.name) is None:
+                i_logger.wrn(f'project {project.name} is not in west.yml of {remote_org_branch_full} - continue')
                 continue
             
             i_logger.dbg(f'project_mpv: {project_mpv}')
@@ -949,35 +2454,36 @@ def new_proj(source_branch: str, dest_proj: str, dest_ver: str, proj_type: str,
             # if the repository is west command project - continue
             if content == ContentType.COMMANDS:
                 i_logger.dbg(f'In command repository - continue')
-                i = i + 1
                 continue
 
             # If project is external or it common to all projects:
             # only update the manifests, but don't create new branches
             if content == ContentType.EXTERNAL or content == ContentType.ALL_PROJECTS:
-                project_org = origin_manifest.projects[i]
-                revision = project_org.revision
+                revision = origin_manifest.revision(project.name)
                 i_logger.dbg(f'In {content} repository {project.name}, update revision to {revision}')
-                dev_manifest.projects[i].revision = revision
-                integ_manifest.projects[i].revision = revision
-                main_manifest.projects[i].revision = revision
+                set_revisions(project.name, revision, revision, revision)
 
             # if the type of the project is data, and repository is source_branch, take the SHA from original repository
+            # (the SHAs of all these repositories are resolved together, after the loop)
             elif proj_type == 'd' and content == ContentType.SOURCE:
-                project.git(['fetch', '-p'])
                 i_logger.dbg(f'get sha in project {project.name} in branch: {remote_org_branch_full}')
-                # project_org.git(f'{remote_org_branch_full}^{{commit}}')
-                sha = project.sha(remote_org_branch_full)
-                i_logger.dbg(f'sha of repository {project.name} is {sha} \nUpdate in all manifests')
-                dev_manifest.projects[i].revision = sha
-                integ_manifest.projects[i].revision = sha
-                main_manifest.projects[i].revision = sha
+                pin_projects.append(project)
 
             # If the repository is for data, or it is Source&Data project and it is source_branch repository -
-            # create new branches:
+            # create new branches (unless they were created by previous run):
+            elif journal and journal.created(project.name):
+                i_logger.inf(f"The branches of {dest_proj}:{dest_ver} were already created in project {project.name} - skipped")
+                set_revisions(project.name, *dest_branches)
+
+            elif push_only and (content == ContentType.DATA or
+                                (proj_type == 's' and content == ContentType.SOURCE)):
+                i_logger.inf(f"Create branches of {dest_proj}:{dest_ver} in remote of project {project.name}")
+                push_only_projects.append(project)
+                set_revisions(project.name, *dest_branches)
+
             elif (content == ContentType.DATA or
                   (proj_type == 's' and content == ContentType.SOURCE)):
-                project.git(['fetch', '-p'])
+                mpv_git(project, ['fetch', '-p'])
 
                 # Validate that origin branch exist and 
                 # destination branch doesn't exist
@@ -994,43 +2500,60 @@ def new_proj(source_branch: str, dest_proj: str, dest_ver: str, proj_type: str,
                 # project.git(['branch', origin_branch],
                 #           check=False)
                 i_logger.dbg(f'Delete local branch - if exist')
-                project.git(
+                mpv_git(project,
                     ['branch', '-D', dest_branches[BranchType.DEVELOP.value],
                      dest_branches[BranchType.INTEGRATION.value], dest_branches[BranchType.MAIN.value]],
                     check=False)
 
                 i_logger.inf(f"Create branch {dest_branches[BranchType.DEVELOP.value]} to project {project.name}")
-                project.git(
+                mpv_git(project,
                     ['branch', '--no-track', dest_branches[BranchType.DEVELOP.value], remote_org_branch_full],
                     check=False)
 
                 i_logger.inf(f"Create branch {dest_branches[BranchType.INTEGRATION.value]} to project {project.name}")
-                project.git(['branch', '--no-track', dest_branches[BranchType.INTEGRATION.value],
+                mpv_git(project, ['branch', '--no-track', dest_branches[BranchType.INTEGRATION.value],
                              remote_org_branch_full],
                             check=False)
 
                 i_logger.inf(f"Create branch {dest_branches[BranchType.MAIN.value]} to project {project.name}")
-                project.git(
+                mpv_git(project,
                     ['branch', '--no-track', dest_branches[BranchType.MAIN.value], remote_org_branch_full],
                     check=False)
 
                 i_logger.inf(f"Push all new branches to remote origin")
-                project.git(['push', '-u', 'origin'
-                                , dest_branches[BranchType.DEVELOP.value]
-                                , dest_branches[BranchType.INTEGRATION.value]
-                                , dest_branches[BranchType.MAIN.value]]
-                            , check=False)
+                push_upstream(project, list(dest_branches))
+                if journal:
+                    journal.add(project.name, dest_branches)
 
                 # Update the revision in manifests
-                dev_manifest.projects[i].revision = dest_branches[BranchType.DEVELOP.value]
-                integ_manifest.projects[i].revision = dest_branches[BranchType.INTEGRATION.value]
-                main_manifest.projects[i].revision = dest_branches[BranchType.MAIN.value]
+                set_revisions(project.name, *dest_branches)
 
             else:
                 i_logger.err(f"In project {project.name} - if we come to this point there is bug")
 
-        i = i + 1
-        # ############# Finish while loop
+    if len(pin_projects) > 0:
+        trace_phase("resolve sha")
+        shas = resolve_remote_revs(pin_projects, origin_branch)
+        trace_phase(None)
+        for project in pin_projects:
+            sha = shas[project.name]
+            if sha is None:
+                i_logger.die(f"The origin branch {origin_branch} doesn't exist in project {project.name} - exit")
+            i_logger.dbg(f'sha of repository {project.name} is {sha} \nUpdate in all manifests')
+            set_revisions(project.name, sha, sha, sha)
+
+    def create_branches(project: manifest.Project) -> str:
+        result = push_new_branches(project, origin_branch, dest_branches)
+        if journal:
+            journal.add(project.name, dest_branches)
+        return result
+
+    if len(push_only_projects) > 0:
+        trace_phase("push")
+        results = run_projects(push_only_projects, create_branches, git_engine().jobs)
+        trace_phase(None)
+        print_push_table(results, f"Create branches of {dest_proj}:{dest_ver}")
+        report_failures(results, mpv_command_name)
 
     i_logger.dbg(f"--------------------------------------------------")
     i_logger.dbg(f"dev_manifest :\n{dev_manifest}")
@@ -1041,7 +2564,7 @@ def new_proj(source_branch: str, dest_proj: str, dest_ver: str, proj_type: str,
     i_logger.dbg(f"--------------------------------------------------")
 
     i_logger.small_banner(f"Update manifest project with the new branches")
-    mpv_str = self_manifest.projects[0].read_at("mpv.yml", remote_org_branch_full).decode('utf-8')
+    mpv_str = read_at(self_manifest.projects[0], "mpv.yml", remote_org_branch_full).decode('utf-8')
     mpv_manifest = ManifestMpv.from_data(mpv_str, topdir=self_manifest.topdir)
     smpv = mpv_manifest.self_mpv
     if proj_type == 's':
@@ -1057,7 +2580,187 @@ def new_proj(source_branch: str, dest_proj: str, dest_ver: str, proj_type: str,
                                  dest_proj,
                                  dest_ver,
                                  self_manifest.path,
-                                 mpv_command_name)
+                                 mpv_command_name,
+                                 journal=journal)
+
+
+def load_new_proj_spec(spec_file: PathType) -> List[Dict]:
+    '''
+    Read the projects to create from YAML or CSV file.
+    Each project has: source_branch, dest_proj, dest_ver and t (d - data project (default), s - Source&Data project).
+    YAML: list of mappings (or mapping with key "projects"), e.g:
+        - source_branch: proj_1__4.2.9_dev
+          dest_proj: cust_a
+          dest_ver: 4.2.9
+          t: d
+    CSV: header line "source_branch,dest_proj,dest_ver,t"
+    '''
+    try:
+        with open(spec_file, newline='') as spec_fd:
+            if os.fspath(spec_file).endswith('.csv'):
+                rows = list(csv.DictReader(spec_fd))
+            else:
+                rows = yaml.safe_load(spec_fd)
+    except (OSError, yaml.YAMLError, csv.Error) as e:
+        i_logger.die(f"Can't read the new project spec {spec_file}: {e}")
+    if isinstance(rows, dict):
+        rows = rows.get('projects')
+    if not isinstance(rows, list) or len(rows) == 0:
+        i_logger.die(f"The new project spec {spec_file} should have list of projects")
+
+    entries = []
+    for row in rows:
+        if (not isinstance(row, dict) or not row.get('source_branch') or
+                not row.get('dest_proj') or not row.get('dest_ver')):
+            i_logger.die(f"Each project in spec {spec_file} should have source_branch, dest_proj and dest_ver, got: {row}")
+        proj_type = str(row.get('t') or 'd').strip()
+        if proj_type not in ('d', 's'):
+            i_logger.die(f"The type of project in spec {spec_file} should be d or s, got: {row}")
+        entries.append({'source_branch': str(row['source_branch']).strip(),
+                        'dest_proj': str(row['dest_proj']).strip(),
+                        'dest_ver': str(row['dest_ver']).strip(),
+                        't': proj_type})
+
+    dest_branches = [branches_str(entry['dest_proj'], entry['dest_ver'])[BranchType.DEVELOP.value]
+                     for entry in entries]
+    duplicates = {branch for branch in dest_branches if dest_branches.count(branch) > 1}
+    if len(duplicates) > 0:
+        i_logger.die(f"The new project spec {spec_file} create the same project more than once: {', '.join(sorted(duplicates))}")
+    return entries
+
+
+def source_rev(project: manifest.Project, source_branch: str) -> str:
+    '''
+    Return the revision to read source_branch in project: origin/<branch>, or the tag/commit itself
+    '''
+    index = ref_index(project)
+    if index.has_branch(source_branch, True):
+        return f"origin/{source_branch}"
+    if index.is_tag(source_branch) or cat_file(project).get(source_branch) is not None:
+        return source_branch
+    return f"origin/{source_branch}"
+
+
+def new_projs(entries: List[Dict], self_manifest: manifest.Manifest, mpv_command_name: str,
+              journal: Optional[NewProjJournal] = None):
+    '''
+    Create several projects (entries of load_new_proj_spec()) together:
+    each repository is fetched once, the branches of all projects are created in the remote
+    with one atomic push for each repository (without local branches),
+    and the branches of all projects in manifest repository are pushed in one push.
+    The created branches are recorded in the journal, and repositories in the journal are not pushed again.
+    '''
+    manifest_proj = self_manifest.projects[0]
+    mpv_manifest = ManifestMpv.from_file()
+    for entry in entries:
+        entry['branches'] = branches_str(entry['dest_proj'], entry['dest_ver'])
+
+    mpv_git(manifest_proj, ['fetch', '-p'])
+    mpv_git(manifest_proj, ['branch', '-D'] + [branch for entry in entries for branch in entry['branches']],
+            check=False, capture_stderr=True)
+
+    # The manifests of each source branch are read and parsed once
+    sources = {}
+    for entry in entries:
+        source = entry['source_branch']
+        if source not in sources:
+            rev = source_rev(manifest_proj, source)
+            try:
+                west_str = read_at(manifest_proj, "west.yml", rev).decode('utf-8')
+            except subprocess.CalledProcessError:
+                i_logger.die(f"The origin branch {source} doesn't exist in manifest repository - exit")
+            sources[source] = (rev, ManifestVariant.from_data(west_str))
+        rev, origin_manifest = sources[source]
+        entry['manifests'] = [origin_manifest.variant() for branch in entry['branches']]
+
+    # Repositories that have branches or pinned SHA in any of the projects
+    projects = []
+    for project in self_manifest.projects[1:]:
+        if not (self_manifest.is_active(project) and project.is_cloned()):
+            continue
+        project_mpv = mpv_manifest.get_projects([project.name])[0]
+        if project_mpv == None:
+            i_logger.wrn(f'project_mpv for project {project.name} is None - continue')
+            continue
+        if project_mpv.content in (ContentType.DATA, ContentType.SOURCE):
+            projects.append((project, project_mpv.content))
+
+    # One fetch and one snapshot of refs for each repository
+    def fetch_project(project: manifest.Project):
+        mpv_git(project, ['fetch', '-p'])
+        ref_index(project)
+
+    i_logger.banner(f"Fetch {len(projects)} repositories")
+    trace_phase("fetch")
+    results = run_projects([project for project, content in projects], fetch_project, git_engine().jobs)
+    trace_phase(None)
+    report_failures(results, mpv_command_name)
+
+    # Validate all projects before creating any branch
+    pushes: Dict[str, List[str]] = {}
+    created: Dict[str, List[str]] = {}
+    for project, content in projects:
+        index = ref_index(project)
+        resumed = journal is not None and len(journal.created(project.name)) > 0
+        for entry in entries:
+            source, branches = entry['source_branch'], entry['branches']
+            if entry['manifests'][0].project(project.name) is None:
+                continue
+            sha = (index.remotes.get(f"origin/{source}") or index.tags.get(source) or
+                   (project_sha(project, source) if has_commit(project, source) else None))
+            if sha is None:
+                i_logger.die(f"The origin branch {source} doesn't exist in project {project.name} - exit")
+
+            if content == ContentType.DATA or entry['t'] == 's':
+                # The branches of resumed repositories were created by previous run
+                if not resumed:
+                    if index.has_branch(branches[BranchType.DEVELOP.value], True):
+                        i_logger.die(
+                            f"The destination branch {branches[BranchType.DEVELOP.value]} already exist in project {project.name} - exit")
+                    pushes.setdefault(project.name, []).extend(f"{sha}:refs/heads/{branch}" for branch in branches)
+                    created.setdefault(project.name, []).extend(branches)
+                revisions = branches
+            else:
+                revisions = [sha] * len(branches)
+            for variant, revision in zip(entry['manifests'], revisions):
+                variant.set_revision(project.name, revision)
+
+    def create_branches(project: manifest.Project) -> str:
+        result = push_refs(project, pushes[project.name])
+        if journal:
+            journal.add(project.name, created[project.name])
+        return result
+
+    trace_phase("push")
+    results = run_projects([project for project, content in projects if project.name in pushes],
+                           create_branches, git_engine().jobs)
+    trace_phase(None)
+    print_push_table(results, f"Create branches of {len(entries)} projects")
+    report_failures(results, mpv_command_name)
+
+    # Commit the manifests of all projects, and push them together
+    i_logger.small_banner(f"Update manifest project with the new branches")
+    for entry in entries:
+        rev = sources[entry['source_branch']][0]
+        mpv_str = read_at(manifest_proj, "mpv.yml", rev).decode('utf-8')
+        entry_mpv = ManifestMpv.from_data(mpv_str, topdir=self_manifest.topdir)
+        entry_mpv.self_mpv.merge_method = MergeType.SOURCE_DATA if entry['t'] == 's' else MergeType.DATA
+        update_manifest_new_branches(manifest_proj, *entry['manifests'], entry_mpv,
+                                     entry['dest_proj'], entry['dest_ver'],
+                                     self_manifest.path, mpv_command_name, push=False, journal=journal)
+
+    branches = [branch for entry in entries for branch in entry['branches']
+                if not (journal and branch in journal.created(manifest_proj.name))]
+    if len(branches) == 0:
+        return
+    results = push_projects({manifest_proj.name: [f"refs/heads/{branch}:refs/heads/{branch}" for branch in branches]},
+                            [manifest_proj])
+    print_push_table(results, f"Push manifest repository")
+    report_failures(results, mpv_command_name)
+    if journal:
+        journal.add(manifest_proj.name, branches)
+    for branch in branches:
+        mpv_git(manifest_proj, ['branch', '--set-upstream-to', f"origin/{branch}", branch])
 
 
 class MpvUpdate(WestCommand):
@@ -1077,7 +2780,17 @@ class MpvUpdate(WestCommand):
                 In order to delete the local branch that their upstream was gone,
                 use --prune_all.
                 
-                The checkout branches will be as defined in the manifest file: west.yml''')
+                The checkout branches will be as defined in the manifest file: west.yml
+                Projects that are not cloned yet are cloned by mpv-update,
+                and each project is fetched once.
+                
+                Use -j (--jobs) to update several projects in parallel, e.g.:
+                west mpv-update -j 8
+
+                The state of the workspace is saved after each update
+                (in log-mpv/update-state.json). The next update touch only the projects
+                that their revision in west.yml or their remote tip changed.
+                Use --force-update to update all projects.''')
         )
 
     def do_add_parser(self, parser_adder):
@@ -1116,162 +2829,718 @@ class MpvUpdate(WestCommand):
                                     and use depth=1 for **ALL** repos.
                                     Can not define with --full-clone''')
 
+        parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                            help='''Number of projects to update in parallel (default: 1).
+                                    The output of each project is printed when the project finish.''')
+
+        parser.add_argument('--hooks', dest='hooks', choices=['copy', 'shared'],
+                            help='''How to install the git hooks of mpv (saved in west config mpv.hooks):
+                                    copy - copy commit-msg hook to .git/hooks of each project (default);
+                                    shared - install the hooks once in .west/mpv-hooks,
+                                    and point core.hooksPath of each project to it.
+                                    The existing hooks of the projects are chained.''')
+
+        parser.add_argument('--force-update', dest='force_update', action='store_true',
+                            help='''Update all projects, even if they didn't change
+                                    since the last update.''')
+
+        add_trace_argument(parser)
+
         return parser
 
 
-    def do_run(self, args, unknown):
-        i_logger.inf(f"")
-        i_logger.inf(f"mpv-update")
-        i_logger.inf(f"-----------")
-        i_logger.banner(f"Update workspace: {util.west_topdir()}")
-        i_logger.inf(f"args: {args}")
+    def do_run(self, args, unknown):
+        start_trace(args.trace, self.name)
+        i_logger.inf(f"")
+        i_logger.inf(f"mpv-update")
+        i_logger.inf(f"-----------")
+        i_logger.banner(f"Update workspace: {util.west_topdir()}")
+        i_logger.inf(f"args: {args}")
+
+        # Update we don't Zephyr project
+        dont_use_zephyr()
+
+        # Update the components that the user want to download
+        update_filter_config(self.manifest, args)
+
+        if args.depth_1==True and args.full_clone==True:
+            i_logger.die("Can not define simultaneously --depth-1 and full-clone")
+
+        if args.jobs < 1:
+            i_logger.die(f"The number of jobs should be at least 1 (jobs: {args.jobs})")
+
+        in_linux = False
+        if sys.platform == "linux" or sys.platform == "linux2":
+            in_linux = True
+        i_logger.dbg(f"in_linux: {in_linux}")
+
+
+        trace_phase("manifest update")
+        i_logger.banner(f"Update west.yml in manifest repository")
+        i_logger.dbg(f"args.manifest_rev: {args.manifest_rev}")
+        manifest_proj = self.manifest.get_projects(['manifest'])[0]
+        mpv_git(manifest_proj, ['fetch', '-t', '-f', '--all'])
+
+        # Set manifest project to the request revision
+        if args.manifest_rev is not None:
+            i_logger.inf(f"Set manifest project to revision: {args.manifest_rev}")
+            mpv_git(manifest_proj, ['checkout', args.manifest_rev, "--"])
+        else:
+            i_logger.dbg(f"args.manifest_rev is None: {args.manifest_rev}")
+
+
+        # Check that we not ahead of remote branch.
+        # If we ahead - our branch is more up-to-date than remote,
+        # and the pull will not update our branch.
+        # It that case - ask the user to push the branch, 
+        # or to pull -f from remote.
+        #
+        # git rev-list --count origin/main..main
+        ######################################################
+        # TODO: Add unit test for this case
+        ######################################################
+        ahead = check_branch_ahead_remote(manifest_proj)
+        if ahead > 0:
+            i_logger.die(f"The manifest repo ({manifest_proj.name}) is more update than your remote.\nFirst call git push from manifest repo, \nand than call mpv-update again.")
+
+        i_logger.dbg(f"call manifest_proj - git pull")
+        # TODO: if in tag - don't do pull
+        mpv_git(manifest_proj, 'pull', check=False)
+        self.manifest = manifest.Manifest.from_file()
+
+        # Find the projects that didn't change since the last update
+        trace_phase("up to date check")
+        state = UpdateState.load()
+        new_state = UpdateState(manifest_file_sha(self.manifest),
+                                {'component': sorted(args.component),
+                                 'full_clone': args.full_clone,
+                                 'depth_1': args.depth_1})
+        up_to_date = self.up_to_date_projects(args, state, new_state)
+        if len(up_to_date) > 0 and all(project.name in up_to_date for project in self.manifest.projects
+                                       if project.name != 'manifest' and self.manifest.is_active(project)):
+            i_logger.inf(f"All projects are up to date")
+
+        trace_phase("checkout loop")
+        i_logger.banner(f"Clone, fetch and checkout projects to the revision in manifest file")
+        mpv_manifest = mpv_from_yml(self.manifest, "HEAD")
+        results = run_projects(self.manifest.projects,
+                               lambda project: self.update_project(project, args, mpv_manifest, up_to_date),
+                               args.jobs)
+
+        trace_phase("hook install")
+        i_logger.banner(f"Install commit-msg hook")
+        hook_projects = [project for project in self.manifest.projects
+                         if project.name == 'manifest' or project.is_cloned()]
+        hooks_mode = Configuration(self.topdir).get('mpv.hooks', default='copy')
+        if args.hooks is not None and args.hooks != hooks_mode:
+            update_config('mpv', 'hooks', args.hooks)
+        if (args.hooks or hooks_mode) == 'shared':
+            hook_results = install_shared_hooks(hook_projects, self.topdir)
+        else:
+            # Moved from shared hooks - remove the shared directory from core.hooksPath
+            shared_dir = shared_hooks_dir(self.topdir) if hooks_mode == 'shared' else None
+            hook_results = install_commit_msg_hooks(hook_projects, shared_dir)
+
+        trace_phase("save state")
+        self.save_state(new_state, results)
+        trace_phase(None)
+        report_failures(results + hook_results, "mpv-update")
+
+    def state_projects(self) -> list:
+        '''
+        Return the projects that are saved in the state of update
+        '''
+        return [project for project in self.manifest.projects
+                if (project.name != 'manifest' and
+                    self.manifest.is_active(project) and
+                    project.is_cloned())]
+
+    def up_to_date_projects(self, args, state: UpdateState, new_state: UpdateState) -> set:
+        '''
+        Return the names of projects that their entry in manifest, their HEAD
+        and their remote tip are the same as in the last update.
+        '''
+        if args.force_update or args.prune_all:
+            i_logger.dbg(f"up_to_date_projects() - update all projects (force_update: {args.force_update}, prune_all: {args.prune_all})")
+            return set()
+        if state.options != new_state.options or len(state.projects) == 0:
+            i_logger.dbg(f"up_to_date_projects() - no state of update with the same options")
+            return set()
+
+        projects = [project for project in self.state_projects()
+                    if state.projects.get(project.name, {}).get('entry') == UpdateState.project_entry(project)]
+        # Skip a project only by its current remote tip - not by tip from the cache
+        tips = remote_tips(projects, refresh=True)
+        up_to_date = set()
+        for project in projects:
+            project_state = state.projects[project.name]
+            if (tips[project.name] is not None and
+                    tips[project.name] == project_state['remote'] and
+                    project_sha(project, 'HEAD') == project_state['head']):
+                up_to_date.add(project.name)
+        i_logger.dbg(f"up_to_date_projects() - projects: {up_to_date}")
+        return up_to_date
+
+    def save_state(self, new_state: UpdateState, results: List[ProjectResult]):
+        '''
+        Save the state of the projects that updated successfully
+        '''
+        failed = {result.name for result in results if not result.ok}
+        projects = [project for project in self.state_projects() if project.name not in failed]
+        tips = remote_tips(projects)
+        for project in projects:
+            new_state.projects[project.name] = {'entry': UpdateState.project_entry(project),
+                                                'head': project_sha(project, 'HEAD'),
+                                                'remote': tips[project.name]}
+        new_state.save()
+        i_logger.dbg(f"save_state() - saved state of {len(projects)} projects")
+
+    def update_project(self, project: manifest.Project, args, mpv_manifest: ManifestMpv,
+                       up_to_date: Optional[set] = None):
+        '''
+        Fetch and checkout one project to the revision in manifest file.
+        Called from the worker pool - may run in parallel to other projects.
+        '''
+        i_logger.banner(f"project: {project.name}")
+        if up_to_date is not None and project.name in up_to_date:
+            i_logger.inf(f"Project {project.name} is up to date - skipped")
+            return
+        i_logger.inf(f"project location: {project.abspath}")
+        i_logger.dbg(
+            f"Project {project.name} is active: {self.manifest.is_active(project)} and is cloned: {project.is_cloned()}, clone-depth: {project.clone_depth}")
+        project_mpv = mpv_manifest.get_projects([project.name])[0]
+
+        content: ContentType = None
+        if project_mpv == None:
+            i_logger.wrn(f'project_mpv for project {project.name} is None - continue')
+        else:
+            content = project_mpv.content
+
+        if project.name == 'manifest':
+            # TODO: copy if we are in linux
+            i_logger.inf(f"Skipped manifest project")
+            return
+        if not self.manifest.is_active(project):
+            i_logger.inf(f"Project {project.name} is not active")
+            return
+
+        if not project.is_cloned():
+            init_project(project)
+
+        if content == ContentType.COMMANDS:
+            # The west commands are updated as west update does - detached HEAD on the revision
+            sha = fetch_proj_depth(project, project.clone_depth)
+            checkout_detach(project, sha)
+        # Do full clone only if clone depth is less then 1 or argument full-clone exist
+        elif (args.depth_1 == False and ((project.clone_depth == None or project.clone_depth < 1) or args.full_clone == True)):
+            i_logger.inf(f"fetch all content")
+            fetch_full(project, args.prune_all)
+            checkout_revision(project)
+        else:
+            fetch_depth = 1 if args.depth_1 == True else project.clone_depth
+            sha = fetch_proj_depth(project, fetch_depth)
+            checkout_detach(project, sha)
+
+        update_submodules(project)
+
+
+##########################################
+# Push to remotes
+
+# Default number of pushes to the same host that run at the same time.
+# Can be changed with: west config mpv.push-jobs-per-host <number>
+PUSH_JOBS_PER_HOST = 4
+
+_host_semaphores: Dict[str, threading.Semaphore] = {}
+_host_semaphores_lock = threading.Lock()
+
+
+def remote_host(url: Optional[str]) -> str:
+    '''
+    Return the host of remote url (e.g. "gitlab.com"), or "local" for path or file:// url
+    '''
+    if not url:
+        return "local"
+    match = re.match(r"^[a-z][a-z0-9+.-]*://(?:[^@/]*@)?([^:/]+)", url)
+    if match:
+        return "local" if url.startswith("file://") else match.group(1)
+    # scp-like syntax: [user@]host:path
+    match = re.match(r"^(?:[^@/]*@)?([^:/]+):", url)
+    if match and not os.path.exists(url):
+        return match.group(1)
+    return "local"
+
+
+def host_semaphore(url: Optional[str]) -> threading.Semaphore:
+    host = remote_host(url)
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            topdir = util.west_topdir(start=Path.cwd(), fall_back=True)
+            try:
+                jobs = Configuration(topdir).getint('mpv.push-jobs-per-host', default=PUSH_JOBS_PER_HOST)
+            except ValueError:
+                i_logger.wrn(f"mpv.push-jobs-per-host should be number, use default: {PUSH_JOBS_PER_HOST}")
+                jobs = PUSH_JOBS_PER_HOST
+            _host_semaphores[host] = threading.Semaphore(max(jobs, 1))
+        return _host_semaphores[host]
+
+
+def push_refs(project: manifest.Project, refspecs: List[str]) -> str:
+    '''
+    Push refspecs to origin in one atomic push (if the remote support it),
+    with limit of parallel pushes to the same host. Return short summary of the push.
+    '''
+    with host_semaphore(project.url):
+        cp = mpv_git(project, ['push', '--atomic', '--porcelain', 'origin'] + refspecs,
+                     capture_stdout=True, capture_stderr=True, check=False)
+        if cp.returncode and b'atomic' in cp.stderr:
+            i_logger.dbg(f"push_refs() - {project.name}: the remote doesn't support --atomic")
+            cp = mpv_git(project, ['push', '--porcelain', 'origin'] + refspecs,
+                         capture_stdout=True, capture_stderr=True, check=False)
+    if cp.returncode:
+        errors = cp.stderr.decode('utf-8', errors='replace').strip().splitlines()
+        i_logger.die(f"push of {project.name} failed: {errors[-1] if errors else cp.returncode}")
+
+    # Lines of the pushed refs: <flag> TAB <from>:<to> TAB <summary>, flag "=" is up to date
+    flags = [line.split('\t')[0] for line in cp.stdout.decode('utf-8', errors='replace').splitlines()
+             if '\t' in line]
+    if len(flags) > 0 and all(flag == '=' for flag in flags):
+        return "up to date"
+    refs = [re.sub(r"^refs/(heads|tags)/", "", refspec.split(':')[-1]) for refspec in refspecs]
+    return f"pushed {' '.join(refs)}"
+
+
+def push_upstream(project: manifest.Project, branches: List[str]):
+    '''
+    Push local branches to origin in one atomic push, and set them as the upstream of the branches
+    '''
+    with host_semaphore(project.url):
+        cp = mpv_git(project, ['push', '--atomic', '-u', 'origin'] + branches,
+                     capture_stderr=True, check=False)
+    if cp.returncode:
+        errors = cp.stderr.decode('utf-8', errors='replace').strip().splitlines()
+        i_logger.die(f"push of {project.name} failed: {errors[-1] if errors else cp.returncode}")
+
+
+def push_projects(pushes: Dict[str, List[str]], projects: List[manifest.Project]) -> List[ProjectResult]:
+    '''
+    Push the refspecs of all projects (pushes - the refspecs by project name) concurrently
+    '''
+    projects = [project for project in projects if project.name in pushes]
+    return run_projects(projects, lambda project: push_refs(project, pushes[project.name]),
+                        git_engine().jobs)
+
+
+def print_push_table(results: List[ProjectResult], title: str = "Push summary"):
+    i_logger.banner(title)
+    width = max([len(result.name) for result in results] + [10])
+    i_logger.inf(f"{'repository':<{width}}  {'result':<7}  detail")
+    for result in results:
+        if result.ok:
+            i_logger.inf(f"{result.name:<{width}}  {'ok':<7}  {result.value}")
+        else:
+            i_logger.inf(f"{result.name:<{width}}  {'failed':<7}  {result.error}")
+    failed = sum(1 for result in results if not result.ok)
+    i_logger.inf(f"ok: {len(results) - failed}, failed: {failed}")
+
+##########################################
+
+
+##########################################
+# Merge of one repository (mpv-merge)
+
+class MergeStatus(enum.Enum):
+    MERGED = 0
+    FAST_FORWARD = enum.auto()
+    REVISION = enum.auto()
+    CONFLICT = enum.auto()
+    SKIPPED = enum.auto()
+
+
+class RepoMerge:
+    '''
+    The result of merge in one repository
+    '''
+    def __init__(self, name: str, strategy: str, status: MergeStatus,
+                 detail: str = "", revision: Optional[str] = None):
+        self.name = name
+        self.strategy = strategy
+        self.status = status
+        self.detail = detail
+        self.revision = revision
+        '''new revision of the repository in west.yml of destination, or None'''
+
+    def as_dict(self) -> Dict:
+        return {'strategy': self.strategy, 'status': self.status.name,
+                'detail': self.detail, 'revision': self.revision}
+
+    @staticmethod
+    def from_dict(name: str, data: Dict) -> 'RepoMerge':
+        return RepoMerge(name, data['strategy'], MergeStatus[data['status']],
+                         data['detail'], data['revision'])
+
+
+class MergeJournal:
+    '''
+    Progress of mpv-merge (log-mpv/merge-journal.json), to continue or abort it:
+    the arguments of the merge, the manifest before the merge, and for each repository -
+    its state (fetched, merged, conflict, failed), the result of merge and its refs before the merge.
+    '''
+    FETCHED = 'fetched'
+    MERGED = 'merged'
+    CONFLICT = 'conflict'
+    FAILED = 'failed'
+
+    def __init__(self, options: Dict, manifest_sha: str, repos: Optional[Dict[str, Dict]] = None,
+                 manifest_updated: bool = False):
+        self.options = options
+        self.manifest_sha = manifest_sha
+        self.repos = repos or {}
+        self.manifest_updated = manifest_updated
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def journal_file() -> Path:
+        topdir = Path(util.west_topdir(start=Path.cwd(), fall_back=True)).resolve()
+        return topdir.joinpath('log-mpv', 'merge-journal.json')
+
+    @staticmethod
+    def load() -> Optional['MergeJournal']:
+        try:
+            data = json.loads(MergeJournal.journal_file().read_text())
+            return MergeJournal(data['options'], data['manifest'], data['repos'], data['manifest-updated'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self):
+        journal_file = self.journal_file()
+        journal_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = journal_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps({'options': self.options,
+                                        'manifest': self.manifest_sha,
+                                        'manifest-updated': self.manifest_updated,
+                                        'repos': self.repos}, indent=2))
+        os.replace(tmp_file, journal_file)
+
+    def remove(self):
+        self.journal_file().unlink(missing_ok=True)
+
+    def state(self, name: str) -> Optional[str]:
+        return self.repos.get(name, {}).get('state')
+
+    def update(self, name: str, **values):
+        '''
+        Update the entry of one repository, and save the journal. May be called from worker threads.
+        '''
+        with self.lock:
+            self.repos.setdefault(name, {}).update(values)
+            self.save()
+
+    def merge(self, name: str) -> Optional[RepoMerge]:
+        entry = self.repos.get(name, {})
+        if 'merge' not in entry:
+            return None
+        return RepoMerge.from_dict(name, entry['merge'])
+
+
+class MergeContext:
+    '''
+    The branches and manifests of one merge, shared by the merge of all repositories
+    '''
+    def __init__(self, branch_from: str, branch_to: str, remote_branch_from: str,
+                 dest_mpv_manifest: 'ManifestMpv', dest_manifest: manifest.Manifest,
+                 org_manifest: manifest.Manifest,
+                 merge_method: MergeType, org_merge_method: MergeType, local_from: bool = False):
+        self.branch_from = branch_from
+        self.branch_to = branch_to
+        self.remote_branch_from = remote_branch_from
+        self.remote_branch_to = f"origin/{branch_to}"
+        self.dest_mpv_manifest = dest_mpv_manifest
+        self.dest_manifest = dest_manifest
+        self.org_manifest = org_manifest
+        self.merge_method = merge_method
+        self.org_merge_method = org_merge_method
+        self.local_from = local_from
+        '''chained merge - merge from the local branch_from, that was merged in previous hop'''
+
+    def source_ref(self, project: manifest.Project) -> str:
+        '''
+        Return the ref to merge from in the project
+        '''
+        if self.local_from:
+            if ref_index(project).has_branch(self.branch_from, False):
+                return f"refs/heads/{self.branch_from}"
+            return f"origin/{self.branch_from}"
+        return self.remote_branch_from
+
+
+def merge_strategy(content: ContentType, context: MergeContext) -> str:
+    '''
+    Return the type of merge of repository: 'git merge', 'sha' or 'revision'
+    '''
+    # 1. Regular git merge - if in DATA repository
+    #    or in SOURCE repository and merge method of SOURCE_DATA
+    if (content == ContentType.DATA or
+            content == ContentType.SOURCE and context.merge_method == MergeType.SOURCE_DATA):
+        return 'git merge'
+    # 2. sha merge; take the sha of parent branch -
+    #    if in SOURCE repository and merge method of DATA
+    #    and merge method of original branch is SOURCE_DATA
+    if (content == ContentType.SOURCE and
+            context.merge_method == MergeType.DATA and
+            context.org_merge_method == MergeType.SOURCE_DATA):
+        return 'sha'
+    # 3. Copy revision merge
+    return 'revision'
+
+
+def is_ancestor(project: manifest.Project, ancestor: str, rev: str) -> bool:
+    cp = mpv_git(project, ['merge-base', '--is-ancestor', ancestor, rev], check=False)
+    return cp.returncode == 0
+
+
+def merge_dest_ref(project: manifest.Project, context: MergeContext) -> str:
+    '''
+    Return the ref that the merge would be done into, like checkout and merge --ff-only:
+    the remote branch_to if the local branch_to not exist or can be fast-forwarded to it,
+    else the local branch_to
+    '''
+    local_ref = f"refs/heads/{context.branch_to}"
+    if (check_branch_exist(project, context.branch_to, False) and
+            not is_ancestor(project, local_ref, context.remote_branch_to)):
+        return local_ref
+    return context.remote_branch_to
 
-        # Update we don't Zephyr project
-        dont_use_zephyr()
 
-        # Update the components that the user want to download
-        update_filter_config(self.manifest, args)
+def checked_out_branch(project: manifest.Project) -> Optional[str]:
+    '''
+    Return the name of the branch that is checked out, or None if HEAD is detached
+    '''
+    cp = mpv_git(project, ['branch', '--show-current'], capture_stdout=True, check=False)
+    branch = cp.stdout.decode('utf-8').strip()
+    if cp.returncode or len(branch) == 0:
+        return None
+    return branch
 
-        if args.depth_1==True and args.full_clone==True:
-            i_logger.die("Can not define simultaneously --depth-1 and full-clone")
 
-        in_linux = False
-        if sys.platform == "linux" or sys.platform == "linux2":
-            in_linux = True
-        i_logger.dbg(f"in_linux: {in_linux}")
+def advance_branch(project: manifest.Project, context: MergeContext, sha: str, message: str):
+    '''
+    Fast-forward the local branch_to to sha, without merge commit.
+    If branch_to is checked out - with git merge --ff-only, else only the ref is updated (no checkout).
+    '''
+    if checked_out_branch(project) == context.branch_to:
+        cp = mpv_git(project, ['merge', '--ff-only', sha], check=False)
+        if cp.returncode:
+            i_logger.wrn(f"Can't fast-forward {context.branch_to} in {project.name} to {sha}")
+        return
 
+    branch_ref = f"refs/heads/{context.branch_to}"
+    if not check_branch_exist(project, context.branch_to, False):
+        # Like git checkout - create the local branch that track the remote branch
+        mpv_git(project, ['branch', '--track', context.branch_to, context.remote_branch_to],
+                capture_stdout=True)
+    old_sha = project_sha(project, branch_ref)
+    if old_sha != sha:
+        i_logger.dbg(f"advance_branch() - {project.name}: {branch_ref} {old_sha} -> {sha}")
+        mpv_git(project, ['update-ref', '-m', message, branch_ref, sha, old_sha])
 
-        i_logger.banner(f"Update west.yml in manifest repository")
-        i_logger.dbg(f"args.manifest_rev: {args.manifest_rev}")
-        manifest_proj = self.manifest.get_projects(['manifest'])[0]
-        manifest_proj.git(['fetch', '-t', '-f', '--all'])
 
-        # Set manifest project to the request revision
-        if args.manifest_rev is not None:
-            i_logger.inf(f"Set manifest project to revision: {args.manifest_rev}")
-            manifest_proj.git(['checkout', args.manifest_rev, "--"])
-        else:
-            i_logger.dbg(f"args.manifest_rev is None: {args.manifest_rev}")
+# First step of deepen of shallow repository (git fetch --deepen), when no depth recorded.
+# Each next step double the depth. Above DEEPEN_MAX the repository is unshallowed.
+DEEPEN_START = 32
+DEEPEN_MAX = 8192
 
+_merge_depth_lock = threading.Lock()
 
-        # Check that we not ahead of remote branch.
-        # If we ahead - our branch is more up-to-date than remote,
-        # and the pull will not update our branch.
-        # It that case - ask the user to push the branch, 
-        # or to pull -f from remote.
-        #
-        # git rev-list --count origin/main..main
-        ######################################################
-        # TODO: Add unit test for this case
-        ######################################################
-        ahead = check_branch_ahead_remote(manifest_proj)
-        if ahead > 0:
-            i_logger.die(f"The manifest repo ({manifest_proj.name}) is more update than your remote.\nFirst call git push from manifest repo, \nand than call mpv-update again.")
 
-        i_logger.dbg(f"call manifest_proj - git pull")
-        # TODO: if in tag - don't do pull
-        manifest_proj.git('pull', check=False)
-        self.manifest = manifest.Manifest.from_file()
+def _merge_depth_file() -> Path:
+    topdir = Path(util.west_topdir(start=Path.cwd(), fall_back=True)).resolve()
+    return topdir.joinpath('log-mpv', 'merge-depth.json')
 
-        # Call to west update build-in command
-        # TODO: consider call west update with -n (--narrow),
-        #       then the tags will not download
-        buildin_update_command(self.topdir, self.manifest)
 
-        i_logger.banner(f"Checkout projects to the revision in manifest file")
-        mpv_manifest = mpv_from_yml(self.manifest, "HEAD")
-        for project in self.manifest.projects:
-            i_logger.banner(f"project: {project.name}")
-            i_logger.inf(f"project location: {project.abspath}")
-            i_logger.dbg(
-                f"Project {project.name} is active: {self.manifest.is_active(project)} and is cloned: {project.is_cloned()}, clone-depth: {project.clone_depth}")
-            project_mpv = mpv_manifest.get_projects([project.name])[0]
+def merge_depth(project: manifest.Project) -> Optional[int]:
+    '''
+    Return the depth that was required to find merge base in the last merge (log-mpv/merge-depth.json)
+    '''
+    try:
+        return int(json.loads(_merge_depth_file().read_text())[project.name])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
 
-            content: ContentType = None
-            if project_mpv == None:
-                i_logger.wrn(f'project_mpv for project {project.name} is None - continue')
-            else:
-                content = project_mpv.content
-
-            if (self.manifest.is_active(project) and
-                    project.is_cloned() and
-                    content != ContentType.COMMANDS and
-                    project.name != 'manifest'):
-
-                # Do full clone only if clone depth is less then 1 or argument full-clone exist
-                # Else - Use the already clone or fetch that west update did
-                if (args.depth_1 == False and ((project.clone_depth == None or project.clone_depth < 1) or args.full_clone == True)):
-                    i_logger.inf(f"fetch all content")
-                    # check if in shallow repo (with depth!=0)
-                    unshallow = []
-                    is_shallow = is_shallow_repo(project)
-                    if is_shallow:
-                        i_logger.dbg(f"repo {project.name} is shallow repo, use --unshallow")
-                        unshallow = ['--unshallow']
-                    
-                    project.git(['fetch', '--prune', '-t', '-f', '--all'], check=False)
-                    if args.prune_all == True:
-                        i_logger.dbg(f"prune_all==True, remove local branch with gone upstream")
-                        cp = project.git('branch --format="%(if:equals=[gone])%(upstream:track)%(then)%(refname:short)%(end)"',
-                                        capture_stdout=True, capture_stderr=True,
-                                        check=False)
-                        branch2del = cp.stdout.decode('ascii').strip(' "\n\r').splitlines()
-                        # Remove empty strings:
-                        branch2del = list(filter(None, branch2del))
-                        i_logger.inf(f"list of branch to delete: \n{branch2del}")
-                        if len(branch2del) > 0:
-                            branch2del = ' '.join(branch2del)
-                            i_logger.inf(f"delete the local branch without upstream: \n{branch2del}")
-                            project.git(f"branch -D {branch2del}",
-                                check=False)
-                    i_logger.inf(f"git checkout to {project.revision}")
-                    project.git(['checkout', project.revision, "--"])
-                    cp = project.git(['branch', '--show-current'], capture_stdout=True, capture_stderr=True, check=False)
-                    current_branch = cp.stdout.decode('ascii', errors='ignore').strip()
-                    if len(current_branch) == 0:
-                        i_logger.dbg(f"Not in branch (call git fetch): result of 'git branch--show-current' is: {current_branch}")
-                        project.git(['fetch'] + unshallow,
-                                check=False)
-                    else:
-                        i_logger.dbg(f"In branch (call git pull): result of 'git branch--show-current' is: {current_branch}")
-                        project.git(['pull'] + unshallow,
-                                check=False)
-                    
-                elif args.depth_1 == True:
-                    fetch_proj_depth(project, 1)
-                else:
-                    fetch_proj_depth(project, project.clone_depth)
 
-            elif project.name == 'manifest':
-                # TODO: copy if we are in linux
-                i_logger.inf(f"Skipped manifest project")
-            else:
-                i_logger.inf(f"Project {project.name} is not active or not cloned")
+def save_merge_depth(project: manifest.Project, depth: int):
+    with _merge_depth_lock:
+        depth_file = _merge_depth_file()
+        depth_file.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            data = json.loads(depth_file.read_text())
+        except (OSError, ValueError):
+            data = {}
+        data[project.name] = depth
+        tmp_file = depth_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps(data, indent=2))
+        os.replace(tmp_file, depth_file)
 
-        for project in self.manifest.projects:
-            if project.name == 'manifest' or project.is_cloned():
-                mod_path = Path(__file__).parent.parent
-                hook_file = mod_path.joinpath("git-hook/commit-msg")
-                project_hook_dir = Path(project.abspath).joinpath(".git/hooks/")
-                i_logger.dbg(f"mod_path: {mod_path}")
-                i_logger.dbg(f"hook_file: {hook_file}")
-                i_logger.dbg(f"project_hook_dir: {project_hook_dir}")
 
-                shutil.copy(hook_file, project_hook_dir)
-                st = os.stat(hook_file)
-                os.chmod(hook_file, st.st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH )
+def has_merge_base(project: manifest.Project, rev_a: str, rev_b: str) -> bool:
+    cp = mpv_git(project, ['merge-base', rev_a, rev_b], capture_stdout=True, check=False)
+    return cp.returncode == 0
 
-                commit_msg_file = project_hook_dir.joinpath("commit-msg")   
-                with open(commit_msg_file, 'r') as file:
-                    lines = file.readlines()
 
+def deepen_to_merge_base(project: manifest.Project, rev_a: str, rev_b: str):
+    '''
+    Deepen shallow repository in growing steps (git fetch --deepen), until merge base
+    of rev_a and rev_b exist. The first step is the depth recorded in the last merge.
+    If there is no merge base in DEEPEN_MAX commits - unshallow the repository.
+    '''
+    if not is_shallow_repo(project):
+        return
+    deepened = 0
+    step = merge_depth(project) or DEEPEN_START
+    while not has_merge_base(project, rev_a, rev_b):
+        if deepened >= DEEPEN_MAX:
+            i_logger.inf(f"No merge base in {project.name} after deepen by {deepened}, use --unshallow")
+            mpv_git(project, ['-c', 'fetch.writeCommitGraph=true', 'fetch', '-p', '--unshallow'],
+                    capture_stdout=True, capture_stderr=True, check=False)
+            return
+        if deepened > 0 and not is_shallow_repo(project):
+            # All the history was fetched - there is no merge base at all
+            break
+        i_logger.inf(f"deepen {project.name} by {step} commits, to find merge base of {rev_a} and {rev_b}")
+        mpv_git(project, ['-c', 'fetch.writeCommitGraph=true', 'fetch', '-p', f'--deepen={step}'],
+                capture_stdout=True, capture_stderr=True, check=False)
+        deepened += step
+        step = deepened
+    if deepened > 0:
+        save_merge_depth(project, deepened)
+
+
+def merge_tree(project: manifest.Project, dest: str, source: str):
+    '''
+    Merge source into dest in memory (git merge-tree --write-tree), without touching
+    the working tree or the index. Return tuple of: the tree of the result and the conflicting files.
+    '''
+    cp = mpv_git(project, ['merge-tree', '--write-tree', '--name-only', '--no-messages', dest, source],
+                 capture_stdout=True, capture_stderr=True, check=False)
+    if cp.returncode not in (0, 1):
+        raise subprocess.CalledProcessError(cp.returncode, cp.args, output=cp.stdout, stderr=cp.stderr)
+    lines = cp.stdout.decode('utf-8', errors='replace').splitlines()
+    conflicts = []
+    for line in lines[1:]:
+        if len(line) == 0:
+            break
+        conflicts.append(line)
+    return lines[0], conflicts
+
+
+def unmerged_files(project: manifest.Project) -> List[str]:
+    cp = mpv_git(project, ['diff', '--name-only', '--diff-filter=U'],
+                 capture_stdout=True, check=False)
+    return cp.stdout.decode('utf-8', errors='replace').split()
+
+
+def print_merge_table(merges: List[RepoMerge], title: str = "Merge summary"):
+    '''
+    Print one table with the result of merge in all repositories
+    '''
+    i_logger.banner(title)
+    width = max([len(merge.name) for merge in merges] + [10])
+    i_logger.inf(f"{'repository':<{width}}  {'strategy':<9}  {'result':<12}  detail")
+    for merge in merges:
+        i_logger.inf(f"{merge.name:<{width}}  {merge.strategy:<9}  "
+                     f"{merge.status.name.lower():<12}  {merge.detail}")
+    counts = [f"{status.name.lower()}: {sum(1 for merge in merges if merge.status == status)}"
+              for status in MergeStatus]
+    i_logger.inf(', '.join(counts))
+    # The reasons of skip, e.g. "already merged: 120"
+    reasons = {}
+    for merge in merges:
+        if merge.status == MergeStatus.SKIPPED:
+            reasons[merge.detail] = reasons.get(merge.detail, 0) + 1
+    if len(reasons) > 0:
+        i_logger.inf("skipped - " + ', '.join(f"{reason}: {count}" for reason, count in reasons.items()))
+
+
+
+def _spec_list(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return value.split()
+    return [str(item) for item in value]
+
+
+def _spec_options(value) -> List[List[str]]:
+    '''
+    Merge options of spec entry: list of [repo, options], mapping of repo: options,
+    or string of "repo:options" separated by ";"
+    '''
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        return [[str(repo), str(opt)] for repo, opt in value.items()]
+    if isinstance(value, str):
+        value = [item.split(':', 1) for item in value.split(';') if item.strip()]
+    options = []
+    for item in value:
+        if len(item) != 2:
+            i_logger.die(f"Merge option in spec should be: repo and options, got: {item}")
+        options.append([str(item[0]).strip(), str(item[1]).strip()])
+    return options
+
+
+def load_merge_spec(spec_file: PathType) -> List[Dict]:
+    '''
+    Read the merges of batch merge from YAML or CSV file.
+    Each merge has: branch_from, branch_to, t (repos or types to merge), o (merge options to repos).
+    YAML: list of mappings (or mapping with key "merges"), e.g:
+        - branch_from: proj_1__4.2.9_dev
+          branch_to: proj_2__4.2.9_dev
+          t: [DATA]
+          o: {foo_repo: "-s ours"}
+    CSV: header line "branch_from,branch_to,t,o", t separated by spaces, o is "repo:options;repo:options"
+    '''
+    try:
+        with open(spec_file, newline='') as spec_fd:
+            if os.fspath(spec_file).endswith('.csv'):
+                rows = list(csv.DictReader(spec_fd))
+            else:
+                rows = yaml.safe_load(spec_fd)
+    except (OSError, yaml.YAMLError, csv.Error) as e:
+        i_logger.die(f"Can't read the merge spec {spec_file}: {e}")
+    if isinstance(rows, dict):
+        rows = rows.get('merges')
+    if not isinstance(rows, list) or len(rows) == 0:
+        i_logger.die(f"The merge spec {spec_file} should have list of merges")
+
+    merges = []
+    for row in rows:
+        if not isinstance(row, dict) or not row.get('branch_from') or not row.get('branch_to'):
+            i_logger.die(f"Each merge in spec {spec_file} should have branch_from and branch_to, got: {row}")
+        merges.append({'branch_from': str(row['branch_from']).strip(),
+                       'branch_to': str(row['branch_to']).strip(),
+                       't': _spec_list(row.get('t')),
+                       'o': _spec_options(row.get('o'))})
+    return merges
+
+
+def print_batch_table(hops: List[tuple]):
+    '''
+    Print one table with the results of all the merges (hops - tuples of branch_from, branch_to, merges)
+    '''
+    i_logger.banner(f"Batch merge summary")
+    width_from = max([len(hop[0]) for hop in hops] + [11])
+    width_to = max([len(hop[1]) for hop in hops] + [9])
+    statuses = [status for status in MergeStatus]
+    i_logger.inf(f"{'branch_from':<{width_from}}  {'branch_to':<{width_to}}  "
+                 + '  '.join(status.name.lower() for status in statuses) + "  conflicts")
+    for branch_from, branch_to, merges in hops:
+        counts = [f"{sum(1 for merge in merges if merge.status == status):<{len(status.name)}}"
+                  for status in statuses]
+        conflicts = ' '.join(merge.name for merge in merges if merge.status == MergeStatus.CONFLICT)
+        i_logger.inf(f"{branch_from:<{width_from}}  {branch_to:<{width_to}}  " + '  '.join(counts) + f"  {conflicts}")
 
-                new_line_content = f"mpv_version={__version__}"
-                # Insert the new line after the specified line
-                lines.insert(6, new_line_content + '\n')
-                # Write the updated content back to the file
-                with open(commit_msg_file, 'w') as file:
-                    file.writelines(lines)
+##########################################
 
 
 class MpvMerge(WestCommand):
@@ -1300,7 +3569,7 @@ class MpvMerge(WestCommand):
                 
                 PAID ATTENTION: After running this command, and after take care to merge conflicts,
                                 you should push all repo back to gitlab.
-                                The mpv-merge DON'T push by itself.
+                                The mpv-merge DON'T push by itself, unless --push is given.
                       
                 Examples:
                     Merge from branch proj_1__4.2.9_dev (proj 1, version 4.2.9) to proj_2__4.2.9_dev (proj 2 version 4.2.9):
@@ -1311,6 +3580,27 @@ class MpvMerge(WestCommand):
                     only to DATA type of repos, 
                     and add the option "-s ours" to repo foo_repo:
                     west mpv-merge -t DATA -o foo_repo "-s ours" proj_1__4.3.1_dev proj_1__4.3.1_integ
+
+                    Fetch and merge 8 repositories in parallel:
+                    west mpv-merge -j 8 proj_1__4.2.9_dev proj_2__4.2.9_dev
+
+                    Check which repositories would conflict, without checkout or merge:
+                    west mpv-merge --preflight proj_1__4.2.9_dev proj_2__4.2.9_dev
+
+                    Merge without checkout; checkout only repositories with conflicts:
+                    west mpv-merge --no-checkout proj_1__4.2.9_dev proj_2__4.2.9_dev
+
+                    After resolve and commit the conflicts (or after interrupt), continue the merge:
+                    west mpv-merge --continue
+
+                    Promote version in one run - merge dev to integ, and than integ to main:
+                    west mpv-merge proj_1__4.2.9_dev proj_1__4.2.9_integ --then proj_1__4.2.9_main
+
+                    Merge one version to several projects, from spec file (YAML or CSV):
+                    west mpv-merge --spec release-merges.yml
+
+                    Merge and push the changed repositories and the manifest:
+                    west mpv-merge --push proj_1__4.2.9_dev proj_2__4.2.9_dev
                     ''')
 
         )
@@ -1325,11 +3615,11 @@ class MpvMerge(WestCommand):
         # Remember to update west-completion.bash if you add or remove
         # flags
         parser.add_argument(
-            'branch_from',
+            'branch_from', nargs='?',
             help='''Name of the origin branch, to merge from it.''')
 
         parser.add_argument(
-            'branch_to',
+            'branch_to', nargs='?',
             help='''Name of the destination branch, to merge to it.''')
 
         parser.add_argument('-o', action='append', default=[], nargs=2,
@@ -1349,15 +3639,146 @@ class MpvMerge(WestCommand):
                                     If no type is declare, make merge to all repos
                                     ''')
 
+        parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                            help='''Number of repositories to fetch and merge in parallel (default: 1).
+                                    The output of each repository is printed when the repository finish.''')
+
+        parser.add_argument('--preflight', dest='preflight', action='store_true',
+                            help='''Only fetch and compute the merge of each repository in memory (git merge-tree),
+                                    and report which repositories and files would conflict.
+                                    No checkout, pull or merge is done, and the working trees and indexes are not changed.''')
+
+        parser.add_argument('--continue', dest='cont', action='store_true',
+                            help='''Continue interrupted merge, or merge with conflicts that were resolved and committed.
+                                    The branches and options are taken from the merge journal (log-mpv/merge-journal.json),
+                                    and repositories that were merged already are not merged again.''')
+
+        parser.add_argument('--abort', dest='abort', action='store_true',
+                            help='''Abort the merge in progress, and restore the repositories
+                                    and the manifest to their state before the merge.''')
+
+        parser.add_argument('--then', dest='then', action='append', default=[], metavar='BRANCH',
+                            help='''Chained merge: after the merge to branch_to, merge branch_to to BRANCH
+                                    (from the local branch_to, that was just merged).
+                                    May be given more than once, e.g. dev -> integ -> main.
+                                    The repositories are fetched only once for all the merges.''')
+
+        parser.add_argument('--spec', dest='spec', metavar='FILE',
+                            help='''Batch merge: do all the merges in YAML or CSV file, with one fetch of each repository.
+                                    Each merge has branch_from, branch_to, and optional t and o (like -t and -o).
+                                    YAML - list of mappings, CSV - with header line: branch_from,branch_to,t,o
+                                    (t separated by spaces, o as "repo:options;repo:options").''')
+
+        parser.add_argument('--push', dest='push', action='store_true',
+                            help='''After merge without conflicts, push the destination branch of the repositories
+                                    that were changed by the merge, and than the manifest repository.
+                                    The pushes run in parallel, up to mpv.push-jobs-per-host (default: 4) to each host.''')
+
+        parser.add_argument('--deepen', dest='deepen', action='store_true',
+                            help='''In shallow repositories, fetch more history step by step (git fetch --deepen)
+                                    until the merge base exist, instead of fetch all history (--unshallow).
+                                    The depth that was required is saved in log-mpv/merge-depth.json,
+                                    and the next merge start from it.''')
+
+        parser.add_argument('--ff', dest='ff', action='store_true',
+                            help='''Fast-forward the destination branch, without merge commit,
+                                    if it is an ancestor of the origin branch (default: always create merge commit).''')
+
+        parser.add_argument('--no-checkout', dest='no_checkout', action='store_true',
+                            help='''Create the merge commit of regular git merge without checkout
+                                    (git merge-tree, commit-tree and update-ref), and leave the working tree as is.
+                                    Repositories with conflicts, with merge options (-o), or where the destination
+                                    branch is checked out, are merged with checkout as usual.''')
+
+        add_trace_argument(parser)
 
         return parser
 
     def do_run(self, args, unknown):
+        start_trace(args.trace, self.name)
 
         i_logger.inf(f"")
         i_logger.inf(f"mpv-merge")
         i_logger.inf(f"---------")
         i_logger.inf(f"args: {args}")
+
+        journal = MergeJournal.load()
+        args.local_from = False
+        args.batch = []
+        self.fetched = set()
+        self.hops = []
+        if args.abort:
+            if journal is None:
+                i_logger.die(f"There is no mpv-merge in progress")
+            self.abort(journal)
+            return
+        if args.cont:
+            if journal is None:
+                i_logger.die(f"There is no mpv-merge in progress")
+            for option, value in journal.options.items():
+                setattr(args, option, value)
+        elif args.spec is not None:
+            if args.branch_from is not None or len(args.then) > 0 or args.preflight:
+                i_logger.die(f"--spec can't be used with branches, --then or --preflight")
+            args.batch = load_merge_spec(args.spec)
+            self.next_batch_merge(args)
+        elif args.branch_from is None or args.branch_to is None:
+            i_logger.die(f"The origin branch and the destination branch are required")
+        elif journal is not None and not args.preflight:
+            i_logger.wrn(f"Start new merge - the journal of merge from branch {journal.options['branch_from']} "
+                         f"to branch {journal.options['branch_to']} is discarded")
+
+        if args.jobs < 1:
+            i_logger.die(f"The number of jobs should be at least 1 (jobs: {args.jobs})")
+        if args.preflight and len(args.then) > 0:
+            i_logger.die(f"--preflight can't be used with --then")
+
+        # Check if to merge in the project itself
+        manifest_proj = self.manifest.projects[0]
+        i_logger.dbg(f'fetch manifest project')
+        mpv_git(manifest_proj, ['fetch', '-p'])
+        mpv_git(manifest_proj, ['fetch', '-t'])
+
+        # Chained merge (--then): each hop merge the destination branch of the previous hop
+        # into the next branch. The repositories are fetched once, and the next hop merge from
+        # the local branch - the result of the previous hop.
+        # Batch merge (--spec): the merges of the spec are done one after the other,
+        # with the same fetch and caches.
+        org_manifests = None
+        while True:
+            org_manifests = self.merge_hop(args, manifest_proj, journal, org_manifests)
+            if org_manifests is None:
+                break
+            if len(args.then) > 0:
+                args.branch_from, args.branch_to, args.then = args.branch_to, args.then[0], args.then[1:]
+                args.local_from = True
+            elif len(args.batch) > 0:
+                self.next_batch_merge(args)
+                org_manifests = None
+            else:
+                break
+            args.cont = False
+            journal = None
+
+        if len(self.hops) > 1:
+            print_batch_table(self.hops)
+        if org_manifests is None and len(args.batch) > 0:
+            i_logger.inf(f"{len(args.batch)} more merges of the spec will be done by west mpv-merge --continue")
+
+    def next_batch_merge(self, args):
+        merge = args.batch[0]
+        args.batch = args.batch[1:]
+        args.branch_from, args.branch_to = merge['branch_from'], merge['branch_to']
+        args.t, args.o = merge['t'], merge['o']
+        args.local_from = False
+
+    def merge_hop(self, args, manifest_proj: manifest.Project, journal: Optional[MergeJournal],
+                  org_manifests: Optional[tuple] = None) -> Optional[tuple]:
+        '''
+        Merge from args.branch_from to args.branch_to in all repositories.
+        org_manifests - the mpv.yml and west.yml of branch_from (parsed in previous hop), or None.
+        Return the mpv.yml and west.yml of branch_to after the merge, or None if there are conflicts.
+        '''
         i_logger.banner(f"Merge from branch {args.branch_from} to branch {args.branch_to}")
 
         i_logger.dbg(f"branch_from: {args.branch_from}")
@@ -1368,14 +3789,16 @@ class MpvMerge(WestCommand):
         # i_logger.dbg(f"type o: {type(args.o)}")
         # i_logger.dbg(f"type t: {type(args.t)}")
        
-        manifest_proj = self.manifest.projects[0]
         # local_org_branch = org_branches[BranchType.MAIN.value]
         # remote_org_branch_full
         remote_branch_from = f"origin/{args.branch_from}"
         # Check if branch_from is tag:
-        r_type = rev_type(manifest_proj, args.branch_from)
+        r_type = ref_index(manifest_proj).rev_type(args.branch_from)
         if r_type == 'tag':
             remote_branch_from = f"refs/tags/{args.branch_from}"
+        elif args.local_from and check_branch_exist(manifest_proj, args.branch_from, False):
+            # Chained merge - from the result of the previous hop
+            remote_branch_from = f"refs/heads/{args.branch_from}"
 
         # local_dest_branch = dest_branches[BranchType.DEVELOP.value]
         # remote_dest_branch_full = f"origin/{dest_branches[BranchType.DEVELOP.value]}"
@@ -1386,11 +3809,10 @@ class MpvMerge(WestCommand):
         if (args.branch_from == args.branch_to):
             i_logger.die(f"Can't to merge from branch to itself (branch name: {args.branch_to})")
 
-        # Check if to merge in the project itself
-        i_logger.dbg(f'fetch manifest project and checkout to {args.branch_to}')
-        manifest_proj.git(['fetch', '-p'])
-        manifest_proj.git(['fetch', '-t'])
-        manifest_proj.git(['checkout', args.branch_to, "--"])
+        if args.preflight:
+            self.preflight(args, manifest_proj, remote_branch_from)
+            return
+        mpv_git(manifest_proj, ['checkout', args.branch_to, "--"])
 
         # Check that we not ahead of remote branch.
         # If we ahead - our branch is more up-to-date than remote,
@@ -1402,30 +3824,256 @@ class MpvMerge(WestCommand):
         ######################################################
         # TODO: Add unit test for this case
         ######################################################
-        ahead = check_branch_ahead_remote(manifest_proj, args.branch_to)
-        if ahead > 0:
-            i_logger.die(f"The manifest repo ({manifest_proj.name}) is more update than your remote.\nFirst call git push from manifest repo, \nand than call mpv-update again.")
-        manifest_proj.git(['pull'])
+        if not args.cont:
+            ahead = check_branch_ahead_remote(manifest_proj, args.branch_to)
+            if ahead > 0:
+                i_logger.die(f"The manifest repo ({manifest_proj.name}) is more update than your remote.\nFirst call git push from manifest repo, \nand than call mpv-update again.")
+            mpv_git(manifest_proj, ['pull'])
+
+            options = {option: getattr(args, option)
+                       for option in ('branch_from', 'branch_to', 'o', 't', 'ff', 'no_checkout', 'deepen',
+                                      'then', 'local_from', 'batch')}
+            journal = MergeJournal(options, project_sha(manifest_proj, 'HEAD'))
+            journal.save()
+
+        context = self.merge_context(args, manifest_proj, args.branch_to, remote_branch_from, org_manifests)
+        dest_manifest = context.dest_manifest
+
+        # There are 3 type of merge to repository:
+        # 1. Regular git merge - if in DATA repository 
+        #    or in SOURCE repository and merge method of SOURCE_DATA
+        # 2. sha merge; take the sha of parent branch - 
+        #    if in SOURCE repository and merge method of DATA 
+        #    and merge method of original branch is SOURCE_DATA
+        # 3. Copy revision merge; take the revision name (should be tag or sha) into destination - 
+        #    if in EXTERNAL repository or ALL_PROJECTS repository 
+        #    or SOURCE repository in merge method of SOURCE_DATA or 
+        #    or SOURCE repository in merge method of DATA 
+        #    and merge method of original branch is DATA
+        #
+        # Fetch all repositories, and than merge them (in parallel with --jobs).
+        # The progress is saved in the journal - in --continue only the unfinished repositories are done.
+        projects, merges = self.merge_projects(args, context)
+        fetch_projects = [project for project in projects
+                          if journal.state(project.name) is None and project.name not in self.fetched]
+        trace_phase("fetch")
+        i_logger.banner(f"Fetch {len(fetch_projects)} repositories")
+        results = run_projects(fetch_projects, lambda project: self.journal_fetch(project, journal), args.jobs)
+        # Repositories that failed to fetch are not merged, and are fetched again by --continue
+        fetch_names = {project.name for project in fetch_projects}
+        self.fetched.update(project.name for project in projects if project.name not in fetch_names)
+        self.fetched.update(result.name for result in results if result.ok)
+        report_failures(results, "mpv-merge fetch")
+
+        trace_phase("merge")
+        i_logger.banner(f"Merge {len(projects)} repositories")
+        results = run_projects(projects,
+                               lambda project: self.journal_merge(project, args, context, journal),
+                               args.jobs)
+        trace_phase(None)
+        merges += [result.value for result in results if result.ok]
+        order = {project.name: i for i, project in enumerate(self.manifest.projects)}
+        merges.sort(key=lambda merge: order[merge.name])
+        print_merge_table(merges)
+        report_failures(results, "mpv-merge")
+
+        # west.yml is updated only once, after all repositories were merged
+        revision_merges = merges
+        if journal.manifest_updated:
+            i_logger.inf(f'west.yml was updated already in branch: {args.branch_to}')
+            revision_merges = []
+
+        # Indicate if to update west.yml in destination
+        manifest_change = False
+        for merge in revision_merges:
+            if merge.revision is not None:
+                i_logger.dbg(f'Replace revision of project {merge.name} with: \n{merge.revision}')
+                dest_manifest.get_projects([merge.name])[0].revision = merge.revision
+                manifest_change = True
+
+        # Update manifest if required
+        if manifest_change == True:
+            i_logger.inf("")
+            i_logger.inf(f'manifest has updates, west.yml should be update in branch: {args.branch_to}')
+            i_logger.dbg(f"dest_manifest AFTER changes: \n{dest_manifest.as_yaml()}")
+            manifest_fd = open(self.manifest.path, "w")
+            manifest_fd.write(dest_manifest.as_yaml())
+            manifest_fd.close()
+            mpv_git(manifest_proj, ['commit', '-a', '-m',
+                               f'Automatic commit by running the command "west mpv-merge" \nUpdate west.yml from branch {remote_branch_from} to branches {args.branch_to}'],
+                              check=False)
+        else:
+            i_logger.dbg(f'manifest did not change. not change west.yml branch in {args.branch_to}')
+        journal.manifest_updated = True
+        journal.save()
+
+        conflicts = [merge.name for merge in merges if merge.status == MergeStatus.CONFLICT]
+        if len(conflicts) > 0:
+            i_logger.wrn(f"There are conflicts in: {' '.join(conflicts)}")
+            i_logger.inf(f"Resolve and commit the conflicts, and than call west mpv-merge --continue"
+                         f" (or west mpv-merge --abort)")
+            if args.push:
+                i_logger.wrn(f"Nothing was pushed, because of the conflicts")
+        else:
+            if args.push:
+                self.push(args, merges)
+            journal.remove()
+
+        i_logger.inf("")
+        self.hops.append((args.branch_from, args.branch_to, merges))
+        if len(conflicts) > 0:
+            if len(args.then) > 0:
+                i_logger.inf(f"The merge to {' '.join(args.then)} will be done by west mpv-merge --continue")
+            return None
+        return context.dest_mpv_manifest, dest_manifest
+
+    def push(self, args, merges: List[RepoMerge]):
+        '''
+        Push branch_to of the repositories that it was advanced in them by the merge,
+        and than the manifest repository (with west.yml that point to them)
+        '''
+        trace_phase("push")
+        refspec = f"refs/heads/{args.branch_to}:refs/heads/{args.branch_to}"
+        pushes = {merge.name: [refspec] for merge in merges
+                  if merge.strategy == 'git merge' and merge.status in (MergeStatus.MERGED, MergeStatus.FAST_FORWARD)}
+        i_logger.banner(f"Push {len(pushes)} repositories")
+        results = push_projects(pushes, self.manifest.projects[1:])
 
-        i_logger.dbg(f'get mpv.yml from destination branch: {args.branch_to}')
-        dest_mpv_str = manifest_proj.read_at("mpv.yml", args.branch_to).decode('utf-8')
+        manifest_proj = self.manifest.projects[0]
+        if all(result.ok for result in results) and check_branch_ahead_remote(manifest_proj, args.branch_to) > 0:
+            results += push_projects({manifest_proj.name: [refspec]}, [manifest_proj])
+        trace_phase(None)
+        print_push_table(results)
+        report_failures(results, "mpv-merge --push")
+
+    def journal_fetch(self, project: manifest.Project, journal: MergeJournal):
+        self.fetch_project(project)
+        journal.update(project.name, state=MergeJournal.FETCHED)
+
+    def journal_merge(self, project: manifest.Project, args, context: MergeContext,
+                      journal: MergeJournal) -> RepoMerge:
+        '''
+        Merge one repository, and save its state in the journal.
+        Repositories that were merged in previous run are not merged again.
+        '''
+        state = journal.state(project.name)
+        if state == MergeJournal.MERGED:
+            i_logger.inf(f"{project.name} was merged already")
+            return journal.merge(project.name)
+        if state == MergeJournal.CONFLICT:
+            merge = self.continue_conflict(project, context, journal)
+            if merge is not None:
+                return merge
+
+        if 'head_sha' not in journal.repos.get(project.name, {}):
+            # The refs before the merge, for --abort
+            branch_sha = None
+            if ref_index(project).has_branch(context.branch_to, False):
+                branch_sha = project_sha(project, f"refs/heads/{context.branch_to}")
+            journal.update(project.name, head_branch=checked_out_branch(project),
+                           head_sha=project_sha(project, 'HEAD'), branch_sha=branch_sha)
+        try:
+            merge = self.merge_project(project, args, context)
+        except BaseException:
+            journal.update(project.name, state=MergeJournal.FAILED)
+            raise
+        state = MergeJournal.CONFLICT if merge.status == MergeStatus.CONFLICT else MergeJournal.MERGED
+        journal.update(project.name, state=state, merge=merge.as_dict())
+        return merge
+
+    def continue_conflict(self, project: manifest.Project, context: MergeContext,
+                          journal: MergeJournal) -> Optional[RepoMerge]:
+        '''
+        Check repository that had conflicts in previous run.
+        Return the result of merge, or None if the merge was aborted by the user and should be done again.
+        '''
+        merge = journal.merge(project.name)
+        conflicts = unmerged_files(project)
+        merge_head = mpv_git(project, ['rev-parse', '-q', '--verify', 'MERGE_HEAD'],
+                             capture_stdout=True, check=False)
+        if len(conflicts) > 0 or merge_head.returncode == 0:
+            i_logger.wrn(f"The merge in {project.name} is not committed yet")
+            return RepoMerge(project.name, merge.strategy, MergeStatus.CONFLICT,
+                             ' '.join(conflicts) if len(conflicts) > 0 else merge.detail)
+        if not is_ancestor(project, context.source_ref(project), f"refs/heads/{context.branch_to}"):
+            i_logger.inf(f"The merge in {project.name} was aborted, merge again")
+            return None
+        merge = RepoMerge(project.name, merge.strategy, MergeStatus.MERGED, "conflict resolved")
+        journal.update(project.name, state=MergeJournal.MERGED, merge=merge.as_dict())
+        return merge
+
+    def abort(self, journal: MergeJournal):
+        '''
+        Restore all repositories and the manifest to their state before the merge, and remove the journal
+        '''
+        branch_to = journal.options['branch_to']
+        i_logger.banner(f"Abort merge from branch {journal.options['branch_from']} to branch {branch_to}")
+        for project in self.manifest.projects:
+            entry = journal.repos.get(project.name)
+            if entry is None or 'head_sha' not in entry:
+                continue
+            i_logger.inf(f"restore {project.name}")
+            merge_head = mpv_git(project, ['rev-parse', '-q', '--verify', 'MERGE_HEAD'],
+                                 capture_stdout=True, check=False)
+            if merge_head.returncode == 0:
+                mpv_git(project, ['merge', '--abort'], check=False)
+
+            # Restore HEAD, and than the destination branch
+            if entry['head_branch'] != branch_to:
+                if entry['head_branch'] is not None:
+                    mpv_git(project, ['checkout', entry['head_branch'], '--'], check=False)
+                else:
+                    mpv_git(project, ['checkout', '--detach', entry['head_sha']], check=False)
+            branch_sha = None
+            if ref_index(project).has_branch(branch_to, False):
+                branch_sha = project_sha(project, f"refs/heads/{branch_to}")
+            if branch_sha == entry['branch_sha']:
+                continue
+            if checked_out_branch(project) == branch_to:
+                cp = mpv_git(project, ['reset', '--keep', entry['branch_sha']], check=False)
+            elif entry['branch_sha'] is not None:
+                cp = mpv_git(project, ['update-ref', f"refs/heads/{branch_to}", entry['branch_sha']], check=False)
+            else:
+                cp = mpv_git(project, ['branch', '-D', branch_to], check=False)
+            if cp.returncode:
+                i_logger.wrn(f"Can't restore branch {branch_to} in {project.name}")
+
+        if journal.manifest_updated:
+            manifest_proj = self.manifest.projects[0]
+            i_logger.inf(f"restore west.yml in branch {branch_to}")
+            mpv_git(manifest_proj, ['reset', '--keep', journal.manifest_sha], check=False)
+        journal.remove()
+        i_logger.inf(f"mpv-merge aborted")
+
+    def merge_context(self, args, manifest_proj: manifest.Project, dest_rev: str, remote_branch_from: str,
+                      org_manifests: Optional[tuple] = None) -> MergeContext:
+        '''
+        Read mpv.yml and west.yml of the destination (from dest_rev) and of the origin branch.
+        org_manifests - mpv.yml and west.yml of the origin branch, if they were parsed already.
+        '''
+        i_logger.dbg(f'get mpv.yml from destination branch: {dest_rev}')
+        dest_mpv_str = read_at(manifest_proj, "mpv.yml", dest_rev).decode('utf-8')
         dest_mpv_manifest = ManifestMpv.from_data(dest_mpv_str, topdir=self.manifest.topdir)
-        i_logger.dbg(f'dest_mpv_manifest from branch {args.branch_to}: \n{dest_mpv_manifest.as_yaml()}\n')
+        i_logger.dbg(f'dest_mpv_manifest from branch {dest_rev}: \n{dest_mpv_manifest.as_yaml()}\n')
 
-        i_logger.dbg(f'get west.yml from destination branch: {args.branch_to}')
-        local_dest_west_str = manifest_proj.read_at("west.yml", args.branch_to).decode('utf-8')
+        i_logger.dbg(f'get west.yml from destination branch: {dest_rev}')
+        local_dest_west_str = read_at(manifest_proj, "west.yml", dest_rev).decode('utf-8')
         dest_manifest = manifest.Manifest.from_data(local_dest_west_str)
         i_logger.dbg(f"dest_manifest BEFORE changes: \n{dest_manifest.as_yaml()}\n")
 
-        i_logger.dbg(f'get mpv.yml from parent branch: {remote_branch_from}')
-        remote_org_mpv_str = manifest_proj.read_at("mpv.yml", remote_branch_from).decode('utf-8')
-        org_mpv_manifest = ManifestMpv.from_data(remote_org_mpv_str, topdir=self.manifest.topdir)
-        i_logger.dbg(f'org_mpv_manifest from branch {remote_branch_from}: \n{org_mpv_manifest.as_yaml()}\n')
+        if org_manifests is not None:
+            i_logger.dbg(f'take mpv.yml and west.yml of parent branch from previous merge')
+            org_mpv_manifest, org_manifest = org_manifests
+        else:
+            i_logger.dbg(f'get mpv.yml from parent branch: {remote_branch_from}')
+            remote_org_mpv_str = read_at(manifest_proj, "mpv.yml", remote_branch_from).decode('utf-8')
+            org_mpv_manifest = ManifestMpv.from_data(remote_org_mpv_str, topdir=self.manifest.topdir)
+            i_logger.dbg(f'org_mpv_manifest from branch {remote_branch_from}: \n{org_mpv_manifest.as_yaml()}\n')
 
-        i_logger.dbg(f'get west.yml from parent branch: {remote_branch_from}')
-        remote_org_west_str = manifest_proj.read_at("west.yml", remote_branch_from).decode('utf-8')
-        org_manifest = manifest.Manifest.from_data(remote_org_west_str)
-        i_logger.dbg(f'org_manifest: \n{org_manifest.as_yaml()}\n')
+            i_logger.dbg(f'get west.yml from parent branch: {remote_branch_from}')
+            remote_org_west_str = read_at(manifest_proj, "west.yml", remote_branch_from).decode('utf-8')
+            org_manifest = manifest.Manifest.from_data(remote_org_west_str)
+            i_logger.dbg(f'org_manifest: \n{org_manifest.as_yaml()}\n')
 
         org_merge_method: MergeType = org_mpv_manifest.self_mpv.merge_method
         i_logger.inf(f'merge method of : {org_merge_method}')
@@ -1433,41 +4081,63 @@ class MpvMerge(WestCommand):
         merge_method: MergeType = dest_mpv_manifest.self_mpv.merge_method
         i_logger.inf(f'merge method: {merge_method}')
 
+        context = MergeContext(args.branch_from, args.branch_to, remote_branch_from,
+                               dest_mpv_manifest, dest_manifest, org_manifest,
+                               merge_method, org_merge_method, args.local_from)
+        return context
 
-        # Indicate if to update west.yml in destination
-        manifest_change = False
+    def preflight(self, args, manifest_proj: manifest.Project, remote_branch_from: str):
+        '''
+        Fetch all repositories and compute the merge of each one with git merge-tree.
+        Print the repositories and files that would conflict, without any change to the working trees.
+        '''
+        dest_rev = args.branch_to
+        if not check_branch_exist(manifest_proj, args.branch_to, False):
+            dest_rev = f"origin/{args.branch_to}"
+        context = self.merge_context(args, manifest_proj, dest_rev, remote_branch_from)
+
+        projects, merges = self.merge_projects(args, context)
+        trace_phase("fetch")
+        i_logger.banner(f"Fetch {len(projects)} repositories")
+        results = run_projects(projects, self.fetch_project, args.jobs)
+        report_failures(results, "mpv-merge --preflight fetch")
+
+        trace_phase("preflight")
+        results = run_projects(projects,
+                               lambda project: self.preflight_project(project, args, context),
+                               args.jobs)
+        trace_phase(None)
+        merges += [result.value for result in results if result.ok]
+        order = {project.name: i for i, project in enumerate(self.manifest.projects)}
+        merges.sort(key=lambda merge: order[merge.name])
+        print_merge_table(merges, "Preflight summary")
+        report_failures(results, "mpv-merge --preflight")
+
+        conflicts = [merge.name for merge in merges if merge.status == MergeStatus.CONFLICT]
+        if len(conflicts) > 0:
+            i_logger.wrn(f"Merge from {args.branch_from} to {args.branch_to} would conflict in: {' '.join(conflicts)}")
+        else:
+            i_logger.inf(f"Merge from {args.branch_from} to {args.branch_to} has no conflicts")
+        i_logger.inf("")
 
-        # There are 3 type of merge to repository:
-        # 1. Regular git merge - if in DATA repository 
-        #    or in SOURCE repository and merge method of SOURCE_DATA
-        # 2. sha merge; take the sha of parent branch - 
-        #    if in SOURCE repository and merge method of DATA 
-        #    and merge method of original branch is SOURCE_DATA
-        # 3. Copy revision merge; take the revision name (should be tag or sha) into destination - 
-        #    if in EXTERNAL repository or ALL_PROJECTS repository 
-        #    or SOURCE repository in merge method of SOURCE_DATA or 
-        #    or SOURCE repository in merge method of DATA 
-        #    and merge method of original branch is DATA
-        #
-        # Go over all repositories and merge them
+    def merge_projects(self, args, context: MergeContext):
+        '''
+        Return the projects that participate in the merge,
+        and the merge results (skipped) of the other projects
+        '''
+        projects = []
+        merges = []
         for project in self.manifest.projects:
-            i_logger.inf('')
-            i_logger.small_banner(f"project: {project.name}")
             if project.name == 'manifest':
                 i_logger.dbg('Take care to manifest later...')
                 continue
 
-            project_mpv = dest_mpv_manifest.get_projects([project.name])[0]
+            project_mpv = context.dest_mpv_manifest.get_projects([project.name])[0]
             if project_mpv == None:
                 i_logger.wrn(f'project_mpv for project {project.name} is None - continue')
+                merges.append(RepoMerge(project.name, '-', MergeStatus.SKIPPED, "not in mpv.yml"))
                 continue
 
-            unshallow = []
-            is_shallow = is_shallow_repo(project)
-            if is_shallow:
-                i_logger.dbg(f"repo {project.name} is shallow repo, use --unshallow")
-                unshallow = ['--unshallow']
-
             content = project_mpv.content
             i_logger.dbg(
                 f"Project {project.name} is active: {self.manifest.is_active(project)}, and is cloned: {project.is_cloned()}, mpv content = {content}, clone-depth: {project.clone_depth}")
@@ -1475,121 +4145,254 @@ class MpvMerge(WestCommand):
             # check if argument -t filter this repo from merge:
             if len(args.t) and not (content.name in args.t or project.name in args.t):
                 i_logger.inf(f"The repo {project.name} is filter by -t flag, continue")
+                merges.append(RepoMerge(project.name, '-', MergeStatus.SKIPPED, "filtered by -t"))
                 continue
 
-            merge_opt = ""
-            if len(args.o) > 0:
-                for repo_opt in args.o:
-                    if content.name == repo_opt[0] or project.name == repo_opt[0]:
-                        merge_opt += repo_opt[1] + " "
-                        i_logger.dbg(f"Add merge option: {repo_opt[1]} - for repo: {project.name}, repo_opt: {repo_opt}")
-            i_logger.dbg(f"repo: {project.name}, merge_opt: {merge_opt}")
-
-            if (self.manifest.is_active(project) and
-                    project.is_cloned() and
-                    content != ContentType.COMMANDS):
-                i_logger.dbg(f"git fetch")
-                project.git(['fetch', '-p'] + unshallow,
-                            capture_stdout=True, capture_stderr=True,
-                            check=False)
+            if not self.manifest.is_active(project) or not project.is_cloned():
+                merges.append(RepoMerge(project.name, '-', MergeStatus.SKIPPED, "not active or not cloned"))
+            elif content == ContentType.COMMANDS:
+                merges.append(RepoMerge(project.name, '-', MergeStatus.SKIPPED, "west commands"))
+            else:
+                projects.append(project)
+        return projects, merges
+
+    def fetch_project(self, project: manifest.Project):
+        # The commit-graph answer the ancestry checks (merge-base --is-ancestor) fast.
+        # Shallow repositories are unshallowed later, only if a merge is required.
+        i_logger.dbg(f"git fetch {project.name}")
+        cp = mpv_git(project, ['-c', 'fetch.writeCommitGraph=true', 'fetch', '-p'],
+                     capture_stdout=True, capture_stderr=True,
+                     check=False)
+        if cp.returncode:
+            errors = [line for line in cp.stderr.decode('utf-8', errors='replace').splitlines()
+                      if line.startswith(('fatal:', 'error:'))]
+            i_logger.die(f"fetch of {project.name} failed: {errors[0] if errors else cp.returncode}")
+
+    def merge_history(self, project: manifest.Project, args, dest: str, source: str):
+        '''
+        Fetch the history that is required to merge source into dest
+        '''
+        if args.deepen:
+            deepen_to_merge_base(project, dest, source)
+        else:
+            self.unshallow_project(project)
+
+    def checkout_history(self, project: manifest.Project, args, revision: str):
+        '''
+        Fetch the history that is required to checkout the revision
+        '''
+        if not (args.deepen and has_commit(project, revision)):
+            self.unshallow_project(project)
+
+    def unshallow_project(self, project: manifest.Project):
+        if is_shallow_repo(project):
+            i_logger.dbg(f"repo {project.name} is shallow repo, use --unshallow")
+            mpv_git(project, ['-c', 'fetch.writeCommitGraph=true', 'fetch', '-p', '--unshallow'],
+                    capture_stdout=True, capture_stderr=True,
+                    check=False)
+
+    def merge_options(self, project: manifest.Project, content: ContentType, args) -> str:
+        merge_opt = ""
+        if len(args.o) > 0:
+            for repo_opt in args.o:
+                if content.name == repo_opt[0] or project.name == repo_opt[0]:
+                    merge_opt += repo_opt[1] + " "
+                    i_logger.dbg(f"Add merge option: {repo_opt[1]} - for repo: {project.name}, repo_opt: {repo_opt}")
+        i_logger.dbg(f"repo: {project.name}, merge_opt: {merge_opt}")
+        return merge_opt
+
+    def check_remote_branches(self, project: manifest.Project, context: MergeContext):
+        remote_org_exist = check_branch_exist(project, context.branch_from, True)
+        if context.local_from:
+            remote_org_exist = remote_org_exist or check_branch_exist(project, context.branch_from, False)
+        i_logger.dbg(f"{context.source_ref(project)} exist: {remote_org_exist}")
+        remote_dest_exist = check_branch_exist(project, context.branch_to, True)
+        i_logger.dbg(f"{context.remote_branch_to} exist: {remote_dest_exist}")
+        if remote_org_exist == False or remote_dest_exist == False:
+            i_logger.die(f'remote_org_exist ({remote_org_exist}) not exist'
+                    f'\nor remote_dest_exist ({remote_dest_exist}) not exist'
+                    '\nAbort!!!')
+
+    def preflight_project(self, project: manifest.Project, args, context: MergeContext) -> RepoMerge:
+        '''
+        Compute the regular git merge of one repository in memory (merge-tree),
+        without checkout, pull or changes to the index. Return the expected result.
+        '''
+        content = context.dest_mpv_manifest.get_projects([project.name])[0].content
+        strategy = merge_strategy(content, context)
+        if strategy != 'git merge':
+            return RepoMerge(project.name, strategy, MergeStatus.SKIPPED, "no git merge")
+
+        self.check_remote_branches(project, context)
+        merge_opt = self.merge_options(project, content, args)
+        if len(merge_opt) > 0:
+            return RepoMerge(project.name, strategy, MergeStatus.SKIPPED,
+                             f"merge options are not simulated: {merge_opt.strip()}")
+
+        dest = merge_dest_ref(project, context)
+        source = context.source_ref(project)
+        if is_ancestor(project, source, dest):
+            return RepoMerge(project.name, strategy, MergeStatus.SKIPPED, "already merged")
+        if args.ff and is_ancestor(project, dest, source):
+            return RepoMerge(project.name, strategy, MergeStatus.FAST_FORWARD)
+        self.merge_history(project, args, dest, source)
+        tree, conflicts = merge_tree(project, dest, source)
+        i_logger.dbg(f"preflight_project() - {project.name}: tree: {tree}, conflicts: {conflicts}")
+        if len(conflicts) > 0:
+            return RepoMerge(project.name, strategy, MergeStatus.CONFLICT, ' '.join(conflicts))
+        return RepoMerge(project.name, strategy, MergeStatus.MERGED, "clean")
+
+    def merge_no_checkout(self, project: manifest.Project, context: MergeContext) -> Optional[RepoMerge]:
+        '''
+        Merge with plumbing only (merge-tree, commit-tree and update-ref), and advance
+        branch_to without checkout. The working tree and the index are not changed.
+        Return None if the merge conflicts, and should be done with checkout.
+        '''
+        branch_ref = f"refs/heads/{context.branch_to}"
+        if not check_branch_exist(project, context.branch_to, False):
+            # Like git checkout - create the local branch that track the remote branch
+            mpv_git(project, ['branch', '--track', context.branch_to, context.remote_branch_to],
+                    capture_stdout=True)
+        source = context.source_ref(project)
+        old_sha = project_sha(project, branch_ref)
+        dest_sha = project_sha(project, merge_dest_ref(project, context))
+        from_sha = project_sha(project, source)
+
+        tree, conflicts = merge_tree(project, dest_sha, from_sha)
+        if len(conflicts) > 0:
+            i_logger.inf(f"merge of {project.name} has conflicts in: {' '.join(conflicts)}, merge with checkout")
+            return None
+
+        if source.startswith('refs/tags/'):
+            message = f"Merge tag '{context.branch_from}' into {context.branch_to}"
+        elif source.startswith('refs/heads/'):
+            message = f"Merge branch '{context.branch_from}' into {context.branch_to}"
+        else:
+            message = f"Merge remote-tracking branch '{source}' into {context.branch_to}"
+        cp = mpv_git(project, ['commit-tree', tree, '-p', dest_sha, '-p', from_sha, '-m', message],
+                     capture_stdout=True)
+        merge_sha = cp.stdout.decode('utf-8').strip()
+        mpv_git(project, ['update-ref', '-m', f"merge {source}: Merge made by mpv-merge",
+                          branch_ref, merge_sha, old_sha])
+        i_logger.inf(f"merge branch {source} to branch {context.branch_to} without checkout: {merge_sha}")
+        return RepoMerge(project.name, 'git merge', MergeStatus.MERGED, "no checkout")
+
+    def merge_project(self, project: manifest.Project, args, context: MergeContext) -> RepoMerge:
+        '''
+        Merge one repository, after it was fetched.
+        Called from the worker pool - may run in parallel to other repositories.
+        The changes to west.yml of destination are returned, and not applied here.
+        '''
+        i_logger.inf('')
+        i_logger.small_banner(f"project: {project.name}")
+        content = context.dest_mpv_manifest.get_projects([project.name])[0].content
+        remote_branch_from = context.source_ref(project)
+        merge_opt = self.merge_options(project, content, args)
 
-                local_org_exist = check_branch_exist(project, args.branch_from, False)
-                i_logger.dbg(f"{args.branch_from} exist: {local_org_exist}")
-
-                remote_org_exist = check_branch_exist(project, args.branch_from, True)
-                i_logger.dbg(f"{remote_branch_from} exist: {remote_org_exist}")
-
-                local_dest_exist = check_branch_exist(project, args.branch_to, False)
-                i_logger.dbg(f"{args.branch_to} exist: {local_dest_exist}")
-
-                remote_dest_exist = check_branch_exist(project, args.branch_to, True)
-                i_logger.dbg(f"{remote_branch_to} exist: {remote_dest_exist}")
-
-                dest_project = dest_manifest.get_projects([project.name])[0]
-                org_project = org_manifest.get_projects([project.name])[0]
-
-                # 1. Regular git merge - if in DATA repository 
-                #    or in SOURCE repository and merge method of SOURCE_DATA
-                if (content == ContentType.DATA or
-                        content == ContentType.SOURCE and merge_method == MergeType.SOURCE_DATA):
-                    i_logger.inf(f'1. Regular git merge to repository: {project.name}')
-
-                    if remote_org_exist == False or remote_dest_exist == False:
-                        i_logger.die(f'remote_org_exist ({remote_org_exist}) not exist'
-                                f'\nor remote_dest_exist ({remote_dest_exist}) not exist'
-                                '\nAbort!!!')
-
-                    i_logger.inf(f"checkout {args.branch_to}")
-                    project.git(['checkout', args.branch_to, "--"], check=False)
-                    if local_dest_exist:
-                        i_logger.dbg(f"pull {args.branch_to}")
-                        project.git(['pull'] + unshallow, check=False)
-                    # In regular repo
-                    i_logger.inf(f"merge branch {remote_branch_from} to checkout branch {args.branch_to}")
-                    project.git(f"merge {merge_opt} --no-ff --no-edit {remote_branch_from}", check=False)
-
-                # 2. sha merge; take the sha of parent branch - 
-                #    if in SOURCE repository and merge method of DATA 
-                #    and merge method of original branch is SOURCE_DATA
-                ######################################################
-                # TODO: Add unit test for case where in DATA merge method and original branch is also DATA merge method - take the SHA
-                ######################################################
-                elif (content == ContentType.SOURCE and
-                      merge_method == MergeType.DATA and
-                      org_merge_method == MergeType.SOURCE_DATA):
-                    i_logger.inf(f'2. sha merge to repository: {project.name}')
-
-                    i_logger.dbg(f'Take parent sha of branch: {remote_branch_from}')
-                    sha = project.sha(remote_branch_from)
-                    i_logger.dbg(
-                        f'the revision of project {project.name} in parent branch: {remote_branch_from} is: \n{sha}')
-                    i_logger.dbg(f'current revision in destination branch: {args.branch_to}: \n{dest_project.revision}')
-
-                    i_logger.dbg(f'Check revision of destination')
-                    if dest_project.revision != sha:
-                        i_logger.dbg(f'Replace revision of project {project.name} with: \n{sha}')
-                        dest_project.revision = sha
-                        manifest_change = True
-                        i_logger.inf(f'Checkout project {project.name} to sha:\n{sha}')
-                        project.git(['checkout', '-f', sha], check=False)
-                    else:
-                        i_logger.dbg(f'Revision did not change, do not update sha')
-
-                # 3. Copy revision merge; take the revision name (should be tag or sha) into destination - 
-                #    if in EXTERNAL repository or ALL_PROJECTS repository 
-                #    or SOURCE repository in merge method of SOURCE_DATA or 
-                #    or SOURCE repository in merge method of DATA 
-                #    and merge method of original branch is DATA
+        local_dest_exist = check_branch_exist(project, args.branch_to, False)
+        i_logger.dbg(f"{args.branch_to} exist: {local_dest_exist}")
+
+        dest_project = context.dest_manifest.get_projects([project.name])[0]
+        org_project = context.org_manifest.get_projects([project.name])[0]
+
+        strategy = merge_strategy(content, context)
+
+        # 1. Regular git merge - if in DATA repository 
+        #    or in SOURCE repository and merge method of SOURCE_DATA
+        if strategy == 'git merge':
+            i_logger.inf(f'1. Regular git merge to repository: {project.name}')
+
+            self.check_remote_branches(project, context)
+
+            # Nothing to merge if branch_from is already in branch_to,
+            # and only fast-forward (if allowed) if branch_to is in branch_from.
+            # No checkout and no unshallow in both cases.
+            dest = merge_dest_ref(project, context)
+            if is_ancestor(project, remote_branch_from, dest):
+                i_logger.inf(f"{remote_branch_from} is already merged to {args.branch_to}")
+                advance_branch(project, context, project_sha(project, dest),
+                               f"merge {context.remote_branch_to}: Fast-forward")
+                return RepoMerge(project.name, 'git merge', MergeStatus.SKIPPED, "already merged")
+            if args.ff and is_ancestor(project, dest, remote_branch_from):
+                i_logger.inf(f"fast-forward {args.branch_to} to {remote_branch_from}")
+                advance_branch(project, context, project_sha(project, remote_branch_from),
+                               f"merge {remote_branch_from}: Fast-forward")
+                return RepoMerge(project.name, 'git merge', MergeStatus.FAST_FORWARD)
+            self.merge_history(project, args, dest, remote_branch_from)
+
+            # Merge without checkout if possible. Not possible with merge options (merge-tree
+            # can't apply them), or if branch_to is checked out (the working tree should be updated).
+            if args.no_checkout:
+                if len(merge_opt) > 0:
+                    i_logger.inf(f"merge options to {project.name}, merge with checkout")
+                elif checked_out_branch(project) == args.branch_to:
+                    i_logger.inf(f"{args.branch_to} is checked out in {project.name}, merge with checkout")
                 else:
-                    i_logger.inf(f'3. Copy revision merge to repository: {project.name}')
-                    i_logger.dbg(
-                        f'revision of parent: {org_project.revision} \nrevision of destination: {dest_project.revision}')
-
-                    if org_project.revision != dest_project.revision:
-                        i_logger.dbg(f'Replace revision of project {project.name} with: \n{org_project.revision}')
-                        dest_project.revision = org_project.revision
-                        manifest_change = True
-                        i_logger.inf(f'Checkout project {project.name} to org_project.revision:\n{org_project.revision}')
-                        project.git(['checkout', '-f', org_project.revision, "--"], check=False)
-                    else:
-                        i_logger.dbg(f'Revision did not change, do not update revision (tag)')
-        # ### Finish project loop ###
-#
-        # Update manifest if required
-        if manifest_change == True:
-            i_logger.inf("")
-            i_logger.inf(f'manifest has updates, west.yml should be update in branch: {args.branch_to}')
-            i_logger.dbg(f"dest_manifest AFTER changes: \n{dest_manifest.as_yaml()}")
-            manifest_fd = open(self.manifest.path, "w")
-            manifest_fd.write(dest_manifest.as_yaml())
-            manifest_fd.close()
-            manifest_proj.git(['commit', '-a', '-m',
-                               f'Automatic commit by running the command "west mpv-merge" \nUpdate west.yml from branch {remote_branch_from} to branches {args.branch_to}'],
-                              check=False)
+                    merge = self.merge_no_checkout(project, context)
+                    if merge is not None:
+                        return merge
+
+            i_logger.inf(f"checkout {args.branch_to}")
+            mpv_git(project, ['checkout', args.branch_to, "--"], check=False)
+            if local_dest_exist:
+                # The repository was fetched already - only fast-forward to the remote branch
+                i_logger.dbg(f"fast-forward {args.branch_to} to {context.remote_branch_to}")
+                mpv_git(project, ['merge', '--ff-only', context.remote_branch_to], check=False)
+            # In regular repo
+            head_before = project_sha(project, 'HEAD')
+            i_logger.inf(f"merge branch {remote_branch_from} to checkout branch {args.branch_to}")
+            cp = mpv_git(project, f"merge {merge_opt} --no-ff --no-edit {remote_branch_from}", check=False)
+            if cp.returncode:
+                conflicts = unmerged_files(project)
+                if len(conflicts) == 0:
+                    raise subprocess.CalledProcessError(cp.returncode, cp.args)
+                return RepoMerge(project.name, 'git merge', MergeStatus.CONFLICT, ' '.join(conflicts))
+            if project_sha(project, 'HEAD') == head_before:
+                return RepoMerge(project.name, 'git merge', MergeStatus.SKIPPED, "already merged")
+            return RepoMerge(project.name, 'git merge', MergeStatus.MERGED)
+
+        # 2. sha merge; take the sha of parent branch - 
+        #    if in SOURCE repository and merge method of DATA 
+        #    and merge method of original branch is SOURCE_DATA
+        ######################################################
+        # TODO: Add unit test for case where in DATA merge method and original branch is also DATA merge method - take the SHA
+        ######################################################
+        elif strategy == 'sha':
+            i_logger.inf(f'2. sha merge to repository: {project.name}')
+
+            i_logger.dbg(f'Take parent sha of branch: {remote_branch_from}')
+            sha = project_sha(project, remote_branch_from)
+            i_logger.dbg(
+                f'the revision of project {project.name} in parent branch: {remote_branch_from} is: \n{sha}')
+            i_logger.dbg(f'current revision in destination branch: {args.branch_to}: \n{dest_project.revision}')
+
+            i_logger.dbg(f'Check revision of destination')
+            if dest_project.revision != sha:
+                i_logger.inf(f'Checkout project {project.name} to sha:\n{sha}')
+                self.checkout_history(project, args, sha)
+                mpv_git(project, ['checkout', '-f', sha], check=False)
+                return RepoMerge(project.name, 'sha', MergeStatus.REVISION, sha, revision=sha)
+            i_logger.dbg(f'Revision did not change, do not update sha')
+            return RepoMerge(project.name, 'sha', MergeStatus.SKIPPED, "same sha")
+
+        # 3. Copy revision merge; take the revision name (should be tag or sha) into destination - 
+        #    if in EXTERNAL repository or ALL_PROJECTS repository 
+        #    or SOURCE repository in merge method of SOURCE_DATA or 
+        #    or SOURCE repository in merge method of DATA 
+        #    and merge method of original branch is DATA
         else:
-            i_logger.dbg(f'manifest did not change. not change west.yml branch in {args.branch_to}')
+            i_logger.inf(f'3. Copy revision merge to repository: {project.name}')
+            i_logger.dbg(
+                f'revision of parent: {org_project.revision} \nrevision of destination: {dest_project.revision}')
 
-        i_logger.inf("")
+            if org_project.revision != dest_project.revision:
+                i_logger.inf(f'Checkout project {project.name} to org_project.revision:\n{org_project.revision}')
+                self.checkout_history(project, args, org_project.revision)
+                mpv_git(project, ['checkout', '-f', org_project.revision, "--"], check=False)
+                return RepoMerge(project.name, 'revision', MergeStatus.REVISION,
+                                 org_project.revision, revision=org_project.revision)
+            i_logger.dbg(f'Revision did not change, do not update revision (tag)')
+            return RepoMerge(project.name, 'revision', MergeStatus.SKIPPED, "same revision")
 
 
 class MpvNewProj(WestCommand):
@@ -1626,6 +4429,24 @@ class MpvNewProj(WestCommand):
                     Create new version from dummy_s:4.2.9 project to dummy_s__100.9.9_main.
                     The project is Source&Data project, according to the "-t s":
                     west mpv-new-proj -t s dummy_s__100.9.9_main dummy_s 100.9.9
+
+                With --push-only the new branches are created only in the remotes:
+                the source branch is resolved once with ls-remote, and the 3 branches
+                are pushed with one atomic push for each repository, in parallel.
+                No fetch, and no local branches are created:
+                    west mpv-new-proj --push-only proj_1__4.2.9_dev dummy_d 4.2.9
+
+                With --spec several projects are created together from YAML or CSV file,
+                each repository is fetched once, and the branches of all the projects
+                are created with one atomic push for each repository (without local branches):
+                    west mpv-new-proj --spec customers.yml
+
+                The branches that are created in the remotes are recorded
+                in log-mpv/new-proj-journal.json. If mpv-new-proj fails in the middle,
+                finish it with --resume (the created branches are not created again),
+                or delete all the branches that it created with --rollback:
+                    west mpv-new-proj --resume
+                    west mpv-new-proj --rollback
                     ''')
 
         )
@@ -1640,7 +4461,7 @@ class MpvNewProj(WestCommand):
         # Remember to update west-completion.bash if you add or remove
         # flags
         parser.add_argument(
-            'source_branch',
+            'source_branch', nargs='?',
             help='''Name of the origin project. Should be branch/commit/tag.''')
 
         # parser.add_argument(
@@ -1648,11 +4469,11 @@ class MpvNewProj(WestCommand):
             # help='''Name of the origin version.''')
 
         parser.add_argument(
-            'dest_proj',
+            'dest_proj', nargs='?',
             help='''Name of the destination project.''')
 
         parser.add_argument(
-            'dest_ver',
+            'dest_ver', nargs='?',
             help='''Name of the destination version.''')
 
         parser.add_argument('-t',
@@ -1660,19 +4481,106 @@ class MpvNewProj(WestCommand):
                             dest='proj_type',
                             default='d',
                             help='''The type of the project, d Data project and s to Source&Data project''')
+
+        parser.add_argument('--push-only', dest='push_only', action='store_true',
+                            help='''Create the branches of the new project only in the remotes,
+                                    with one atomic push for each repository (run in parallel),
+                                    without fetching and without creating local branches.''')
+
+        parser.add_argument('--spec', dest='spec', metavar='FILE',
+                            help='''Create all the projects in YAML or CSV file together, with one fetch of each repository,
+                                    one atomic push for each repository and one push of the manifest repository.
+                                    Each project has source_branch, dest_proj, dest_ver and optional t (d or s, like -t).
+                                    YAML - list of mappings, CSV - with header line: source_branch,dest_proj,dest_ver,t''')
+
+        parser.add_argument('--resume', dest='resume', action='store_true',
+                            help='''Resume mpv-new-proj that failed, with the same arguments,
+                                    and without creating again the branches that it already created.''')
+
+        parser.add_argument('--rollback', dest='rollback', action='store_true',
+                            help='''Delete the branches that mpv-new-proj that failed created in the remotes,
+                                    with one push for each repository.''')
+
+        add_trace_argument(parser)
+
         return parser
 
     def do_run(self, args, unknown):
+        start_trace(args.trace, self.name)
         i_logger.inf(f"")
         i_logger.inf(f"mpv-new-proj")
         i_logger.inf(f"------------")
         i_logger.inf(f"args: {args}")
-        i_logger.banner(
-            f'Create new project {args.dest_proj}:{args.dest_ver} from branch {args.source_branch},'
-            f'Project type: {args.proj_type}')
+        journal = NewProjJournal.load()
+        if args.rollback:
+            if journal is None:
+                i_logger.die(f"There is no mpv-new-proj to rollback")
+            self.rollback(journal)
+            return
 
-        new_proj(args.source_branch, args.dest_proj, args.dest_ver, args.proj_type,
-                 self.manifest, 'mpv-new-proj')
+        if args.resume:
+            if journal is None:
+                i_logger.die(f"There is no mpv-new-proj to resume")
+            options = journal.options
+            args.source_branch, args.dest_proj, args.dest_ver = (
+                options['source_branch'], options['dest_proj'], options['dest_ver'])
+            args.proj_type, args.push_only = options['proj_type'], options['push_only']
+            entries = [dict(entry) for entry in options['spec']] if options['spec'] else None
+            i_logger.banner(f"Resume mpv-new-proj, branches were created in {len(journal.repos)} repositories")
+        else:
+            if journal is not None and len(journal.repos) > 0:
+                i_logger.die(f"The last mpv-new-proj didn't finish ({NewProjJournal.journal_file()}) - "
+                             f"use --resume to finish it, or --rollback to delete the branches that it created")
+            entries = None
+            if args.spec:
+                entries = load_new_proj_spec(args.spec)
+            elif not (args.source_branch and args.dest_proj and args.dest_ver):
+                i_logger.die(f"source_branch, dest_proj and dest_ver are required (or use --spec)")
+            journal = NewProjJournal({'source_branch': args.source_branch,
+                                      'dest_proj': args.dest_proj,
+                                      'dest_ver': args.dest_ver,
+                                      'proj_type': args.proj_type,
+                                      'push_only': args.push_only,
+                                      'spec': [dict(entry) for entry in entries] if entries else None})
+            journal.save()
+
+        if entries:
+            i_logger.banner(f'Create {len(entries)} new projects from spec')
+            new_projs(entries, self.manifest, 'mpv-new-proj', journal)
+        else:
+            i_logger.banner(
+                f'Create new project {args.dest_proj}:{args.dest_ver} from branch {args.source_branch},'
+                f'Project type: {args.proj_type}')
+            new_proj(args.source_branch, args.dest_proj, args.dest_ver, args.proj_type,
+                     self.manifest, 'mpv-new-proj', args.push_only, journal)
+        journal.remove()
+
+    def rollback(self, journal: NewProjJournal):
+        '''
+        Delete the branches that were recorded in the journal, with one push for each repository
+        '''
+        i_logger.banner(f"Rollback mpv-new-proj - delete branches in {len(journal.repos)} repositories")
+        pushes = {name: [f":refs/heads/{branch}" for branch in branches] for name, branches in journal.repos.items()}
+        projects = [project for project in self.manifest.projects if project.name in pushes]
+        results = push_projects(pushes, projects)
+        for result, project in zip(results, projects):
+            if result.ok:
+                # Delete also the local branches (mpv-new-proj without --push-only create them)
+                local = [branch for branch in journal.created(project.name) if ref_index(project).has_branch(branch, False)]
+                if len(local) > 0:
+                    # A checked out branch can't be deleted - leave it, and stay on the same commit
+                    cp = mpv_git(project, ['symbolic-ref', '-q', '--short', 'HEAD'],
+                                 capture_stdout=True, check=False)
+                    if cp.stdout.decode('utf-8').strip() in local:
+                        mpv_git(project, ['checkout', '-q', '--detach'])
+                    cp = mpv_git(project, ['branch', '-D'] + local, check=False, capture_stderr=True)
+                    if cp.returncode:
+                        i_logger.wrn(f"Can't delete the local branches {' '.join(local)} in {project.name}: "
+                                     f"{cp.stderr.decode('utf-8', errors='replace').strip()}")
+                journal.discard(project.name)
+        print_push_table(results, "Rollback summary")
+        report_failures(results, "mpv-new-proj --rollback")
+        journal.remove()
 
 
 # Debug the command mpv-new-proj
@@ -1709,6 +4617,10 @@ class MpvTag(WestCommand):
                 In the end of the command execution, all repositories that are not tools,
                 will have a new tag, and finally a new west.yml with the all new tags will be created.
                 This west.yml will also save in new tag.
+                The tags are created in all repositories in parallel, and then pushed
+                concurrently (up to mpv.push-jobs-per-host pushes to each host, default: 4).
+                The pushed tags are verified, and the command fails if the tag of any
+                repository wasn't pushed - before the tag of manifest repository is created.
                 
                 BE CAREFUL: If the request tag name exist - it will be REPLACE.
                       
@@ -1734,9 +4646,12 @@ class MpvTag(WestCommand):
         parser.add_argument('-m', dest='message',
                             help='''Message for tag. Will be added to all new tags''')
 
+        add_trace_argument(parser)
+
         return parser
 
     def do_run(self, args, unknown):
+        start_trace(args.trace, self.name)
         i_logger.inf(f"")
         i_logger.inf(f"mpv-tag")
         i_logger.inf(f"---------")
@@ -1746,7 +4661,7 @@ class MpvTag(WestCommand):
 
         manifest_proj = self.manifest.get_projects(['manifest'])[0]
         i_logger.dbg(f"Update manifest (git pull)")
-        manifest_proj.git('pull', check=False)
+        mpv_git(manifest_proj, 'pull', check=False)
 
         # Call to west update build-in command
         ws_rev, bts = get_current_bts(manifest_proj)
@@ -1758,7 +4673,7 @@ class MpvTag(WestCommand):
         i_logger.inf(f"Call mpv-update for current revision: {ws_rev}")
         buildin_update_command(self.topdir, self.manifest)
 
-        west_str = manifest_proj.read_at("west.yml", "HEAD").decode('utf-8')
+        west_str = read_at(manifest_proj, "west.yml", "HEAD").decode('utf-8')
         manifest_update = manifest.Manifest.from_file()
         
         message = ""
@@ -1769,11 +4684,13 @@ class MpvTag(WestCommand):
         i_logger.dbg(f"tag message: {message}")
 
         # manifest_proj = self.manifest.get_projects(['manifest'])[0]
-        # mpv_str = manifest_proj.read_at("mpv.yml", "HEAD").decode('utf-8')
+        # mpv_str = read_at(manifest_proj, "mpv.yml", "HEAD").decode('utf-8')
         # mpv_manifest = ManifestMpv.from_data(mpv_str, topdir=self.manifest.topdir)
         mpv_manifest = mpv_from_yml(self.manifest, "HEAD")
         manifest_len = len(self.manifest.projects)
         i = 0
+        # Projects to tag - the tags are created and pushed in parallel after the loop
+        tag_projects = []
 
         while (i < manifest_len):
             # for project in self.manifest.projects:
@@ -1798,16 +4715,10 @@ class MpvTag(WestCommand):
 
                     # check current branch name
                     # git branch --show-current
-                    cp = project.git(['branch', '--show-current'],
-                                     capture_stdout=True, capture_stderr=True,
-                                     check=False)
-                    current_branch = cp.stdout.decode('ascii', errors='ignore').strip()
+                    current_branch = ref_index(project).head_branch or ""
                     i_logger.dbg(f"in project: {project.name}, current_branch: current_branch")
                     i_logger.inf(f"repo: {project.name}, create tag: {tag_full}")
-                    project.git(['tag', '-f', '-a', tag_full, '-m', message],
-                                check=False)
-                    project.git(['push', 'origin', tag_full, '--force'],
-                                check=False)
+                    tag_projects.append(project)
                     manifest_update.projects[i].revision = tag_full
                 else:
                     i_logger.dbg(f"Project {project.name} is infrastructure project - don't create specific tag")
@@ -1815,7 +4726,8 @@ class MpvTag(WestCommand):
                 i_logger.inf(f"Project {project.name} is not active or not cloned")
             i = i + 1
 
-        
+        self.tag_projects(tag_projects, tag_full, message)
+
         manifest_fd = open(self.manifest.path, "w+")
         manifest_fd.seek(0)
         i_logger.dbg(f"west.yml after open it with w+: \n{manifest_fd.read()}")
@@ -1829,11 +4741,11 @@ class MpvTag(WestCommand):
 #        manifest_fd.seek(0)
         manifest_fd.close()
 
-        manifest_proj.git(['commit', '-a', '-m',
+        mpv_git(manifest_proj, ['commit', '-a', '-m',
                            f'Automatic commit by running the command "west mpv-tag" \nSet west.yml with tag {tag_full}'],
                           check=False)
         i_logger.inf(f"tag project {manifest_proj.name} with tag: {tag_full}")
-        manifest_proj.git(['tag', '-f', '-a', tag_full, '-m', message],
+        mpv_git(manifest_proj, ['tag', '-f', '-a', tag_full, '-m', message],
                           check=False)
         if bts == "br":
             i_logger.inf(f"Create new commit with the previous west.yml")
@@ -1849,19 +4761,47 @@ class MpvTag(WestCommand):
             manifest_fd.seek(0)
             i_logger.dbg(f"previous branch, west.yml after writing it it with w+: \n{manifest_fd.read()}")
             manifest_fd.close()
-            manifest_proj.git(['commit', '-a', '-m',
+            mpv_git(manifest_proj, ['commit', '-a', '-m',
                                f'Automatic commit by running the command "west mpv-tag" \nReturn to previous west.yml, before create the tag: {tag_full}'],
                               check=False)
 
         i_logger.inf(f"Push tag {tag_full}, for project {manifest_proj.name}")
-        manifest_proj.git(['push', 'origin', tag_full, '--force'],
-                          check=False)
-        manifest_proj.git(['push'],
+        push_refs(manifest_proj, [f"+refs/tags/{tag_full}:refs/tags/{tag_full}"])
+        mpv_git(manifest_proj, ['push'],
                           check=False)
 
-        manifest_proj.git(f'checkout {tag_full}',
+        mpv_git(manifest_proj, f'checkout {tag_full}',
                           check=False)
 
+    def tag_projects(self, projects: List[manifest.Project], tag: str, message: str):
+        '''
+        Create the annotated tag in all projects in parallel, and than push the tags concurrently
+        (up to mpv.push-jobs-per-host to each host), and verify them with one ls-remote in each project.
+        Exit with error if the tag wasn't created or pushed in any project.
+        '''
+        i_logger.banner(f"Create tag {tag} in {len(projects)} repositories")
+        trace_phase("tag")
+        results = run_projects(projects, lambda project: mpv_git(project, ['tag', '-f', '-a', tag, '-m', message]),
+                               git_engine().jobs)
+        trace_phase(None)
+        report_failures(results, "mpv-tag")
+
+        def push_tag(project: manifest.Project) -> str:
+            result = push_refs(project, [f"+refs/tags/{tag}:refs/tags/{tag}"])
+            local_sha = mpv_git(project, ['rev-parse', f"refs/tags/{tag}"],
+                                capture_stdout=True).stdout.decode('ascii').strip()
+            cp = mpv_git(project, ['ls-remote', 'origin', f"refs/tags/{tag}"], capture_stdout=True)
+            remote_sha = (cp.stdout.decode('ascii').split() or [None])[0]
+            if remote_sha != local_sha:
+                i_logger.die(f"The tag {tag} in remote of {project.name} is {remote_sha}, expected {local_sha}")
+            return f"{result}, verified"
+
+        trace_phase("push")
+        results = run_projects(projects, push_tag, git_engine().jobs)
+        trace_phase(None)
+        print_push_table(results, f"Push tag {tag}")
+        report_failures(results, "mpv-tag")
+
 
 # Debug the command mpv-tag
 # west -v mpv-tag -m "message added to tag" "test-tag"
@@ -1914,10 +4854,13 @@ class MpvInit(WestCommand):
             'first_version',
             help='''String of the first version for the project.''')
 
+        add_trace_argument(parser)
+
         return parser
 
 
     def do_run(self, args, _):
+        start_trace(args.trace, self.name)
         i_logger.inf(f"")
         i_logger.inf(f"mpv-init")
         i_logger.inf(f"--------")
@@ -2016,9 +4959,12 @@ class MpvManifest(WestCommand):
                                     The second field is the value of the field.
                                     ''')
 
+        add_trace_argument(parser)
+
         return parser
 
     def do_run(self, args, unknown):
+        start_trace(args.trace, self.name)
         i_logger.inf(f"")
         i_logger.inf(f"mpv-manifest")
         i_logger.inf(f"--------")
@@ -2057,11 +5003,11 @@ class MpvManifest(WestCommand):
             branch = os.path.basename(branch)
             i_logger.dbg(f"After remove origin from branch name branch is: {branch}.")
             i_logger.dbg(f"Checkout manifest to branch: {branch}.")
-            manifest_proj.git(['checkout', branch, "--"])
-            manifest_proj.git(['pull'])
+            mpv_git(manifest_proj, ['checkout', branch, "--"])
+            mpv_git(manifest_proj, ['pull'])
 
             i_logger.dbg(f"Load west.yml current branch: {branch}.")
-            current_branch_west_str = manifest_proj.read_at("west.yml", "HEAD").decode('utf-8')
+            current_branch_west_str = read_at(manifest_proj, "west.yml", "HEAD").decode('utf-8')
             current_branch_west_manifest = manifest.Manifest.from_data(current_branch_west_str, import_flags=ImportFlag.IGNORE)
             i_logger.dbg(f"current_branch_west_manifest.as_dict(): \n{current_branch_west_manifest.as_dict()}.")
 
@@ -2128,11 +5074,11 @@ class MpvManifest(WestCommand):
                 i_logger.dbg(f"west_file AFTER change: {west_file} (branch: {branch})- \n{west_file_fd.read()}")
                 west_file_fd.close()
 
-                manifest_proj.git(['add','west.yml'],
+                mpv_git(manifest_proj, ['add','west.yml'],
                                   check=False)
-                manifest_proj.git(['commit', '-m',
+                mpv_git(manifest_proj, ['commit', '-m',
                                    f'Automatic commit by running the command "west mpv-manifest -a" \nUpdate with arguments add ({args.add}).'], check=False)
-                manifest_proj.git(['push', 'origin', f"{branch}"], check=False)
+                mpv_git(manifest_proj, ['push', 'origin', f"{branch}"], check=False)
 
             else:
                 i_logger.inf(f"Dry run: in branch {branch}, the west.yml and mpv.yml should be commit and push")
@@ -2144,6 +5090,7 @@ class MpvManifest(WestCommand):
 
     def update_manifest_from_folder(self, args):
         # 1. Read the new manifests and the old manifests (validate that is OK)
+        trace_phase("compare manifests")
         manifest_folder = Path(args.manifest_folder)
 
         # 1.1 Get new west
@@ -2184,7 +5131,7 @@ class MpvManifest(WestCommand):
 
         # 1.4 Get current west
         i_logger.dbg(f'get west.yml from default_branch: origin/{default_branch}')
-        current_west_str = manifest_proj.read_at("west.yml", f"origin/{default_branch}").decode('utf-8')
+        current_west_str = read_at(manifest_proj, "west.yml", f"origin/{default_branch}").decode('utf-8')
         current_west_manifest = manifest.Manifest.from_data(current_west_str, import_flags=ImportFlag.IGNORE)
         # i_logger.dbg(f"current_west_manifest from branch {default_branch}: \n{current_west_manifest.as_yaml()}")
         current_west_projects_set = project_set_4_compare(current_west_manifest)
@@ -2194,7 +5141,7 @@ class MpvManifest(WestCommand):
 
         # 1.5 Get current mpv
         i_logger.dbg(f'get mpv.yml from default_branch: origin/{default_branch}')
-        current_mpv_str = manifest_proj.read_at("mpv.yml", f"origin/{default_branch}").decode('utf-8')
+        current_mpv_str = read_at(manifest_proj, "mpv.yml", f"origin/{default_branch}").decode('utf-8')
         current_mpv_manifest = ManifestMpv.from_data(current_mpv_str, topdir=self.manifest.topdir)
         # i_logger.dbg(f'current_mpv_manifest from branch {default_branch}: \n{current_mpv_manifest.as_yaml()}\n')
         current_mpv_projects_set = mpv_set_4_compare(current_mpv_manifest)
@@ -2329,6 +5276,7 @@ class MpvManifest(WestCommand):
         # 4 Perform the actions (if dry run - only inform user)
         
         # First, clone the new repos
+        trace_phase("clone new repos")
         i_logger.inf(f"\n\nClone the new repos")
         new_proj_list = list(only_new_project_names_in_new_west)
         i_logger.dbg(f"The new repos to clone: {new_proj_list}")
@@ -2337,13 +5285,14 @@ class MpvManifest(WestCommand):
             clone_path = Path(self.topdir).joinpath(proj_obj.path)
             i_logger.dbg(f"clone_path: {clone_path}")
             i_logger.dbg(f"clone repo: {proj_new} to {proj_obj.path}. clone_path : {clone_path}")
-            proj_obj.git(f'clone {proj_obj.url} {clone_path}', cwd=self.topdir)
+            mpv_git(proj_obj, f'clone {proj_obj.url} {clone_path}', cwd=self.topdir)
             
         # 4.1 Copy west.yml and mpv.yml to default branch
+        trace_phase("update default branch")
         i_logger.inf(f"\n-----------------------------------------------------")
         i_logger.inf(f"Update west.yml and mpv.yml in default branch")
         if args.dr == False:
-            manifest_proj.git(['checkout', default_branch, "--"])
+            mpv_git(manifest_proj, ['checkout', default_branch, "--"])
 
             des_west_file = self.manifest.path
             i_logger.dbg(f"des_west_file: {des_west_file}")
@@ -2359,10 +5308,10 @@ class MpvManifest(WestCommand):
             i_logger.dbg(f"des_mpv_file: {des_mpv_file} - \n{des_mpv_file_fd.read()}")
             des_mpv_file_fd.close()
             
-            manifest_proj.git(['add', 'mpv.yml', 'west.yml'])
-            manifest_proj.git(['commit', '-m',
+            mpv_git(manifest_proj, ['add', 'mpv.yml', 'west.yml'])
+            mpv_git(manifest_proj, ['commit', '-m',
                                f'Automatic commit by running the command "west mpv-manifest -f" \nUpdate new west.yml and mpv.yml in default branch {default_branch}'], check=False)
-            manifest_proj.git(['push', 'origin', f"{default_branch}"])
+            mpv_git(manifest_proj, ['push', 'origin', f"{default_branch}"])
             i_logger.dbg(f"Finish commit")
         else:
             i_logger.inf(f"Dry run: branch {default_branch} should be updated with west.yml and mpv.yml from {manifest_folder}\n")
@@ -2376,21 +5325,22 @@ class MpvManifest(WestCommand):
         for branch in current_manifest_branches:
             i_logger.dbg(f"Check if to update manifest of branch {branch}.")
             branch = os.path.basename(branch)
+            trace_phase(f"update branch {branch}")
             i_logger.dbg(f"After remove origin from branch name branch is: {branch}.")
 
             addition_actions = dict()
             
             # 4.2.1. Take current west.yml and mpv.yml
             i_logger.dbg(f"Checkout manifest to branch: {branch}.")
-            manifest_proj.git(['checkout', branch, "--"])
-            manifest_proj.git(['pull'])
+            mpv_git(manifest_proj, ['checkout', branch, "--"])
+            mpv_git(manifest_proj, ['pull'])
 
             i_logger.dbg(f"Load west.yml current branch: {branch}.")
-            current_branch_west_str = manifest_proj.read_at("west.yml", "HEAD").decode('utf-8')
+            current_branch_west_str = read_at(manifest_proj, "west.yml", "HEAD").decode('utf-8')
             current_branch_west_manifest = manifest.Manifest.from_data(current_branch_west_str, import_flags=ImportFlag.IGNORE)
 
             i_logger.dbg(f"Load mpv.yml current branch: {branch}.")
-            current_branch_mpv_str = manifest_proj.read_at("mpv.yml", "HEAD").decode('utf-8')
+            current_branch_mpv_str = read_at(manifest_proj, "mpv.yml", "HEAD").decode('utf-8')
             current_branch_mpv_manifest = ManifestMpv.from_data(current_branch_mpv_str, topdir=self.manifest.topdir)
 
             ##################################################################
@@ -2576,7 +5526,7 @@ class MpvManifest(WestCommand):
 
                         if c_mpv_proj.content == ContentType.SOURCE and smpv.merge_method == MergeType.DATA:
                             i_logger.dbg(f"    Try to find sha of revision: {new_proj_revision} [c_proj name: {c_proj.name} branch {branch}]")
-                            c_proj.revision = c_proj.sha(f"origin/{new_proj_revision}")
+                            c_proj.revision = project_sha(c_proj, f"origin/{new_proj_revision}")
                             i_logger.dbg(f"    SOURCE repo with MergeType.DATA - Update revision of poject {proj_name} in branch {branch} to sha: {c_proj.revision}")
                             
 
@@ -2615,7 +5565,7 @@ class MpvManifest(WestCommand):
                         c_proj = new_project(new_proj)
                         c_proj.topdir = self.manifest.topdir
                         i_logger.dbg(f"    Try to find sha of revision: {new_proj_revision} [c_proj name: {c_proj.name} branch {branch}]")
-                        c_proj.revision = c_proj.sha(f"origin/{new_proj_revision}")
+                        c_proj.revision = project_sha(c_proj, f"origin/{new_proj_revision}")
                         c_mpv_proj = new_mpv_proj
                         # west_projects.append(c_proj)
                         add_project_2_manifest(c_proj, current_branch_west_manifest)
@@ -2642,9 +5592,9 @@ class MpvManifest(WestCommand):
                             i_logger.inf(f"In project {data_proj.name} the branch {branch} exit - dont create again. smpv.merge_method: {smpv.merge_method}")
                         elif args.dr == False:
                             i_logger.inf(f"In project {data_proj.name} create the branch {branch}. smpv.merge_method: {smpv.merge_method}")
-                            data_proj.git(['branch', branch, f"origin/{new_proj.revision}"],
+                            mpv_git(data_proj, ['branch', branch, f"origin/{new_proj.revision}"],
                             check=True)
-                            data_proj.git(['push', '-u', 'origin', branch], check=True)
+                            mpv_git(data_proj, ['push', '-u', 'origin', branch], check=True)
                         else:
                             i_logger.inf(f"Dry run: in project data {data_proj.name} the branch {branch} should be created. smpv.merge_method: {smpv.merge_method}")
 
@@ -2684,11 +5634,11 @@ class MpvManifest(WestCommand):
                 i_logger.dbg(f"mpv_file AFTER change: {mpv_file} (branch: {branch})- \n{mpv_file_fd.read()}")
                 mpv_file_fd.close()
 
-                manifest_proj.git(['add', 'mpv.yml', 'west.yml'],
+                mpv_git(manifest_proj, ['add', 'mpv.yml', 'west.yml'],
                                   check=False)
-                manifest_proj.git(['commit', '-m',
+                mpv_git(manifest_proj, ['commit', '-m',
                                    f'Automatic commit by running the command "west mpv-manifest -f" \nUpdate from {args.manifest_folder}'], check=False)
-                manifest_proj.git(['push', 'origin', f"{branch}"], check=False)
+                mpv_git(manifest_proj, ['push', 'origin', f"{branch}"], check=False)
 
 
             else:
@@ -2718,11 +5668,14 @@ class MpvTemp(WestCommand):
             description=self.description,
             formatter_class=argparse.RawDescriptionHelpFormatter)
 
+        add_trace_argument(parser)
+
         return parser
 
 
 
     def do_run(self, args, _):
+        start_trace(args.trace, self.name)
         # manifest_proj = self.manifest.get_projects(['manifest'])[0]
         # branches = mpv_branches(manifest_proj)
         # i_logger.dbg(f"branches: {branches}\n\n")
@@ -2741,7 +5694,7 @@ class MpvTemp(WestCommand):
         # git branch  --format="%(if:equals=[gone])%(upstream:track)%(then)%(refname:short)%(end)"
         for proj in self.manifest.projects:
             check_branch_ahead_remote(proj, "main")
-            cp = proj.git('branch  --format="%(if:equals=[gone])%(upstream:track)%(then)%(refname:short)%(end)"',
+            cp = mpv_git(proj, 'branch  --format="%(if:equals=[gone])%(upstream:track)%(then)%(refname:short)%(end)"',
                              capture_stdout=True, capture_stderr=True,
                              check=False)
             branch2del = cp.stdout.decode('ascii').strip(' "\n\r').splitlines()
@@ -11,6 +11,7 @@ import re
 import shutil
 import glob
 import subprocess
+import sys
 import textwrap
 from pathlib import Path, PurePath
 from rich import print as rprint
@@ -26,7 +27,7 @@ from west.manifest import Manifest, ManifestProject, Project, \
 from west.manifest import ImportFlag as MIF
 from conftest import create_branch, create_workspace, create_repo, \
     add_commit, add_tag, check_output, cmd, GIT, rev_parse, \
-    check_proj_consistency, checkout_branch
+    check_proj_consistency, checkout_branch, config_repo
 
 # assert 'TOXTEMPDIR' in os.environ, "you must run these tests using tox"
 
@@ -74,6 +75,15 @@ def mpv_update_tmpdir(west_init_tmpdir):
     return west_init_tmpdir
 
 
+@pytest.fixture
+def mpv_update_tmpdir_no_west_update(west_init_tmpdir):
+    # Like west_init_tmpdir, but clone the projects with mpv-update.
+    # west update is needed only for the project of the west commands
+    cmd('update mpv-git-west-commands', cwd=str(west_init_tmpdir))
+    cmd('mpv-update --full-clone', cwd=str(west_init_tmpdir))
+    return west_init_tmpdir
+
+
 @pytest.fixture
 def mpv_update_tmpdir_f_m1(west_init_tmpdir):
     # Like west_init_tmpdir, but also runs west update only for F_M1 group
@@ -98,6 +108,14 @@ def mpv_update_tmpdir_clone_depth(west_init_tmpdir):
     return west_init_tmpdir
 
 
+@pytest.fixture
+def mpv_update_tmpdir_jobs(west_init_tmpdir):
+    # Like mpv_update_tmpdir, but update the projects in parallel
+    cmd('update', cwd=str(west_init_tmpdir))
+    cmd('mpv-update --full-clone -j 4', cwd=str(west_init_tmpdir))
+    return west_init_tmpdir
+
+
 @pytest.fixture
 def mpv_init_tmpdir(mpv_update_tmpdir):
     # Create new project with name proj_1, and version 1.0.0
@@ -275,6 +293,16 @@ def remove_space(string):
     return new_string
 
 
+def mpv_python(code, workspace):
+    '''
+    Run python code in the workspace, with mpv_commands of the workspace in the path.
+    Return the output of the code.
+    '''
+    scripts = Path(workspace).joinpath('GIT-MNGR', 'mpv-git-west-commands', 'scripts')
+    code = f"import sys\nsys.path.insert(0, {os.fspath(scripts)!r})\n" + textwrap.dedent(code)
+    return check_output([sys.executable, '-c', code], cwd=workspace, stderr=subprocess.STDOUT)
+
+
 #
 # Test cases
 #
@@ -344,6 +372,133 @@ def test_mpv_update(mpv_update_tmpdir):
     # assert module1_nested_data_revision == 'main'
 
 
+def test_mpv_update_jobs(mpv_update_tmpdir_jobs):
+    print("\n\n\n\n--------------------------------")
+    print(f"mpv_update_tmpdir_jobs: {mpv_update_tmpdir_jobs}")
+    wct = mpv_update_tmpdir_jobs
+
+    # Validate that all repositories cloned to the workspace
+    assert wct.joinpath("MODULE1/module1-src/main.cpp").is_file()
+    assert wct.joinpath("MODULE1/module1-data").is_dir()
+    assert wct.joinpath("MODULE2/module2-src/main.cpp").is_file()
+    assert wct.joinpath("MODULE2/module2-data").is_dir()
+    assert wct.joinpath("EXTERNAL/external1").is_dir()
+    assert wct.joinpath("PROJECTS_COMMON/proj_common").is_dir()
+
+    # Validate that the projects checkout to the revision in west.yml
+    # and fetch all content (--full-clone)
+    shallow_repos = cmd('forall -c "git rev-parse --is-shallow-repository"',
+                        cwd=str(wct))
+    assert "true" not in shallow_repos
+    proj_common_branch = check_output([GIT, 'branch', '--show-current'],
+                                      cwd=wct.joinpath("PROJECTS_COMMON/proj_common"))
+    assert proj_common_branch.strip() == "develop"
+    module1_src_branch = check_output([GIT, 'branch', '--show-current'],
+                                      cwd=wct.joinpath("MODULE1/module1-src"))
+    assert module1_src_branch.strip() == "main"
+
+    # Re-run in parallel on updated workspace, with trace of the git commands
+    trace_file = wct.joinpath("mpv-update-trace.json")
+    cmd(f'mpv-update -j 3 --force-update --trace {trace_file}', cwd=str(wct))
+    trace_events = yaml.safe_load(trace_file.read_text())['traceEvents']
+    git_events = [event for event in trace_events if event.get('cat') == 'git']
+    assert any(event['args']['project'] == 'module1-src' and
+               event['args']['argv'][:2] == ['git', 'fetch'] for event in git_events)
+    phases = {event['name'] for event in trace_events if event.get('cat') == 'phase'}
+    assert {"checkout loop", "hook install"} <= phases
+
+
+def test_mpv_update_no_west_update(mpv_update_tmpdir_no_west_update):
+    print("\n\n\n\n--------------------------------")
+    print(f"mpv_update_tmpdir_no_west_update: {mpv_update_tmpdir_no_west_update}")
+    wct = mpv_update_tmpdir_no_west_update
+
+    # Validate that mpv-update cloned all repositories by itself
+    assert wct.joinpath("MODULE1/module1-src/main.cpp").is_file()
+    assert wct.joinpath("MODULE1/module1-data").is_dir()
+    assert wct.joinpath("MODULE2/module2-src/main.cpp").is_file()
+    assert wct.joinpath("MODULE2/module2-data").is_dir()
+    assert wct.joinpath("EXTERNAL/external1").is_dir()
+    assert wct.joinpath("PROJECTS_COMMON/proj_common").is_dir()
+
+    shallow_repos = cmd('forall -c "git rev-parse --is-shallow-repository"',
+                        cwd=str(wct))
+    assert "true" not in shallow_repos
+    proj_common_branch = check_output([GIT, 'branch', '--show-current'],
+                                      cwd=wct.joinpath("PROJECTS_COMMON/proj_common"))
+    assert proj_common_branch.strip() == "develop"
+    # manifest-rev points to the revision, as after west update
+    module1_src_apath = wct.joinpath("MODULE1/module1-src")
+    assert (check_output([GIT, 'rev-parse', 'manifest-rev'], cwd=module1_src_apath) ==
+            check_output([GIT, 'rev-parse', 'HEAD'], cwd=module1_src_apath))
+
+
+def test_mpv_update_incremental(mpv_update_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"mpv_update_tmpdir: {mpv_update_tmpdir}")
+    wct = mpv_update_tmpdir
+
+    # Nothing changed since the last update
+    output = cmd('mpv-update --full-clone', cwd=str(wct))
+    assert "All projects are up to date" in output
+    assert wct.joinpath("log-mpv/update-state.json").is_file()
+    # The commit-msg hook was installed by the first update, and didn't change
+    assert "commit-msg hook installed in 0 of" in output
+    hook_file = wct.joinpath("MODULE1/module1-src/.git/hooks/commit-msg")
+    assert os.access(hook_file, os.X_OK)
+    assert "mpv_version=" in hook_file.read_text()
+
+    # Add commit to the remote of module1-src - only module1-src should be updated
+    module1_src_url = check_output(['west', 'list', '-f "{url}"', 'module1-src'],
+                                   cwd=str(wct)).strip(' "\n\r')
+    add_commit(module1_src_url, 'In test_mpv_update_incremental')
+    output = cmd('mpv-update --full-clone', cwd=str(wct))
+    assert "Project module1-src is up to date - skipped" not in output
+    assert "Project module2-src is up to date - skipped" in output
+    remote_sha = check_output([GIT, 'rev-parse', 'HEAD'], cwd=module1_src_url)
+    local_sha = check_output([GIT, 'rev-parse', 'HEAD'],
+                             cwd=wct.joinpath("MODULE1/module1-src"))
+    assert local_sha == remote_sha
+
+    # --force-update touch all projects
+    output = cmd('mpv-update --full-clone --force-update', cwd=str(wct))
+    assert "is up to date - skipped" not in output
+
+
+def test_mpv_update_shared_hooks(mpv_update_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"mpv_update_tmpdir: {mpv_update_tmpdir}")
+    wct = mpv_update_tmpdir
+    module1_src_apath = wct.joinpath("MODULE1/module1-src")
+
+    # Hook of the repository, that should be chained by the shared hooks
+    repo_hook = module1_src_apath.joinpath(".git/hooks/pre-commit")
+    repo_hook.write_text('#!/bin/sh\ntouch "${GIT_DIR:-.git}/pre-commit-ran"\n')
+    repo_hook.chmod(0o755)
+
+    cmd('mpv-update --hooks shared', cwd=str(wct))
+    hooks_path = check_output([GIT, 'config', 'core.hooksPath'], cwd=module1_src_apath)
+    assert Path(hooks_path.strip()) == wct.resolve().joinpath(".west/mpv-hooks")
+    assert wct.joinpath(".west/mpv-hooks/mpv-hook.env").is_file()
+    assert not module1_src_apath.joinpath(".git/hooks/commit-msg").exists()
+
+    # Commit with hooks (add_commit() skip the hooks)
+    config_repo(module1_src_apath)
+    check_output([GIT, 'commit', '--allow-empty', '--no-gpg-sign',
+                  '-m', 'In test_mpv_update_shared_hooks'], cwd=module1_src_apath)
+    commit_msg = check_output([GIT, 'log', '-1', '--format=%B'], cwd=module1_src_apath)
+    assert "Information added by mpv" in commit_msg
+    assert "branch: main" in commit_msg
+    assert module1_src_apath.joinpath(".git/pre-commit-ran").is_file()
+
+    # Back to copy of commit-msg to each repository
+    cmd('mpv-update --hooks copy', cwd=str(wct))
+    hooks_path = subprocess.run([GIT, 'config', 'core.hooksPath'], cwd=module1_src_apath,
+                                capture_output=True, text=True).stdout
+    assert hooks_path.strip() == ""
+    assert module1_src_apath.joinpath(".git/hooks/commit-msg").is_file()
+
+
 def test_mpv_update_f_m1(mpv_update_tmpdir_f_m1):
     print("\n\n\n\n--------------------------------")
     print(f"west_update_tmpdir_f_m1: {mpv_update_tmpdir_f_m1}")
@@ -535,6 +690,13 @@ def test_mpv_update_clone_depth(mpv_update_tmpdir_clone_depth):
                                         cwd=str(wct)).strip(' "\n\r')
     assert module2_data_depth == 'None'
 
+    # The remote refs of the shallow repositories are kept in cache,
+    # so the next mpv command does not need to call ls-remote again
+    remote_refs = yaml.safe_load(wct.joinpath("log-mpv", "remote-refs.json").read_text())
+    module2_src_url = check_output(['west', 'list', '-f "{url}"', 'module2-src'],
+                                   cwd=str(wct)).strip(' "\n\r')
+    assert 'main' in remote_refs[module2_src_url]['heads']
+
 
     ##########################
     ### check external1 ###
@@ -570,6 +732,59 @@ def test_mpv_update_clone_depth(mpv_update_tmpdir_clone_depth):
 
 
 
+def test_mpv_git_engine(mpv_update_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print("test_mpv_git_engine()")
+
+    output = mpv_python('''
+        import asyncio
+        import json
+        import subprocess
+        from west.manifest import Manifest
+        from mpv_commands import GitEngine, i_logger, mpv_git
+
+        projects = Manifest.from_topdir().get_projects(['module1-src', 'module1-data', 'module2-src', 'module2-data'])
+        slow = ['-c', 'alias.slow=!sleep 0.5', 'slow']
+
+        def max_parallel(results):
+            return max(sum(1 for other in results if other.start <= result.start < other.end) for result in results)
+
+        def run_all(engine, projects):
+            async def gather():
+                return await asyncio.gather(*[engine.git(project, slow, True, True, None, None) for project in projects])
+            return engine.run(gather())
+
+        engine = GitEngine(jobs=2)
+        checks = {}
+
+        result = engine.git_sync(projects[0], slow, True, True, None, 0.1)
+        checks['timed_out'] = result.timed_out
+        try:
+            result.check()
+        except subprocess.TimeoutExpired:
+            checks['timeout_raised'] = True
+
+        # Commands of the same repository run one after the other
+        checks['same_project'] = max_parallel(run_all(engine, [projects[0]] * 3))
+        # Commands of different repositories run in parallel, up to the jobs of the engine
+        checks['all_projects'] = max_parallel(run_all(engine, projects))
+
+        # The log lines of the git commands go to the buffer of the calling thread
+        with i_logger.buffered() as buffer:
+            mpv_git(projects[0], ['rev-parse', 'HEAD'], capture_stdout=True)
+        checks['buffered'] = [message for method, message, kwargs in buffer]
+
+        print(json.dumps(checks))
+    ''', mpv_update_tmpdir)
+    checks = yaml.safe_load(output.splitlines()[-1])
+    assert checks['timed_out'] and checks['timeout_raised']
+    assert checks['same_project'] == 1
+    assert checks['all_projects'] == 2
+    assert any(message.startswith("git() - project: module1-src, running: git rev-parse HEAD")
+               for message in checks['buffered'])
+    assert any(message.startswith("git() - project: module1-src, exit code: 0") for message in checks['buffered'])
+
+
 def test_mpv_init(mpv_init_tmpdir):
     # Validate that the type of the project is source_data in mpv.yml
     print("\n\n\n\n--------------------------------")
@@ -867,6 +1082,194 @@ def test_mpv_new_proj_tag(mpv_new_proj_tmpdir):
 
 
 
+def test_mpv_new_proj_push_only(mpv_new_proj_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_new_proj_push_only: {mpv_new_proj_tmpdir}")
+
+    output = cmd('mpv-new-proj --push-only -t s proj_1__1.0.0_dev fast_s 1.0.0', cwd=str(mpv_new_proj_tmpdir))
+    assert "Create branches of fast_s:1.0.0" in output
+    assert "pushed fast_s__1.0.0_dev fast_s__1.0.0_integ fast_s__1.0.0_main" in output
+    assert "failed: 0" in output
+
+    # The branches are created in the remotes from proj_1__1.0.0_dev, without local branches
+    repo = ['MODULE1/module1-src', 'MODULE1/module1-data', 'MODULE2/module2-src',
+            'MODULE2/module2-data']
+    for rep in repo:
+        repo_path = mpv_new_proj_tmpdir.joinpath(rep)
+        rev_proj_100 = rev_parse(repo_path, 'remotes/origin/proj_1__1.0.0_dev')
+        remote_branches = check_output([GIT, 'ls-remote', 'origin', 'refs/heads/fast_s__1.0.0_*'], cwd=repo_path)
+        for sub in ['fast_s__1.0.0_dev', 'fast_s__1.0.0_integ', 'fast_s__1.0.0_main']:
+            assert f"{rev_proj_100}\trefs/heads/{sub}" in remote_branches
+        assert "fast_s" not in check_output([GIT, 'branch', '--list', 'fast_s*'], cwd=repo_path)
+
+    # The new project can be used
+    cmd('mpv-update --full-clone --mr fast_s__1.0.0_dev', cwd=str(mpv_new_proj_tmpdir))
+    for rep in repo:
+        repo_status = check_output([GIT, 'status', '-bz'], cwd=mpv_new_proj_tmpdir.joinpath(rep))
+        assert "fast_s__1.0.0_dev" in repo_status
+
+    # The destination branches already exist
+    with pytest.raises(subprocess.CalledProcessError):
+        cmd('mpv-new-proj --push-only -t s proj_1__1.0.0_dev fast_s 1.0.0', cwd=str(mpv_new_proj_tmpdir))
+
+
+def test_mpv_new_proj_data_no_fetch(mpv_new_proj_tmpdir, tmp_path):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_new_proj_data_no_fetch: {mpv_new_proj_tmpdir}")
+
+    # Add commit to proj_1__1.0.0_dev of module1-src in the remote only
+    module1_src_apath = mpv_new_proj_tmpdir.joinpath('MODULE1/module1-src')
+    url = check_output([GIT, 'remote', 'get-url', 'origin'], cwd=module1_src_apath).strip()
+    other_apath = tmp_path.joinpath('other-module1-src')
+    subprocess.check_call([GIT, 'clone', '-b', 'proj_1__1.0.0_dev', url, str(other_apath)])
+    add_commit(other_apath, 'In test_mpv_new_proj_data_no_fetch', files={'new_file.cpp': 'new file'})
+    subprocess.check_call([GIT, 'push', 'origin', 'HEAD:proj_1__1.0.0_dev'], cwd=other_apath)
+    new_sha = rev_parse(other_apath, 'HEAD')
+    local_sha = rev_parse(module1_src_apath, 'remotes/origin/proj_1__1.0.0_dev')
+
+    # Don't use the local refs of the last fetch - the SHA is read from the remote
+    cmd('config mpv.remote-refs-ttl 0', cwd=str(mpv_new_proj_tmpdir))
+    cmd('mpv-new-proj proj_1__1.0.0_dev pin_d 1.0.0', cwd=str(mpv_new_proj_tmpdir))
+
+    west_yml = check_output([GIT, 'show', 'origin/pin_d__1.0.0_dev:west.yml'],
+                            cwd=mpv_new_proj_tmpdir.joinpath('mpv-test-git-manager'))
+    revisions = {project['name']: project['revision'] for project in yaml.safe_load(west_yml)['manifest']['projects']}
+    assert revisions['module1-src'] == new_sha
+    assert revisions['module1-data'] == 'pin_d__1.0.0_dev'
+
+    # The source repository was not fetched
+    assert rev_parse(module1_src_apath, 'remotes/origin/proj_1__1.0.0_dev') == local_sha
+
+
+def test_mpv_new_proj_spec(mpv_new_proj_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_new_proj_spec: {mpv_new_proj_tmpdir}")
+
+    spec_file = mpv_new_proj_tmpdir.joinpath("projects.yml")
+    spec_file.write_text(textwrap.dedent('''\
+        - source_branch: proj_1__1.0.0_dev
+          dest_proj: cust_a
+          dest_ver: 1.0.0
+        - source_branch: proj_1__1.0.0_dev
+          dest_proj: cust_b
+          dest_ver: 2.0.0
+          t: s
+        '''))
+    output = cmd(f'mpv-new-proj --spec {spec_file}', cwd=str(mpv_new_proj_tmpdir))
+    assert "Create branches of 2 projects" in output
+    assert "failed: 0" in output
+
+    manifest_apath = mpv_new_proj_tmpdir.joinpath('mpv-test-git-manager')
+    for rep, content in [('MODULE1/module1-src', 'SOURCE'), ('MODULE1/module1-data', 'DATA'),
+                         ('MODULE2/module2-src', 'SOURCE'), ('MODULE2/module2-data', 'DATA')]:
+        repo_path = mpv_new_proj_tmpdir.joinpath(rep)
+        rev_proj_100 = rev_parse(repo_path, 'remotes/origin/proj_1__1.0.0_dev')
+        remote_branches = check_output([GIT, 'ls-remote', 'origin', 'refs/heads/cust_*'], cwd=repo_path)
+        for sub in ['cust_b__2.0.0_dev', 'cust_b__2.0.0_integ', 'cust_b__2.0.0_main']:
+            assert f"{rev_proj_100}\trefs/heads/{sub}" in remote_branches
+        assert ("cust_a__1.0.0_main" in remote_branches) == (content == 'DATA')
+
+        # The revisions in west.yml of the new branches
+        for sub in ['cust_a__1.0.0_dev', 'cust_a__1.0.0_main', 'cust_b__2.0.0_integ']:
+            west_yml = check_output([GIT, 'show', f'origin/{sub}:west.yml'], cwd=manifest_apath)
+            revisions = {project['name']: project['revision']
+                         for project in yaml.safe_load(west_yml)['manifest']['projects']}
+            expected = rev_proj_100 if (sub.startswith('cust_a') and content == 'SOURCE') else sub
+            assert revisions[repo_path.name] == expected
+
+    mpv_yml = check_output([GIT, 'show', 'origin/cust_b__2.0.0_dev:mpv.yml'], cwd=manifest_apath)
+    assert yaml.safe_load(mpv_yml)['manifest']['self']['merge-method'] == 'SOURCE_DATA'
+    mpv_yml = check_output([GIT, 'show', 'origin/cust_a__1.0.0_dev:mpv.yml'], cwd=manifest_apath)
+    assert yaml.safe_load(mpv_yml)['manifest']['self']['merge-method'] == 'DATA'
+
+
+def test_mpv_new_proj_resume_rollback(mpv_new_proj_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_new_proj_resume_rollback: {mpv_new_proj_tmpdir}")
+
+    repo = ['MODULE1/module1-src', 'MODULE1/module1-data', 'MODULE2/module2-src',
+            'MODULE2/module2-data']
+    module2_data_apath = mpv_new_proj_tmpdir.joinpath('MODULE2/module2-data')
+    journal_file = mpv_new_proj_tmpdir.joinpath('log-mpv', 'new-proj-journal.json')
+
+    def remote_branches(rep):
+        return check_output([GIT, 'ls-remote', 'origin', 'refs/heads/roll_s__*'],
+                            cwd=mpv_new_proj_tmpdir.joinpath(rep))
+
+    # The creation fails in module2-data, because the branch already exist there
+    subprocess.check_call([GIT, 'push', 'origin', 'origin/proj_1__1.0.0_dev:refs/heads/roll_s__1.0.0_dev'],
+                          cwd=module2_data_apath)
+    with pytest.raises(subprocess.CalledProcessError):
+        cmd('mpv-new-proj --push-only -t s proj_1__1.0.0_dev roll_s 1.0.0', cwd=str(mpv_new_proj_tmpdir))
+    assert journal_file.exists()
+    for rep in repo[:3]:
+        assert "roll_s__1.0.0_main" in remote_branches(rep)
+
+    # New mpv-new-proj can't start before the last one is resumed or rolled back
+    with pytest.raises(subprocess.CalledProcessError):
+        cmd('mpv-new-proj proj_1__1.0.0_dev other_d 1.0.0', cwd=str(mpv_new_proj_tmpdir))
+
+    # Rollback delete only the branches that were created
+    output = cmd('mpv-new-proj --rollback', cwd=str(mpv_new_proj_tmpdir))
+    assert "Rollback summary" in output
+    assert not journal_file.exists()
+    for rep in repo[:3]:
+        assert "roll_s" not in remote_branches(rep)
+    assert "roll_s__1.0.0_dev" in remote_branches('MODULE2/module2-data')
+
+    # Fail again, fix the problem and resume
+    with pytest.raises(subprocess.CalledProcessError):
+        cmd('mpv-new-proj --push-only -t s proj_1__1.0.0_dev roll_s 1.0.0', cwd=str(mpv_new_proj_tmpdir))
+    subprocess.check_call([GIT, 'push', 'origin', ':refs/heads/roll_s__1.0.0_dev'], cwd=module2_data_apath)
+    output = cmd('mpv-new-proj --resume', cwd=str(mpv_new_proj_tmpdir))
+    assert "were already created in project module1-src - skipped" in output
+    assert not journal_file.exists()
+    for rep in repo:
+        assert "roll_s__1.0.0_main" in remote_branches(rep)
+    west_yml = check_output([GIT, 'show', 'origin/roll_s__1.0.0_dev:west.yml'],
+                            cwd=mpv_new_proj_tmpdir.joinpath('mpv-test-git-manager'))
+    revisions = {project['name']: project['revision'] for project in yaml.safe_load(west_yml)['manifest']['projects']}
+    assert revisions['module2-data'] == 'roll_s__1.0.0_dev'
+
+
+def test_mpv_new_proj_push_failure(mpv_new_proj_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_new_proj_push_failure: {mpv_new_proj_tmpdir}")
+
+    module1_src_apath = mpv_new_proj_tmpdir.joinpath('MODULE1/module1-src')
+    module2_data_apath = mpv_new_proj_tmpdir.joinpath('MODULE2/module2-data')
+    journal_file = mpv_new_proj_tmpdir.joinpath('log-mpv', 'new-proj-journal.json')
+
+    def remote_branches(apath):
+        return check_output([GIT, 'ls-remote', 'origin', 'refs/heads/fail_s__*'], cwd=apath)
+
+    # The remote of module2-data rejects only the integ branch
+    url = check_output([GIT, 'remote', 'get-url', 'origin'], cwd=module2_data_apath).strip()
+    hooks_path = Path(url).joinpath(check_output([GIT, 'rev-parse', '--git-path', 'hooks'], cwd=url).strip())
+    hooks_path.mkdir(parents=True, exist_ok=True)
+    hook = hooks_path.joinpath('pre-receive')
+    hook.write_text('#!/bin/sh\nif grep -q _integ; then echo "push rejected by test" >&2; exit 1; fi\n')
+    hook.chmod(0o755)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        cmd('mpv-new-proj -t s proj_1__1.0.0_dev fail_s 1.0.0', cwd=str(mpv_new_proj_tmpdir))
+    hook.unlink()
+
+    # The push is atomic: none of the branches were pushed, and the journal doesn't record them
+    assert "fail_s" not in remote_branches(module2_data_apath)
+    assert "fail_s__1.0.0_main" in remote_branches(module1_src_apath)
+    journal = yaml.safe_load(journal_file.read_text())
+    assert 'module2-data' not in journal['repos']
+    assert 'module1-src' in journal['repos']
+
+    # Rollback deletes also a local branch that is checked out
+    subprocess.check_call([GIT, 'checkout', '-q', 'fail_s__1.0.0_dev'], cwd=module1_src_apath)
+    cmd('mpv-new-proj --rollback', cwd=str(mpv_new_proj_tmpdir))
+    assert not journal_file.exists()
+    assert "fail_s" not in remote_branches(module1_src_apath)
+    assert "fail_s" not in check_output([GIT, 'branch', '--list', 'fail_s__*'], cwd=module1_src_apath)
+
+
 def test_mpv_merge(mpv_merge_tmpdir):
     '''
     The files that should be validate are:
@@ -915,6 +1318,297 @@ def test_mpv_merge(mpv_merge_tmpdir):
 
 
 
+def test_mpv_merge_jobs(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_jobs(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    # Fetch and merge all repos in parallel - the result should be the same as serial merge
+    output = cmd('mpv-merge -j 4 proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    validate_merge(mpv_merge_tmpdir, True)
+
+    # One table with the results of all repositories
+    summary = output[output.index("Merge summary"):]
+    assert re.search(r"module2-data\s+git merge\s+conflict\s+data2_conflict.cpp", summary)
+    assert re.search(r"external1\s+revision\s+revision\s+tag_2", summary)
+    assert "conflict: 1" in summary
+
+
+def test_mpv_merge_preflight(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_preflight(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    module2_data_apath = mpv_merge_tmpdir.joinpath("MODULE2/module2-data")
+    head_before = check_output([GIT, 'rev-parse', 'HEAD', '--symbolic-full-name', 'HEAD'], cwd=module2_data_apath)
+    west_yml_before = mpv_merge_tmpdir.joinpath("mpv-test-git-manager", "west.yml").read_text()
+
+    # Only report the expected conflicts - no checkout, no merge
+    output = cmd('mpv-merge --preflight -j 4 proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    summary = output[output.index("Preflight summary"):]
+    assert re.search(r"module2-data\s+git merge\s+conflict\s+data2_conflict.cpp", summary)
+    assert "conflict: 1" in summary
+
+    assert check_output([GIT, 'rev-parse', 'HEAD', '--symbolic-full-name', 'HEAD'], cwd=module2_data_apath) == head_before
+    assert check_output([GIT, 'status', '--porcelain'], cwd=module2_data_apath) == ''
+    assert mpv_merge_tmpdir.joinpath("mpv-test-git-manager", "west.yml").read_text() == west_yml_before
+
+    # The real merge find the same conflict
+    cmd('mpv-merge proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    validate_merge(mpv_merge_tmpdir, True)
+
+
+def test_mpv_merge_no_checkout(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_no_checkout(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    # Add commit to proj_1__1.0.0_dev of module1-data, that merge without conflicts
+    module1_data_apath = mpv_merge_tmpdir.joinpath("MODULE1/module1-data")
+    subprocess.check_call([GIT, 'checkout', '-b', 'no_checkout_test', 'origin/proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    add_commit(module1_data_apath, 'In method test_mpv_merge_no_checkout - proj_1__1.0.0_dev',
+               files={'data1_newfile.cpp': '// New file data1\n'})
+    subprocess.check_call([GIT, 'push', 'origin', 'HEAD:proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    head_before = rev_parse(module1_data_apath, 'HEAD')
+
+    output = cmd('mpv-merge --no-checkout proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    summary = output[output.index("Merge summary"):]
+    assert re.search(r"module1-data\s+git merge\s+merged\s+no checkout", summary)
+    # The repository with conflicts is merged with checkout - same results as regular merge
+    assert re.search(r"module2-data\s+git merge\s+conflict\s+data2_conflict.cpp", summary)
+    validate_merge(mpv_merge_tmpdir, True)
+
+    # The working tree of module1-data is not changed, and dummy_d__1.0.0_dev has the merge commit
+    assert rev_parse(module1_data_apath, 'HEAD') == head_before
+    assert check_output([GIT, 'status', '--porcelain'], cwd=module1_data_apath) == ''
+    parents = check_output([GIT, 'rev-list', '--parents', '-n', '1', 'dummy_d__1.0.0_dev'], cwd=module1_data_apath)
+    assert len(parents.split()) == 3
+    assert parents.split()[2] == rev_parse(module1_data_apath, 'origin/proj_1__1.0.0_dev')
+    assert check_output([GIT, 'show', 'dummy_d__1.0.0_dev:data1_newfile.cpp'], cwd=module1_data_apath) == '// New file data1\n'
+
+
+def test_mpv_merge_ff(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_ff(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    # Add commit to proj_1__1.0.0_dev of module1-data - dummy_d__1.0.0_dev is ancestor of it
+    module1_data_apath = mpv_merge_tmpdir.joinpath("MODULE1/module1-data")
+    subprocess.check_call([GIT, 'checkout', '-b', 'ff_test', 'origin/proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    add_commit(module1_data_apath, 'In method test_mpv_merge_ff - proj_1__1.0.0_dev',
+               files={'data1_newfile.cpp': '// New file data1\n'})
+    subprocess.check_call([GIT, 'push', 'origin', 'HEAD:proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    head_before = rev_parse(module1_data_apath, 'HEAD')
+
+    output = cmd('mpv-merge --ff -j 2 proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    validate_merge(mpv_merge_tmpdir, True)
+    summary = output[output.index("Merge summary"):]
+    assert re.search(r"module1-data\s+git merge\s+fast_forward", summary)
+    assert "fast_forward: 1" in summary
+    assert "skipped - " in summary and "west commands: 1" in summary
+
+    # Fast-forward without checkout and without merge commit
+    assert rev_parse(module1_data_apath, 'HEAD') == head_before
+    assert rev_parse(module1_data_apath, 'dummy_d__1.0.0_dev') == rev_parse(module1_data_apath, 'origin/proj_1__1.0.0_dev')
+
+    # Nothing new to merge - the repository is skipped
+    output = cmd('mpv-merge --preflight --ff proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    summary = output[output.index("Preflight summary"):]
+    assert re.search(r"module1-data\s+git merge\s+skipped\s+already merged", summary)
+
+
+def test_mpv_merge_deepen(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_deepen(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    # Add commits to both branches of module1-data, that should be merged
+    module1_data_apath = mpv_merge_tmpdir.joinpath("MODULE1/module1-data")
+    subprocess.check_call([GIT, 'checkout', '-b', 'deepen_from', 'origin/proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    add_commit(module1_data_apath, 'In method test_mpv_merge_deepen - proj_1__1.0.0_dev',
+               files={'data1_from.cpp': '// New file data1 from\n'})
+    subprocess.check_call([GIT, 'push', 'origin', 'HEAD:proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    subprocess.check_call([GIT, 'checkout', '-b', 'deepen_to', 'origin/dummy_d__1.0.0_dev'], cwd=module1_data_apath)
+    add_commit(module1_data_apath, 'In method test_mpv_merge_deepen - dummy_d__1.0.0_dev',
+               files={'data1_to.cpp': '// New file data1 to\n'})
+    subprocess.check_call([GIT, 'push', 'origin', 'HEAD:dummy_d__1.0.0_dev'], cwd=module1_data_apath)
+
+    # Replace module1-data with shallow clone - the merge base is not in it
+    url = check_output([GIT, 'remote', 'get-url', 'origin'], cwd=module1_data_apath).strip()
+    shutil.rmtree(module1_data_apath)
+    subprocess.check_call([GIT, 'clone', '--depth', '1', '--no-single-branch', f"file://{url}", str(module1_data_apath)])
+    subprocess.check_call([GIT, 'remote', 'set-url', 'origin', url], cwd=module1_data_apath)
+
+    output = cmd('mpv-merge --deepen proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    summary = output[output.index("Merge summary"):]
+    assert re.search(r"module1-data\s+git merge\s+merged", summary)
+
+    # Only the required history was fetched, and the depth was saved to the next merge
+    assert "deepen module1-data by 32 commits" in output
+    assert "use --unshallow" not in output
+    depths = yaml.safe_load(mpv_merge_tmpdir.joinpath('log-mpv', 'merge-depth.json').read_text())
+    assert depths['module1-data'] == 32
+
+
+def test_mpv_merge_continue(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_continue(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    git_manager_apath = mpv_merge_tmpdir.joinpath("mpv-test-git-manager")
+    module2_data_apath = mpv_merge_tmpdir.joinpath("MODULE2/module2-data")
+    journal_file = mpv_merge_tmpdir.joinpath('log-mpv', 'merge-journal.json')
+
+    output = cmd('mpv-merge proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    validate_merge(mpv_merge_tmpdir, True)
+    assert "mpv-merge --continue" in output
+    journal = yaml.safe_load(journal_file.read_text())
+    assert journal['repos']['module2-data']['state'] == 'conflict'
+    assert journal['repos']['module1-data']['state'] == 'merged'
+    manifest_sha = rev_parse(git_manager_apath, 'HEAD')
+
+    # Resolve the conflict, and continue - only the repository with conflict is checked again
+    module2_data_apath.joinpath('data2_conflict.cpp').write_text('// resolved\n')
+    subprocess.check_call([GIT, 'add', 'data2_conflict.cpp'], cwd=module2_data_apath)
+    subprocess.check_call([GIT, 'commit', '--no-edit', '--no-verify'], cwd=module2_data_apath)
+
+    output = cmd('mpv-merge --continue', cwd=mpv_merge_tmpdir)
+    summary = output[output.index("Merge summary"):]
+    assert re.search(r"module2-data\s+git merge\s+merged\s+conflict resolved", summary)
+    assert "Fetch 0 repositories" in output
+    # west.yml was updated only once, and the merge is finished
+    assert rev_parse(git_manager_apath, 'HEAD') == manifest_sha
+    assert not journal_file.exists()
+
+
+def test_mpv_merge_fetch_failure(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_fetch_failure(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    module1_data_apath = mpv_merge_tmpdir.joinpath("MODULE1/module1-data")
+    journal_file = mpv_merge_tmpdir.joinpath('log-mpv', 'merge-journal.json')
+    url = check_output([GIT, 'remote', 'get-url', 'origin'], cwd=module1_data_apath).strip()
+    subprocess.check_call([GIT, 'remote', 'set-url', 'origin', url + '-missing'], cwd=module1_data_apath)
+
+    # The merge stops when a repository can't be fetched
+    with pytest.raises(subprocess.CalledProcessError):
+        cmd('mpv-merge --preflight proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    with pytest.raises(subprocess.CalledProcessError):
+        cmd('mpv-merge proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    journal = yaml.safe_load(journal_file.read_text())
+    assert 'module1-data' not in journal['repos']
+    assert journal['repos']['module2-data']['state'] == 'fetched'
+
+    # --continue fetch again only the repository that failed
+    subprocess.check_call([GIT, 'remote', 'set-url', 'origin', url], cwd=module1_data_apath)
+    output = cmd('mpv-merge --continue', cwd=mpv_merge_tmpdir)
+    assert "Fetch 1 repositories" in output
+    journal = yaml.safe_load(journal_file.read_text())
+    assert journal['repos']['module1-data']['state'] == 'merged'
+
+
+def test_mpv_merge_abort(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_abort(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    git_manager_apath = mpv_merge_tmpdir.joinpath("mpv-test-git-manager")
+    module2_data_apath = mpv_merge_tmpdir.joinpath("MODULE2/module2-data")
+    manifest_sha = rev_parse(git_manager_apath, 'origin/dummy_d__1.0.0_dev')
+    head_before = rev_parse(module2_data_apath, 'HEAD')
+
+    cmd('mpv-merge proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    cmd('mpv-merge --abort', cwd=mpv_merge_tmpdir)
+
+    # The repositories and the manifest are as before the merge
+    assert check_output([GIT, 'status', '--porcelain'], cwd=module2_data_apath) == ''
+    assert rev_parse(module2_data_apath, 'HEAD') == head_before
+    assert rev_parse(git_manager_apath, 'dummy_d__1.0.0_dev') == manifest_sha
+    assert not mpv_merge_tmpdir.joinpath('log-mpv', 'merge-journal.json').exists()
+
+
+def test_mpv_merge_push(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_push(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    git_manager_apath = mpv_merge_tmpdir.joinpath("mpv-test-git-manager")
+    module1_data_apath = mpv_merge_tmpdir.joinpath("MODULE1/module1-data")
+    module2_data_apath = mpv_merge_tmpdir.joinpath("MODULE2/module2-data")
+    subprocess.check_call([GIT, 'checkout', '-b', 'push_test', 'origin/proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    add_commit(module1_data_apath, 'In method test_mpv_merge_push - proj_1__1.0.0_dev',
+               files={'data1_newfile.cpp': '// New file data1\n'})
+    subprocess.check_call([GIT, 'push', 'origin', 'HEAD:proj_1__1.0.0_dev'], cwd=module1_data_apath)
+
+    # Merge without conflicts (-s ours in module2-data), and push
+    output = cmd('mpv-merge --push -o module2-data "-s ours" proj_1__1.0.0_dev dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    summary = output[output.index("Push summary"):]
+    assert re.search(r"module1-data\s+ok\s+pushed dummy_d__1.0.0_dev", summary)
+    assert re.search(r"manifest\s+ok\s+pushed dummy_d__1.0.0_dev", summary)
+    assert "failed: 0" in summary
+    # Repositories that were not changed by the merge are not pushed
+    assert not re.search(r"module2-src\s+ok", summary)
+
+    for apath in (git_manager_apath, module1_data_apath, module2_data_apath):
+        url = check_output([GIT, 'remote', 'get-url', 'origin'], cwd=apath).strip()
+        assert rev_parse(url, 'dummy_d__1.0.0_dev') == rev_parse(apath, 'dummy_d__1.0.0_dev')
+
+
+def test_mpv_merge_then(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_then(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    module1_data_apath = mpv_merge_tmpdir.joinpath("MODULE1/module1-data")
+    subprocess.check_call([GIT, 'checkout', '-b', 'then_test', 'origin/proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    add_commit(module1_data_apath, 'In method test_mpv_merge_then - proj_1__1.0.0_dev',
+               files={'data1_newfile.cpp': '// New file data1\n'})
+    subprocess.check_call([GIT, 'push', 'origin', 'HEAD:proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    new_commit = rev_parse(module1_data_apath, 'HEAD')
+
+    # proj_1__1.0.0_dev -> dummy_s__1.0.0_dev -> dummy_d__1.0.0_dev, without conflicts
+    output = cmd('mpv-merge -o module1-src "-s ours" -o module2-data "-s ours" '
+                 'proj_1__1.0.0_dev dummy_s__1.0.0_dev --then dummy_d__1.0.0_dev', cwd=mpv_merge_tmpdir)
+    assert "Merge summary" in output[:output.index("Merge from branch dummy_s__1.0.0_dev")]
+    # The second merge is from the local branch that was merged, and doesn't fetch again
+    second = output[output.index("Merge from branch dummy_s__1.0.0_dev to branch dummy_d__1.0.0_dev"):]
+    assert "Fetch 0 repositories" in second
+    assert "Merge summary" in second
+
+    # The new commit of proj_1__1.0.0_dev is in both destination branches
+    for branch in ('dummy_s__1.0.0_dev', 'dummy_d__1.0.0_dev'):
+        subprocess.check_call([GIT, 'merge-base', '--is-ancestor', new_commit, branch], cwd=module1_data_apath)
+    # In DATA merge the sha of module1-src is taken from the merged dummy_s__1.0.0_dev
+    module1_src_apath = mpv_merge_tmpdir.joinpath("MODULE1/module1-src")
+    west_yml = yaml.safe_load(check_output([GIT, 'show', 'dummy_d__1.0.0_dev:west.yml'],
+                                           cwd=mpv_merge_tmpdir.joinpath("mpv-test-git-manager")))
+    assert west_yml['manifest']['projects'][1]['revision'] == rev_parse(module1_src_apath, 'dummy_s__1.0.0_dev')
+
+
+def test_mpv_merge_spec(mpv_merge_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print(f"test_mpv_merge_spec(): mpv_merge_tmpdir: {mpv_merge_tmpdir}")
+
+    module1_data_apath = mpv_merge_tmpdir.joinpath("MODULE1/module1-data")
+    subprocess.check_call([GIT, 'checkout', '-b', 'spec_test', 'origin/proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    add_commit(module1_data_apath, 'In method test_mpv_merge_spec - proj_1__1.0.0_dev',
+               files={'data1_newfile.cpp': '// New file data1\n'})
+    subprocess.check_call([GIT, 'push', 'origin', 'HEAD:proj_1__1.0.0_dev'], cwd=module1_data_apath)
+    new_commit = rev_parse(module1_data_apath, 'HEAD')
+
+    # Merge one version to 2 branches, without conflicts
+    spec_file = mpv_merge_tmpdir.joinpath("merges.csv")
+    spec_file.write_text(textwrap.dedent('''\
+        branch_from,branch_to,t,o
+        proj_1__1.0.0_dev,dummy_d__1.0.0_dev,,module2-data:-s ours
+        proj_1__1.0.0_dev,dummy_s__1.0.0_dev,module1-src module1-data,module1-src:-s ours
+        '''))
+    output = cmd(f'mpv-merge --spec {spec_file}', cwd=mpv_merge_tmpdir)
+
+    # The repositories are fetched once for all the merges
+    second = output[output.index("Merge from branch proj_1__1.0.0_dev to branch dummy_s__1.0.0_dev"):]
+    assert "Fetch 0 repositories" in second
+    assert "filtered by -t" in second
+
+    # One report for all the merges
+    summary = output[output.index("Batch merge summary"):]
+    assert re.search(r"proj_1__1.0.0_dev\s+dummy_d__1.0.0_dev\s+2\s+0\s+2", summary)
+    assert re.search(r"proj_1__1.0.0_dev\s+dummy_s__1.0.0_dev\s+2\s+", summary)
+    for branch in ('dummy_d__1.0.0_dev', 'dummy_s__1.0.0_dev'):
+        subprocess.check_call([GIT, 'merge-base', '--is-ancestor', new_commit, branch], cwd=module1_data_apath)
+
+
 def validate_merge(base_path, merge_data: bool):
     '''
     The notes to test_mpv_merge() method, 
@@ -1186,7 +1880,9 @@ def test_mpv_tag(mpv_update_tmpdir):
 
     full_tag = "mpv-tag_br-main__mpv_tag1"
     print(f"test_mpv_tag() - Create the tag: {full_tag}")
-    cmd('mpv-tag -m "tag from test_mpv_tag" mpv_tag1', cwd=str(mpv_update_tmpdir))
+    output = cmd('mpv-tag -m "tag from test_mpv_tag" mpv_tag1', cwd=str(mpv_update_tmpdir))
+    assert re.search(r"module2-data\s+ok\s+pushed mpv-tag_br-main__mpv_tag1, verified", output)
+    assert "failed: 0" in output
 
     print(f"test_mpv_tag() - Call mpv-update to set tag: {full_tag}")
     cmd(f'mpv-update --mr {full_tag}', cwd=str(mpv_update_tmpdir))
@@ -1265,6 +1961,33 @@ def test_mpv_tag(mpv_update_tmpdir):
     assert sha_prev == sha_current
 
 
+def test_mpv_tag_push_failure(mpv_update_tmpdir):
+    print("\n\n\n\n--------------------------------")
+    print("test_mpv_tag_push_failure()")
+
+    # The remote of module2-data reject all pushes
+    module2_data_apath = mpv_update_tmpdir.joinpath("MODULE2/module2-data")
+    url = check_output([GIT, 'remote', 'get-url', 'origin'], cwd=module2_data_apath).strip()
+    hooks_path = Path(url).joinpath(check_output([GIT, 'rev-parse', '--git-path', 'hooks'], cwd=url).strip())
+    hooks_path.mkdir(parents=True, exist_ok=True)
+    hook = hooks_path.joinpath('pre-receive')
+    hook.write_text('#!/bin/sh\necho "push rejected by test" >&2\nexit 1\n')
+    hook.chmod(0o755)
+
+    full_tag = "mpv-tag_br-main__mpv_tag_fail"
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        cmd('mpv-tag -m "tag from test_mpv_tag_push_failure" mpv_tag_fail', cwd=str(mpv_update_tmpdir))
+    hook.unlink()
+    assert re.search(r"module2-data\s+failed", e.value.output.decode())
+
+    # The other repositories have the tag, the manifest repository doesn't
+    module1_data_apath = mpv_update_tmpdir.joinpath("MODULE1/module1-data")
+    assert full_tag in check_output([GIT, 'ls-remote', 'origin', f'refs/tags/{full_tag}'], cwd=module1_data_apath)
+    assert full_tag not in check_output([GIT, 'ls-remote', 'origin', f'refs/tags/{full_tag}'], cwd=module2_data_apath)
+    manifest_apath = mpv_update_tmpdir.joinpath("mpv-test-git-manager")
+    assert full_tag not in check_output([GIT, 'ls-remote', 'origin', f'refs/tags/{full_tag}'], cwd=manifest_apath)
+
+
 def test_mpv_manifest(mpv_init_tmpdir):
     print("\n\n\n\n--------------------------------")
     print("test_mpv_manifest()")